@@ -1,6 +1,15 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Category, Product, ProductImage
+from .images import is_staged, stored_image_url, thumbnail_url
+from .models import Category, ImageAsset, ImageUploadJob, Product, ProductImage
+from .pagination import EstimatedCountPaginator
+from .signals import catalog_changed
 
 
 @admin.register(Category)
@@ -8,10 +17,14 @@ class CategoryAdmin(admin.ModelAdmin):
     list_display = ['title', 'product_count', 'created_at']
     search_fields = ['title']
     
+    def get_queryset(self, request):
+        # Счётчик для всей страницы одним запросом вместо COUNT на строку
+        return super().get_queryset(request).annotate(products_total=Count('products'))
+    
     def product_count(self, obj):
-        count = obj.products.count()
-        return f"{count} товар(ов)"
+        return f"{obj.products_total} товар(ов)"
     product_count.short_description = 'Количество товаров'
+    product_count.admin_order_field = 'products_total'
 
 
 class ProductImageInline(admin.TabularInline):
@@ -22,15 +35,26 @@ class ProductImageInline(admin.TabularInline):
     readonly_fields = ['image_preview']
     
     def image_preview(self, obj):
+        if is_staged(obj.image.name):
+            return obj.get_upload_status_display()
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 100px; max-width: 200px; border-radius: 5px;" />',
-                obj.image.url
+                thumbnail_url(stored_image_url(obj.image.name, obj.image.storage), 200)
             )
         return "Нет изображения"
     image_preview.short_description = 'Превью'
 
 
+class ProductActionForm(ActionForm):
+    """Выбор категории для действия "Перенести в категорию" """
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.all(),
+        required=False,
+        label='Категория'
+    )
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = [
@@ -45,7 +69,15 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ['category', 'status', 'is_active', 'created_at']
     search_fields = ['title', 'description']
     list_editable = ['is_active', 'price']
+    list_select_related = ['category']
     inlines = [ProductImageInline]  # Фотки добавляются прямо тут
+    actions = ['activate', 'deactivate', 'recategorize']
+    action_form = ProductActionForm
+    # Большая таблица: без второго COUNT(*) по всей таблице и подсчёта фасетов фильтров,
+    # число строк на больших выборках - оценка планировщика (см. pagination.py)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
     
     fieldsets = (
         ('Основная информация', {
@@ -73,12 +105,64 @@ class ProductAdmin(admin.ModelAdmin):
         )
     status_badge.short_description = 'Статус'
     
+    def get_queryset(self, request):
+        # Коррелированный подзапрос, а не JOIN + GROUP BY: count() страницы его отбрасывает
+        images = (
+            ProductImage.objects
+            .filter(product=OuterRef('pk'))
+            .order_by()
+            .values('product')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return super().get_queryset(request).annotate(images_total=Coalesce(Subquery(images), 0))
+    
     def images_count(self, obj):
-        count = obj.images.count()
+        count = obj.images_total
         if count == 0:
             return format_html('<span style="color: red;">❌ 0 фото</span>')
         return format_html('<span style="color: green;">✅ {} фото</span>', count)
     images_count.short_description = 'Изображения'
+    images_count.admin_order_field = 'images_total'
+    
+    def update_products(self, request, queryset, message, **changes):
+        """
+        Одно UPDATE на всю выборку (в т.ч. "выбрать все" по фильтру) без save()
+        на каждый товар; счётчики категорий и кэш - через catalog_changed.
+        """
+        queryset = queryset.exclude(**changes).order_by()
+        with transaction.atomic():
+            product_ids = list(queryset.values_list('pk', flat=True))
+            category_ids = set(queryset.values_list('category_id', flat=True).distinct())
+            category_ids.add(changes.get('category_id'))
+            updated = queryset.update(**changes, updated_at=timezone.now())
+            if updated:
+                catalog_changed.send(
+                    sender=Product,
+                    product_ids=product_ids,
+                    category_ids=[pk for pk in category_ids if pk],
+                )
+        self.message_user(request, message.format(updated), messages.SUCCESS)
+    
+    @admin.action(description='✅ Активировать выбранные товары')
+    def activate(self, request, queryset):
+        self.update_products(request, queryset, 'Активировано товаров: {}', is_active=True)
+    
+    @admin.action(description='❌ Деактивировать выбранные товары')
+    def deactivate(self, request, queryset):
+        self.update_products(request, queryset, 'Деактивировано товаров: {}', is_active=False)
+    
+    @admin.action(description='📁 Перенести в категорию')
+    def recategorize(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.is_valid()
+        category = form.cleaned_data.get('category')
+        if category is None:
+            self.message_user(request, 'Выберите категорию внизу списка', messages.WARNING)
+            return
+        self.update_products(
+            request, queryset, f'Перенесено в "{category}" товаров: {{}}', category_id=category.pk
+        )
     
     # Делаем удобную сортировку
     ordering = ['-created_at']
@@ -91,12 +175,37 @@ class ProductImageAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['product__title']
     list_editable = ['order']
+    list_select_related = ['product']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def image_preview(self, obj):
+        if is_staged(obj.image.name):
+            return obj.get_upload_status_display()
         if obj.image:
             return format_html(
                 '<img src="{}" style="max-height: 50px; max-width: 100px; border-radius: 5px;" />',
-                obj.image.url
+                thumbnail_url(stored_image_url(obj.image.name, obj.image.storage), 100)
             )
         return "Нет изображения"
-    image_preview.short_description = 'Превью'
\ No newline at end of file
+    image_preview.short_description = 'Превью'
+
+@admin.register(ImageUploadJob)
+class ImageUploadJobAdmin(admin.ModelAdmin):
+    """Очередь фоновой загрузки фото - смотреть ошибки и повторы"""
+    list_display = ['id', 'image', 'status', 'attempts', 'next_attempt_at', 'updated_at']
+    list_filter = ['status']
+    list_select_related = ['image__product']
+    readonly_fields = ['image', 'source', 'status', 'attempts', 'last_error', 'next_attempt_at']
+
+    def get_queryset(self, request):
+        # Файл задачи в списке не нужен
+        return super().get_queryset(request).defer('content')
+
+
+@admin.register(ImageAsset)
+class ImageAssetAdmin(admin.ModelAdmin):
+    """Индекс загруженных файлов фото (дедупликация, команда dedupe_images)"""
+    list_display = ['id', 'url', 'size', 'created_at']
+    search_fields = ['content_hash', 'url']
+    readonly_fields = ['content_hash', 'perceptual_hash', 'url', 'size']
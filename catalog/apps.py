@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class CatalogConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'catalog'
+    verbose_name = 'Каталог'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .search import ensure_search_index
+
+        # Подключаем обработчики сигналов
+        from . import signals  # noqa: F401
+        # Системные проверки (общий кэш в продакшене)
+        from . import checks  # noqa: F401
+        post_migrate.connect(ensure_search_index, sender=self)
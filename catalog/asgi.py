@@ -0,0 +1,152 @@
+"""
+Асинхронный путь чтения API каталога под ASGI (config/asgi.py, uvicorn).
+
+При CATALOG_ASYNC_VIEWS вьюсет с AsyncReadMixin отдаёт GET/HEAD action'а,
+для которого есть async-обработчик a<action> (alist, aretrieve...), на
+event loop: запросы идут через async ORM (async for, aget, aaggregate,
+acount, aiterator), кэш ответов - через aget/aset. Остальные методы и
+action'ы выполняются прежним синхронным вьюсетом в потоке.
+
+Синхронными остаются аутентификация/права/троттлинг (view.initial) и
+валидация фильтров (ModelChoiceFilter ищет категорию запросом) - они
+выполняются одним переходом в поток. Фильтры, пагинация, сериализаторы и
+формат ответа - те же, что у синхронных обработчиков.
+"""
+import functools
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from rest_framework.response import Response
+from whitenoise.middleware import WhiteNoiseMiddleware
+from .profiling import phase
+
+
+class AsyncReadMixin:
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not getattr(settings, 'CATALOG_ASYNC_VIEWS', False):
+            return view
+        sync_view = sync_to_async(view)
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            action = view.actions.get('get' if request.method == 'HEAD' else request.method.lower())
+            if request.method not in ('GET', 'HEAD') or not hasattr(cls, f'a{action}'):
+                return await sync_view(request, *args, **kwargs)
+
+            # Как view() из ViewSetMixin.as_view
+            self = cls(**view.initkwargs)
+            self.action_map = dict(view.actions)
+            if 'get' in self.action_map:
+                self.action_map.setdefault('head', self.action_map['get'])
+            for method, name in self.action_map.items():
+                setattr(self, method, getattr(self, name))
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        return async_view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """APIView.dispatch с async-обработчиком"""
+        with phase('view'):
+            self.args = args
+            self.kwargs = kwargs
+            request = self.initialize_request(request, *args, **kwargs)
+            self.request = request
+            self.headers = self.default_response_headers
+            try:
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+                handler = getattr(self, f'a{self.action}')
+                response = await handler(request, *args, **kwargs)
+            except Exception as exc:
+                response = self.handle_exception(exc)
+            self.response = self.finalize_response(request, response, *args, **kwargs)
+            return self.response
+
+    async def afiltered_queryset(self):
+        """
+        filter_queryset(get_queryset()) один раз на запрос: валидаторы и
+        обработчик работают с одним queryset
+        """
+        if not hasattr(self, '_filtered_queryset'):
+            queryset = self.get_queryset()
+            if self.filter_backends:
+                queryset = await sync_to_async(self.filter_queryset)(queryset)
+            self._filtered_queryset = queryset
+        return self._filtered_queryset
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        if not hasattr(self.paginator, 'apaginate_queryset'):
+            return await sync_to_async(self.paginate_queryset)(queryset)
+        with phase('paginate'):
+            return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def aget_object(self):
+        with phase('query'):
+            queryset = await self.afiltered_queryset()
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            try:
+                obj = await aget_object_or_404(queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+            except (TypeError, ValueError, ValidationError):
+                raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afiltered_queryset()
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer([obj async for obj in queryset], many=True).data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, который не переводит цепочку middleware в синхронный режим:
+    иначе под ASGI каждый запрос (и async-вьюхи) шёл бы через поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.find_static_file(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = await self.afind_static_file(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+    def find_static_file(self, url):
+        """Файл для URL или None - запрос идёт дальше по цепочке"""
+        if self.autorefresh:
+            return self.find_file(url)
+        return self.files.get(url)
+
+    async def afind_static_file(self, url):
+        if self.autorefresh:
+            return await sync_to_async(self.find_file)(url)
+        return self.files.get(url)
@@ -0,0 +1,210 @@
+"""
+JWT без обращений к БД на каждый запрос.
+
+- Пользователь токена берётся из кэша (ключ - id пользователя, TTL
+  CATALOG_AUTH_USER_CACHE_TTL) и сбрасывается сигналом при сохранении
+  пользователя. Смена пароля отзывает токены: штамп пароля в токене
+  (CHECK_REVOKE_TOKEN) сверяется с паролем закэшированного пользователя.
+- Чёрный список refresh-токенов проверяется по одному jti (индекс
+  OutstandingToken.jti), ответ кэшируется; запись в BlacklistedToken сразу
+  обновляет ключ (signals.py).
+- last_login пишется не чаще раза в CATALOG_AUTH_LAST_LOGIN_INTERVAL.
+- Истёкшие OutstandingToken/BlacklistedToken удаляются не чаще раза в
+  CATALOG_AUTH_TOKEN_PURGE_INTERVAL при выдаче токенов (и командой
+  purge_expired_tokens из cron).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+    TokenVerifySerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+from .cache import get_cache
+
+USER_KEY = 'catalog:auth:user:{}'
+BLACKLIST_KEY = 'catalog:auth:blacklist:{}'
+PURGE_KEY = 'catalog:auth:purge'
+
+
+def get_cached_user(user_id):
+    """Пользователь по id из токена или None"""
+    cache = get_cache()
+    key = USER_KEY.format(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None:
+            cache.set(key, user, getattr(settings, 'CATALOG_AUTH_USER_CACHE_TTL', 60))
+    return user
+
+
+def forget_user(user):
+    get_cache().delete(USER_KEY.format(getattr(user, api_settings.USER_ID_FIELD)))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, который не читает User из БД на каждый запрос"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from exc
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        check_password_stamp(validated_token, user)
+        return user
+
+
+def check_password_stamp(token, user):
+    """Пароль сменили после выдачи токена - токен отозван"""
+    # У токенов, выданных до включения CHECK_REVOKE_TOKEN, штампа нет - живут до exp
+    stamp = token.get(api_settings.REVOKE_TOKEN_CLAIM)
+    if api_settings.CHECK_REVOKE_TOKEN and stamp is not None and stamp != get_md5_hash_password(user.password):
+        raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+
+class TokenBlacklist:
+    """
+    Отозван ли refresh-токен: индексный запрос по одному jti, ответ - в общем
+    кэше. «Не отозван» живёт CATALOG_AUTH_BLACKLIST_CACHE_TTL секунд, а запись
+    в BlacklistedToken сразу перезаписывает ключ (signals.py) - отзыв виден
+    всем хостам без ожидания.
+    """
+
+    def __contains__(self, jti):
+        if not jti:
+            return False
+        cache = get_cache()
+        key = BLACKLIST_KEY.format(jti)
+        blacklisted = cache.get(key)
+        if blacklisted is None:
+            blacklisted = BlacklistedToken.objects.filter(
+                token__jti=jti, token__expires_at__gt=timezone.now()
+            ).exists()
+            if blacklisted:
+                self.remember(jti)
+            else:
+                # add: отзыв, записанный после нашего запроса к БД, не затираем
+                cache.add(key, False, getattr(settings, 'CATALOG_AUTH_BLACKLIST_CACHE_TTL', 30))
+        return blacklisted
+
+    def remember(self, jti):
+        # Отозванный токен не оживёт - держим до конца его срока
+        timeout = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+        get_cache().set(BLACKLIST_KEY.format(jti), True, timeout)
+
+    def forget(self, jti):
+        get_cache().delete(BLACKLIST_KEY.format(jti))
+
+
+token_blacklist = TokenBlacklist()
+
+
+class CachedRefreshToken(RefreshToken):
+    """RefreshToken с проверкой чёрного списка через кэш и без лишних запросов User"""
+
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in token_blacklist:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        user = get_cached_user(self.payload.get(api_settings.USER_ID_CLAIM))
+        token, created = OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                'user': user,
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            },
+        )
+        return BlacklistedToken.objects.get_or_create(token=token)
+
+
+def update_last_login(user):
+    """Условный UPDATE: не чаще раза в CATALOG_AUTH_LAST_LOGIN_INTERVAL секунд"""
+    now = timezone.now()
+    interval = timedelta(seconds=getattr(settings, 'CATALOG_AUTH_LAST_LOGIN_INTERVAL', 3600))
+    get_user_model().objects.filter(
+        Q(last_login__isnull=True) | Q(last_login__lt=now - interval), pk=user.pk
+    ).update(last_login=now)
+
+
+def purge_expired_tokens():
+    """Истёкшие токены не нужны ни для проверки, ни для ротации. Без Collector и сигналов"""
+    now = timezone.now()
+    blacklisted = BlacklistedToken.objects.filter(token__expires_at__lt=now)
+    deleted = blacklisted._raw_delete(blacklisted.db)
+    outstanding = OutstandingToken.objects.filter(expires_at__lt=now)
+    return deleted + outstanding._raw_delete(outstanding.db)
+
+
+def schedule_token_purge():
+    """Чистка при выдаче токенов; cache.add - один процесс за интервал"""
+    interval = getattr(settings, 'CATALOG_AUTH_TOKEN_PURGE_INTERVAL', 3600)
+    if interval and get_cache().add(PURGE_KEY, 1, timeout=interval):
+        transaction.on_commit(purge_expired_tokens)
+
+
+class CachedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        update_last_login(self.user)
+        schedule_token_purge()
+        return data
+
+
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = get_cached_user(user_id)
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+            check_password_stamp(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            refresh.outstand()
+            data['refresh'] = str(refresh)
+        schedule_token_purge()
+        return data
+
+
+class CachedTokenVerifySerializer(TokenVerifySerializer):
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if api_settings.BLACKLIST_AFTER_ROTATION and token.get(api_settings.JTI_CLAIM) in token_blacklist:
+            raise ValidationError(_('Token is blacklisted'))
+        return {}
@@ -0,0 +1,127 @@
+"""
+Пакетные операции над товарами для POST /api/products/bulk/.
+
+Все операции валидируются за один проход, затем применяются
+set-based запросами: bulk_create для create, UPDATE ... WHERE id IN для
+update/activate/deactivate (одинаковые изменения группируются), DELETE для delete.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from .models import Product
+from .serializers import BulkOperationSerializer, ProductDetailSerializer
+from .signals import catalog_changed
+
+
+def validate_operations(operations):
+    """
+    Возвращает (plan, results): plan - список (index, op, id, data) валидных
+    операций, results - результат на каждую операцию (ошибки уже заполнены).
+    """
+    results = [{'index': index, 'op': None, 'status': 'ok'} for index in range(len(operations))]
+    parsed = []
+    for index, raw in enumerate(operations):
+        serializer = BulkOperationSerializer(data=raw)
+        if not serializer.is_valid():
+            results[index].update(status='error', errors=serializer.errors)
+            continue
+        parsed.append((index, serializer.validated_data))
+        results[index]['op'] = serializer.validated_data['op']
+
+    # Существование id проверяем одним запросом на всю пачку
+    ids = [item['id'] for _, item in parsed if 'id' in item]
+    existing = set(Product.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    seen = set()
+    plan = []
+    for index, item in parsed:
+        op, pk = item['op'], item.get('id')
+        result = results[index]
+        result['id'] = pk
+        if pk is not None:
+            if pk not in existing:
+                result.update(status='error', errors={'id': ['Товар не найден.']})
+                continue
+            if pk in seen:
+                # Порядок внутри пачки не гарантируется - одна операция на товар
+                result.update(status='error', errors={'id': ['Повторная операция над товаром.']})
+                continue
+            seen.add(pk)
+
+        data = None
+        if op in ('create', 'update'):
+            serializer = ProductDetailSerializer(data=item.get('data', {}), partial=op == 'update')
+            if not serializer.is_valid():
+                result.update(status='error', errors=serializer.errors)
+                continue
+            data = dict(serializer.validated_data)
+            if 'category' in data:
+                category = data.pop('category')
+                data['category_id'] = category.pk if category else None
+        plan.append((index, op, pk, data))
+    return plan, results
+
+
+def apply_operations(plan, results):
+    """Применяем валидный план; вызывать внутри transaction.atomic()"""
+    now = timezone.now()
+    by_op = defaultdict(list)
+    for index, op, pk, data in plan:
+        by_op[op].append((index, pk, data))
+
+    # Категории "до" - для пересчёта счётчиков при перемещении/активации
+    touched_ids = [pk for op in ('update', 'activate', 'deactivate') for _, pk, _ in by_op[op]]
+    category_ids = set(
+        Product.objects.filter(pk__in=touched_ids).values_list('category_id', flat=True)
+    )
+    product_ids = list(touched_ids)
+
+    if by_op['create']:
+        created = Product.objects.bulk_create(Product(**data) for _, _, data in by_op['create'])
+        for (index, _, data), product in zip(by_op['create'], created):
+            results[index]['id'] = product.pk
+            product_ids.append(product.pk)
+            category_ids.add(data.get('category_id'))
+
+    # Одинаковые изменения - один UPDATE на группу
+    groups = defaultdict(list)
+    for _, pk, data in by_op['update']:
+        groups[tuple(sorted(data.items()))].append(pk)
+        category_ids.add(data.get('category_id'))
+    for _, pk, _ in by_op['activate']:
+        groups[(('is_active', True),)].append(pk)
+    for _, pk, _ in by_op['deactivate']:
+        groups[(('is_active', False),)].append(pk)
+    for changes, ids in groups.items():
+        Product.objects.filter(pk__in=ids).update(**dict(changes), updated_at=now)
+
+    delete_ids = [pk for _, pk, _ in by_op['delete']]
+    if delete_ids:
+        # post_delete сам поправит счётчики и кэш
+        Product.objects.filter(pk__in=delete_ids).delete()
+
+    if product_ids:
+        catalog_changed.send(
+            sender=Product,
+            product_ids=product_ids,
+            category_ids=[pk for pk in category_ids if pk],
+        )
+
+
+def run_bulk(operations, atomic):
+    """
+    atomic=True: при любой ошибке валидации не применяется ничего.
+    atomic=False: применяются валидные операции, ошибки - в результатах.
+    Возвращает (results, applied).
+    """
+    plan, results = validate_operations(operations)
+    has_errors = any(result['status'] == 'error' for result in results)
+    if atomic and has_errors:
+        for result in results:
+            if result['status'] == 'ok':
+                result['status'] = 'skipped'
+        return results, False
+
+    with transaction.atomic():
+        apply_operations(plan, results)
+    return results, True
@@ -0,0 +1,235 @@
+"""
+Кэш ответов каталога с версионированием.
+
+Ключ = версия каталога + вьюха/action + нормализованные query-параметры.
+Любая запись в Product/Category/ProductImage меняет версию (см. signals.py),
+поэтому старые ключи просто перестают читаться - явной очистки не нужно.
+
+Работает на любом бэкенде Django-кэша (locmem, filebased), внешних сервисов не требует.
+Версия должна быть видна всем процессам API: на одном хосте хватает filebased,
+на нескольких - DatabaseCache (см. CACHES в config/settings.py, catalog/checks.py).
+Декоратор подходит и для async-обработчиков (catalog/asgi.py) - тогда кэш
+читается в потоке (sync_to_async), а ожидание блокировки не занимает поток.
+"""
+import asyncio
+import functools
+import hashlib
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from rest_framework.response import Response
+from .http import not_modified_response
+from .profiling import phase
+
+VERSION_KEY = 'catalog:version'
+# Каталог менялся последние CATALOG_REPLICA_PIN_SECONDS секунд
+CHANGED_KEY = 'catalog:changed'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_catalog_version():
+    """Текущая версия каталога (создаётся при первом обращении)"""
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    # Бэкенды Django-кэша синхронные (aget - тот же sync_to_async): один переход вместо трёх
+    return await sync_to_async(get_catalog_version)()
+
+
+def bump_catalog_version(**kwargs):
+    """
+    Новая версия - случайная строка, а не инкремент: на filebased-кэше incr
+    не атомарен, а set с уникальным значением не может "потерять" обновление.
+    Реплики могут ещё не видеть запись - на CATALOG_REPLICA_PIN_SECONDS все
+    чтения API уходят в default (catalog/routers.py).
+    """
+    cache = get_cache()
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    seconds = getattr(settings, 'CATALOG_REPLICA_PIN_SECONDS', 5)
+    if seconds:
+        cache.set(CHANGED_KEY, 1, timeout=seconds)
+
+
+def is_cacheable(request):
+    """Кэшируем только анонимные GET/HEAD - админам всегда свежие данные"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    user = getattr(request, 'user', None)
+    return not (user and user.is_authenticated)
+
+
+def build_cache_key(view, request, kwargs):
+    """
+    Ключ из версии, хоста, формата ответа (JSON/browsable API - разные тела и
+    ETag), вьюхи/action, kwargs URL и отсортированных query-параметров
+    """
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    raw = repr((
+        request.scheme,
+        request.get_host(),
+        getattr(request, 'accepted_media_type', None),
+        view.__class__.__name__,
+        view.action,
+        sorted(kwargs.items()),
+        params,
+    ))
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'catalog:response:{get_catalog_version()}:{digest}'
+
+
+def cache_response(method):
+    """
+    Декоратор для list/retrieve/action вьюсетов.
+
+    - свежая запись отдаётся без ORM и сериализаторов;
+    - устаревшая (stale-while-revalidate) отдаётся всем, кроме одного запроса,
+      который взял блокировку и пересчитывает ответ;
+    - при промахе считает только владелец блокировки, остальные недолго ждут
+      его результат (защита от stampede).
+    """
+    if iscoroutinefunction(method):
+        return _async_cache_response(method)
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return method(self, request, *args, **kwargs)
+
+        cache = get_cache()
+        ttl = getattr(settings, 'CATALOG_CACHE_TTL', 60)
+        stale_ttl = getattr(settings, 'CATALOG_CACHE_STALE_TTL', 300)
+        lock_timeout = getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 10)
+        with phase('cache'):
+            key, entry = _lookup(cache, self, request, kwargs)
+        lock_key = f'{key}:lock'
+
+        if entry is not None and entry['fresh_until'] > time.time():
+            return _response_from_entry(entry, request)
+
+        locked = cache.add(lock_key, 1, timeout=lock_timeout)
+        if not locked:
+            if entry is not None:
+                return _response_from_entry(entry, request)
+            entry = _wait_for_entry(cache, key, lock_timeout)
+            if entry is not None:
+                return _response_from_entry(entry, request)
+
+        # routers.py импортирует этот модуль - импорт здесь, а не наверху
+        from .routers import read_from_primary
+
+        try:
+            # Ответ ляжет в кэш под текущей версией - читаем его не с отстающей реплики
+            with read_from_primary():
+                response = method(self, request, *args, **kwargs)
+            # Запись в кэше - под один формат: промежуточные кэши тоже должны делить по Accept
+            patch_vary_headers(response, ['Accept'])
+            if response.status_code == 200:
+                cache.set(key, _entry_from_response(response, ttl), timeout=ttl + stale_ttl)
+            return response
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    return wrapper
+
+
+def _async_cache_response(method):
+    """cache_response для async-обработчиков"""
+    @functools.wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return await method(self, request, *args, **kwargs)
+
+        cache = get_cache()
+        ttl = getattr(settings, 'CATALOG_CACHE_TTL', 60)
+        stale_ttl = getattr(settings, 'CATALOG_CACHE_STALE_TTL', 300)
+        lock_timeout = getattr(settings, 'CATALOG_CACHE_LOCK_TIMEOUT', 10)
+        with phase('cache'):
+            key, entry = await sync_to_async(_lookup)(cache, self, request, kwargs)
+        lock_key = f'{key}:lock'
+
+        if entry is not None and entry['fresh_until'] > time.time():
+            return _response_from_entry(entry, request)
+
+        locked = await cache.aadd(lock_key, 1, timeout=lock_timeout)
+        if not locked:
+            if entry is not None:
+                return _response_from_entry(entry, request)
+            entry = await _await_entry(cache, key, lock_timeout)
+            if entry is not None:
+                return _response_from_entry(entry, request)
+
+        from .routers import read_from_primary
+
+        try:
+            with read_from_primary():
+                response = await method(self, request, *args, **kwargs)
+            patch_vary_headers(response, ['Accept'])
+            if response.status_code == 200:
+                await cache.aset(key, _entry_from_response(response, ttl), timeout=ttl + stale_ttl)
+            return response
+        finally:
+            if locked:
+                await cache.adelete(lock_key)
+
+    return wrapper
+
+
+def _lookup(cache, view, request, kwargs):
+    key = build_cache_key(view, request, kwargs)
+    return key, cache.get(key)
+
+
+def _entry_from_response(response, ttl):
+    return {
+        'data': response.data,
+        'status': response.status_code,
+        # Content-Type выставит рендерер под формат конкретного запроса
+        'headers': {
+            name: value for name, value in response.items()
+            if name.lower() != 'content-type'
+        },
+        'fresh_until': time.time() + ttl,
+    }
+
+
+def _wait_for_entry(cache, key, lock_timeout, interval=0.05):
+    """Ждём, пока владелец блокировки положит ответ; не дольше lock_timeout"""
+    deadline = time.time() + min(lock_timeout, getattr(settings, 'CATALOG_CACHE_LOCK_WAIT', 2))
+    while time.time() < deadline:
+        time.sleep(interval)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+async def _await_entry(cache, key, lock_timeout, interval=0.05):
+    deadline = time.time() + min(lock_timeout, getattr(settings, 'CATALOG_CACHE_LOCK_WAIT', 2))
+    while time.time() < deadline:
+        await asyncio.sleep(interval)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _response_from_entry(entry, request):
+    """Ответ из кэша; If-None-Match/If-Modified-Since проверяем по сохранённым валидаторам"""
+    not_modified = not_modified_response(request, entry['headers'])
+    if not_modified is not None:
+        return not_modified
+    return Response(entry['data'], status=entry['status'], headers=entry['headers'])
@@ -0,0 +1,165 @@
+"""
+Дельта-синхронизация каталога: GET /api/products/changes/?since=<token>.
+
+Две ленты с keyset-пагинацией: созданные/изменённые товары по (updated_at, id)
+и удаления (Tombstone) по (deleted_at, id). Токен - непрозрачная позиция в
+обеих лентах. Клиент повторяет запрос с next, пока has_more, и хранит
+последний next до следующей синхронизации. Без since - весь каталог с начала,
+удаления до первого запроса не нужны.
+
+Строки моложе CATALOG_CHANGES_SETTLE_SECONDS ещё не отдаются: updated_at
+выставляется до коммита, и транзакция, закоммиченная позже соседней, иначе
+оказалась бы позади уже выданной позиции. То же - о расхождении часов воркеров.
+Массовые записи (catalog_changed: импорт, bulk, dedupe_images) бывают дольше
+этого окна - после коммита restamp() переставляет их отметки на время коммита.
+
+Надгробия живут CATALOG_CHANGES_RETENTION_DAYS дней (compact_tombstones).
+Токен, отставший больше этого срока, получает 410: часть удалений уже стёрта,
+клиенту нужна полная синхронизация.
+"""
+import base64
+import json
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from .cache import get_cache
+from .models import Category, Product, ProductImage, Tombstone
+
+COMPACT_KEY = 'catalog:changes:compact'
+KINDS = {
+    Product: Tombstone.KIND_PRODUCT,
+    ProductImage: Tombstone.KIND_IMAGE,
+    Category: Tombstone.KIND_CATEGORY,
+}
+
+ChangesPage = namedtuple('ChangesPage', ['products', 'tombstones', 'position', 'has_more'])
+
+
+def decode_token(token):
+    """
+    Позиция (товары, надгробия) из токена; каждая - (datetime, id), у товаров
+    None - с начала. Без токена - None. ValueError - токен битый.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        products = data['p']
+        return (_decode_position(products) if products is not None else None, _decode_position(data['t']))
+    except (TypeError, ValueError, KeyError, IndexError):
+        raise ValueError(token)
+
+
+def _decode_position(raw):
+    value, pk = raw
+    moment = parse_datetime(value)
+    if moment is None or timezone.is_naive(moment):
+        raise ValueError(value)
+    return moment, int(pk)
+
+
+def _encode_position(position):
+    return None if position is None else [position[0].isoformat(), position[1]]
+
+
+def encode_token(position):
+    data = {'p': _encode_position(position[0]), 't': _encode_position(position[1])}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode('ascii').rstrip('=')
+
+
+def is_expired(position, now=None):
+    """Удаления после позиции токена могли быть стёрты сжатием"""
+    cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, 'CATALOG_CHANGES_RETENTION_DAYS', 30))
+    return position is not None and position[1][0] < cutoff
+
+
+def changes_page(queryset, position, page_size, now=None):
+    """
+    Страница обеих лент после position: до page_size товаров (модели из
+    queryset) и до page_size надгробий, новая позиция и есть ли ещё.
+    """
+    horizon = (now or timezone.now()) - timedelta(seconds=getattr(settings, 'CATALOG_CHANGES_SETTLE_SECONDS', 5))
+    products_position, tombstones_position = position or (None, (horizon, 0))
+    products, products_position, more_products = _keyset_page(
+        queryset, 'updated_at', products_position, horizon, page_size
+    )
+    tombstones, tombstones_position, more_tombstones = _keyset_page(
+        Tombstone.objects.all(), 'deleted_at', tombstones_position, horizon, page_size
+    )
+    return ChangesPage(products, tombstones, (products_position, tombstones_position), more_products or more_tombstones)
+
+
+def _keyset_page(queryset, field, position, horizon, page_size):
+    """Строки строго после position и раньше horizon по (field, id); лента кончилась - позиция (horizon, 0)"""
+    queryset = queryset.filter(**{f'{field}__lt': horizon}).order_by(field, 'id')
+    if position is not None:
+        value, pk = position
+        queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, (getattr(rows[-1], field), rows[-1].pk), True
+    # Всё до horizon выдано. Назад не двигаемся (часы другого воркера могли отставать)
+    return rows, max(position or (horizon, 0), (horizon, 0)), False
+
+
+_datetime_field = serializers.DateTimeField()
+
+
+def tombstone_data(tombstone):
+    # Тот же формат даты, что у updated_at товаров
+    deleted_at = _datetime_field.to_representation(tombstone.deleted_at)
+    data = {'type': tombstone.kind, 'id': tombstone.object_id, 'deleted_at': deleted_at}
+    if tombstone.kind == Tombstone.KIND_IMAGE:
+        data['product'] = tombstone.product_id
+    return data
+
+
+def record_tombstone(instance):
+    """Надгробие удаляемого товара, фото или категории - в транзакции удаления"""
+    Tombstone.objects.create(
+        kind=KINDS[type(instance)],
+        object_id=instance.pk,
+        product_id=instance.product_id if isinstance(instance, ProductImage) else None,
+    )
+    schedule_compaction()
+
+
+def restamp(product_ids, now=None):
+    """
+    updated_at товаров и deleted_at их надгробий - на момент после коммита
+    массовой записи: отметки, выставленные в начале длинной транзакции, иначе
+    оказались бы позади токенов, выданных до её коммита.
+    """
+    now = now or timezone.now()
+    Product.objects.filter(pk__in=product_ids).update(updated_at=now)
+    Tombstone.objects.filter(kind=Tombstone.KIND_PRODUCT, object_id__in=product_ids).update(deleted_at=now)
+
+
+def compact_tombstones(now=None):
+    """
+    Удаляет надгробия старше срока хранения и надгробия фото удалённых
+    товаров (их покрывает надгробие товара). Без Collector и сигналов.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, 'CATALOG_CHANGES_RETENTION_DAYS', 30))
+    expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+    deleted = expired._raw_delete(expired.db)
+    covered = Tombstone.objects.filter(
+        kind=Tombstone.KIND_IMAGE,
+        product_id__in=Tombstone.objects.filter(kind=Tombstone.KIND_PRODUCT).values('object_id'),
+    )
+    return deleted + covered._raw_delete(covered.db)
+
+
+def schedule_compaction():
+    """Сжатие после удалений; cache.add - один процесс за CATALOG_CHANGES_COMPACT_INTERVAL"""
+    interval = getattr(settings, 'CATALOG_CHANGES_COMPACT_INTERVAL', 86400)
+    if interval and get_cache().add(COMPACT_KEY, 1, timeout=interval):
+        transaction.on_commit(compact_tombstones)
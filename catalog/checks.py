@@ -0,0 +1,44 @@
+"""
+Системные проверки каталога (manage.py check, migrate, runserver).
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Кэш, который видит только один хост
+HOST_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache_warnings():
+    """
+    Версия каталога, отозванные токены и привязка к default после записи живут
+    в кэше: на нескольких инстансах с кэшем одного хоста соседи отдают старые
+    ответы и принимают отозванные токены. Один инстанс - CACHE_SINGLE_HOST=True.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in HOST_LOCAL_CACHE_BACKENDS or getattr(settings, 'CACHE_SINGLE_HOST', False):
+        return []
+    return [Warning(
+        f'CACHE_BACKEND={backend} виден только одному хосту',
+        hint=(
+            'На нескольких инстансах задайте общий кэш через CACHE_BACKEND/CACHE_LOCATION '
+            '(например, DatabaseCache + manage.py createcachetable) или CACHE_SINGLE_HOST=True, '
+            'если инстанс один'
+        ),
+        id='catalog.W001',
+    )]
+
+
+@register(Tags.caches)
+def check_production_cache(app_configs, **kwargs):
+    """На Railway - при каждом check/migrate"""
+    return shared_cache_warnings() if getattr(settings, 'RAILWAY_ENVIRONMENT', None) else []
+
+
+@register(Tags.caches, deploy=True)
+def check_deploy_cache(app_configs, **kwargs):
+    """manage.py check --deploy в любом окружении (на Railway уже проверено выше)"""
+    return [] if getattr(settings, 'RAILWAY_ENVIRONMENT', None) else shared_cache_warnings()
@@ -0,0 +1,73 @@
+"""
+Потоковая выгрузка каталога для GET /api/products/export/.
+
+Строки читаются iterator() (на PostgreSQL - серверный курсор) порциями,
+фото подтягиваются одним запросом на порцию, каждая порция сразу уходит
+клиенту. Память не зависит от размера каталога. Под ASGI (catalog/asgi.py) -
+то же самое асинхронным генератором на aiterator().
+"""
+from itertools import islice
+
+from .renderers import FastJSONRenderer
+from .serializers import ProductListRowSerializer
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+def iter_chunks(queryset, context, chunk_size):
+    """Списки сериализованных товаров по chunk_size штук"""
+    rows = ProductListRowSerializer.prepare(queryset, context.get('fields')).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield ProductListRowSerializer(chunk, context=context).to_representation(chunk)
+
+
+async def aiter_chunks(queryset, context, chunk_size):
+    """iter_chunks для ASGI: строки через aiterator(), фото порции - через async ORM"""
+    rows = ProductListRowSerializer.prepare(queryset, context.get('fields')).aiterator(chunk_size=chunk_size)
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield await ProductListRowSerializer(chunk, context=context).adata()
+            chunk = []
+    if chunk:
+        yield await ProductListRowSerializer(chunk, context=context).adata()
+
+
+def render_chunk(items, layout, first):
+    """Порция товаров в байты: NDJSON - объект на строку, json - кусок массива"""
+    render = FastJSONRenderer().render
+    if layout == 'ndjson':
+        return b''.join(render(item) + b'\n' for item in items)
+    return (b'' if first else b',') + b','.join(render(item) for item in items)
+
+
+def stream_products(queryset, context, chunk_size=1000, layout='ndjson'):
+    """
+    Байтовые куски ответа: NDJSON (объект на строку) или JSON-массив.
+    Одна порция товаров - один кусок.
+    """
+    if layout == 'json':
+        yield b'['
+    for index, items in enumerate(iter_chunks(queryset, context, chunk_size)):
+        yield render_chunk(items, layout, first=index == 0)
+    if layout == 'json':
+        yield b']'
+
+
+async def astream_products(queryset, context, chunk_size=1000, layout='ndjson'):
+    """stream_products асинхронным генератором - StreamingHttpResponse под ASGI не буферизует ответ"""
+    if layout == 'json':
+        yield b'['
+    first = True
+    async for items in aiter_chunks(queryset, context, chunk_size):
+        yield render_chunk(items, layout, first)
+        first = False
+    if layout == 'json':
+        yield b']'
@@ -0,0 +1,74 @@
+"""
+Фасеты для GET /api/products/facets/: сколько товаров в каждой категории,
+статусе и по активности при текущем поиске и фильтрах.
+
+Один GROUP BY (category, status, is_active) - строк не больше, чем
+категорий x статусов x 2, - дальше суммирование в Python. Счёт фасета не
+учитывает фильтр самого фасета (иначе при ?category=1 у остальных категорий
+всегда был бы 0), но учитывает фильтры остальных.
+"""
+from collections import Counter
+
+from django.db.models import Count
+from .models import Product
+
+FACETS = ('category', 'status', 'is_active')
+
+
+def selected_facets(cleaned_data):
+    """Значения фильтров из формы filterset; None - фильтра нет"""
+    category = cleaned_data.get('category')
+    return {
+        'category': category.pk if category is not None else None,
+        'status': cleaned_data.get('status') or None,
+        'is_active': cleaned_data.get('is_active'),
+    }
+
+
+def facet_counts(queryset, selected):
+    """queryset - с поиском, но без фильтров фасетов; selected - см. selected_facets"""
+    rows = (
+        queryset.prefetch_related(None).order_by()
+        .values('category_id', 'category__title', 'status', 'is_active')
+        .annotate(total=Count('pk'))
+    )
+
+    def matches(key, exclude=None):
+        return all(
+            selected[name] is None or key[name] == selected[name]
+            for name in FACETS if name != exclude
+        )
+
+    counts = {name: Counter() for name in FACETS}
+    category_titles = {}
+    total = 0
+    for row in rows:
+        key = {'category': row['category_id'], 'status': row['status'], 'is_active': row['is_active']}
+        category_titles[row['category_id']] = row['category__title']
+        for name in FACETS:
+            if matches(key, exclude=name):
+                counts[name][key[name]] += row['total']
+        if matches(key):
+            total += row['total']
+
+    categories = sorted(
+        counts['category'].items(),
+        key=lambda item: (-item[1], category_titles[item[0]] or ''),
+    )
+    return {
+        'count': total,
+        'facets': {
+            'category': [
+                {'value': pk, 'label': category_titles[pk], 'count': count}
+                for pk, count in categories
+            ],
+            'status': [
+                {'value': value, 'label': str(label), 'count': counts['status'][value]}
+                for value, label in Product.STATUS_CHOICES
+            ],
+            'is_active': [
+                {'value': value, 'count': counts['is_active'][value]}
+                for value in (True, False)
+            ],
+        },
+    }
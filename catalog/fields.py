@@ -1,7 +1,4 @@
 from django.db import models
-import cloudinary
-import cloudinary.uploader
-from django.conf import settings
 
 
 class CloudinaryImageField(models.ImageField):
@@ -10,18 +7,31 @@ class CloudinaryImageField(models.ImageField):
     """
     
     def save_form_data(self, instance, data):
-        """Переопределяем сохранение - загружаем на Cloudinary"""
+        """
+        Переопределяем сохранение: файл уменьшаем и ставим в очередь фоновой
+        загрузки вместе с задачей (catalog/images.py) - запрос не ждёт
+        сетевых round trip'ов до Cloudinary. Уже загруженное фото (индекс
+        ImageAsset по хэшу) повторно не грузится.
+        """
         if data and hasattr(data, 'read'):
-            # Только на продакшене загружаем на Cloudinary
-            if settings.RAILWAY_ENVIRONMENT:
-                # Загружаем на Cloudinary
-                upload_result = cloudinary.uploader.upload(
-                    data,
-                    folder="products",
-                    resource_type="image"
-                )
-                # Сохраняем URL вместо файла
-                setattr(instance, self.name, upload_result['secure_url'])
+            from .images import find_asset, get_image_store, prepare_image, stage_image
+            from .models import ProductImage
+
+            # Только если настроено удалённое хранилище (на продакшене - Cloudinary)
+            if get_image_store() is not None:
+                prepared = prepare_image(data)
+                content = prepared.read()
+                asset = find_asset(content)
+                if asset is not None:
+                    # Такое фото уже загружено - ссылаемся на него, без staging и загрузки
+                    setattr(instance, self.name, asset.url)
+                    instance.upload_status = ProductImage.UPLOAD_READY
+                    return
+                staged = stage_image(prepared)
+                # Пока задача не выполнена, в поле имя-заглушка - API отдаёт null
+                setattr(instance, self.name, staged)
+                instance.upload_status = ProductImage.UPLOAD_PENDING
+                instance._staged_upload = (staged, content)
             else:
                 # Локально сохраняем как обычно
                 super().save_form_data(instance, data)
@@ -0,0 +1,28 @@
+from rest_framework import filters
+from .search import get_search_backend
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    Поиск через индексированный бэкенд (tsvector / FTS5) с ранжированием.
+    Если для СУБД бэкенда нет - обычный icontains по search_fields.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = ' '.join(self.get_search_terms(request))
+        if not query:
+            return queryset
+        backend = get_search_backend(queryset.db)
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        return backend.search(queryset, query)
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """При поиске без явного ?ordering= сортируем по релевантности"""
+
+    def get_ordering(self, request, queryset, view):
+        explicit = request.query_params.get(self.ordering_param)
+        if not explicit and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', *(self.get_default_ordering(view) or [])]
+        return super().get_ordering(request, queryset, view)
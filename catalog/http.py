@@ -0,0 +1,163 @@
+"""
+HTTP-валидаторы (ETag / Last-Modified / 304) и surrogate-ключи для CDN.
+
+Валидаторы считаются до сериализатора: для списка - один агрегатный запрос
+Max(updated_at) + Count по отфильтрованному queryset, для карточки - одна строка.
+Async-обработчики (catalog/asgi.py) берут валидаторы из view.aget_validators().
+"""
+import functools
+import hashlib
+import logging
+from collections import namedtuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+from .profiling import phase
+
+logger = logging.getLogger(__name__)
+
+Validators = namedtuple('Validators', ['etag', 'last_modified', 'surrogate_keys'])
+
+
+def make_etag(*parts):
+    """Сильный ETag из произвольных частей (включая формат ответа)"""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def queryset_validators(queryset, request, surrogate_keys=()):
+    """Валидаторы списка: одно агрегирование без сериализации"""
+    stats = queryset.order_by().aggregate(last_modified=Max('updated_at'), total=Count('pk'))
+    return _list_validators(stats, request, surrogate_keys)
+
+
+async def aqueryset_validators(queryset, request, surrogate_keys=()):
+    stats = await queryset.order_by().aaggregate(last_modified=Max('updated_at'), total=Count('pk'))
+    return _list_validators(stats, request, surrogate_keys)
+
+
+def _list_validators(stats, request, surrogate_keys):
+    last_modified = stats['last_modified']
+    etag = make_etag(
+        request.get_full_path(),
+        request.accepted_media_type,
+        stats['total'],
+        last_modified.isoformat() if last_modified else None,
+    )
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return Validators(etag, timestamp, ['products', *surrogate_keys])
+
+
+def not_modified_response(request, headers):
+    """304 по сохранённым заголовкам (ETag/Last-Modified) или None"""
+    last_modified = headers.get('Last-Modified')
+    response = get_conditional_response(
+        request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+    )
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+def apply_validators(response, request, validators):
+    """Проставляем ETag, Last-Modified, Cache-Control и surrogate-ключи"""
+    if validators.etag:
+        response['ETag'] = validators.etag
+    if validators.last_modified is not None:
+        response['Last-Modified'] = http_date(validators.last_modified)
+    if validators.surrogate_keys:
+        header = getattr(settings, 'CATALOG_SURROGATE_KEY_HEADER', 'Surrogate-Key')
+        response[header] = ' '.join(dict.fromkeys(validators.surrogate_keys))
+
+    if request.user and request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(
+            response,
+            public=True,
+            max_age=getattr(settings, 'CATALOG_HTTP_MAX_AGE', 0),
+            s_maxage=getattr(settings, 'CATALOG_HTTP_S_MAXAGE', 300),
+        )
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def conditional_response(method):
+    """
+    Декоратор для list/retrieve/action: берёт валидаторы из view.get_validators()
+    и отвечает 304 до запуска сериализатора.
+    """
+    if iscoroutinefunction(method):
+        return _async_conditional_response(method)
+
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return method(self, request, *args, **kwargs)
+
+        with phase('validators'):
+            validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return method(self, request, *args, **kwargs)
+
+        response = get_conditional_response(
+            request, etag=validators.etag, last_modified=validators.last_modified
+        )
+        if response is None:
+            response = method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return apply_validators(response, request, validators)
+
+    return wrapper
+
+
+def _async_conditional_response(method):
+    @functools.wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await method(self, request, *args, **kwargs)
+
+        with phase('validators'):
+            validators = await self.aget_validators(request, *args, **kwargs)
+        if validators is None:
+            return await method(self, request, *args, **kwargs)
+
+        response = get_conditional_response(
+            request, etag=validators.etag, last_modified=validators.last_modified
+        )
+        if response is None:
+            response = await method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return apply_validators(response, request, validators)
+
+    return wrapper
+
+
+def purge_surrogate_keys(keys):
+    """
+    Сообщаем фронтовому кэшу, какие ключи сбросить. Сам вызов - функция из
+    настройки CATALOG_SURROGATE_PURGE (dotted path, принимает список ключей).
+    Вызывается после коммита, ошибки CDN не ломают запись.
+    """
+    path = getattr(settings, 'CATALOG_SURROGATE_PURGE', '')
+    keys = list(dict.fromkeys(keys))
+    if not path or not keys:
+        return
+
+    def purge():
+        try:
+            import_string(path)(keys)
+        except Exception:
+            logger.exception('Не удалось сбросить surrogate-ключи %s', keys)
+
+    transaction.on_commit(purge)
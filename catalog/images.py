@@ -0,0 +1,440 @@
+"""
+Фоновая загрузка изображений товаров.
+
+CloudinaryImageField больше не грузит файл в запросе: картинка уменьшается
+Pillow и вместе с задачей ImageUploadJob ложится в БД (staging) - задачу
+может забрать любой процесс на любом хосте. Забирает её пул потоков веб-
+процесса (после коммита) или команда process_image_uploads (процесс worker
+в Procfile). Повторы после ошибки ждут в threading.Timer; таймеры и задачи
+процесса, который перезапустился, подбирает resume_jobs при старте воркера
+gunicorn, а задачи, зависшие в running, - requeue_stale_jobs. Пока файл не
+загружен, у фото имя-заглушка staging/... и в API оно отдаётся как null.
+
+Удалённое хранилище - реализация ImageStore (настройка CATALOG_IMAGE_STORE).
+Здесь же URL уменьшенных копий (трансформации Cloudinary) для списков и админки.
+
+Дедупликация: перед загрузкой подготовленный файл ищется в индексе ImageAsset
+по SHA-256 (и по dHash при CATALOG_IMAGE_PERCEPTUAL_DEDUPE). Нашёлся - фото
+ссылается на уже загруженный файл, загрузки нет. Индекс пополняют фоновые
+загрузки и команда dedupe_images.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+STAGING_DIR = 'staging'
+
+
+class ImageStore:
+    """Интерфейс удалённого хранилища изображений"""
+
+    def upload(self, file, name):
+        """Загрузить файл, вернуть значение для поля image (URL или имя)"""
+        raise NotImplementedError
+
+    def delete(self, value):
+        """Удалить ранее загруженный файл (по значению поля image)"""
+
+    def owns(self, value):
+        """Файл лежит в этом хранилище - его можно удалять через delete"""
+        return True
+
+
+class CloudinaryImageStore(ImageStore):
+    folder = 'products'
+
+    def upload(self, file, name):
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload(file, folder=self.folder, resource_type='image')
+        return result['secure_url']
+
+    def delete(self, value):
+        import cloudinary.uploader
+
+        cloudinary.uploader.destroy(cloudinary_public_id(value), resource_type='image')
+
+    def owns(self, value):
+        import cloudinary
+
+        return is_cloudinary_url(value) and f'/{cloudinary.config().cloud_name}/' in urlsplit(value).path
+
+
+def cloudinary_public_id(url):
+    """https://res.cloudinary.com/<cloud>/image/upload/v123/products/abc.jpg -> products/abc"""
+    path = url.split('/upload/', 1)[-1]
+    first, _, rest = path.partition('/')
+    if rest and first.startswith('v') and first[1:].isdigit():
+        path = rest
+    return path.rsplit('.', 1)[0]
+
+
+def stored_image_url(name, storage=default_storage):
+    """Значение поля image - полный URL удалённого хранилища или имя локального файла"""
+    if urlsplit(name).scheme in ('http', 'https'):
+        return name
+    return storage.url(name)
+
+
+def is_cloudinary_url(url):
+    return urlsplit(url).netloc == 'res.cloudinary.com' and '/upload/' in url
+
+
+def thumbnail_url(url, width):
+    """
+    Уменьшенная копия через трансформацию Cloudinary в URL (строка считается
+    локально, без API). Для других хранилищ - исходный URL.
+    """
+    if not url or not is_cloudinary_url(url):
+        return url
+    transformation = getattr(settings, 'CATALOG_IMAGE_TRANSFORMATION', 'c_limit,w_{width},f_auto,q_auto')
+    head, tail = url.split('/upload/', 1)
+    return f'{head}/upload/{transformation.format(width=width)}/{tail}'
+
+
+def responsive_urls(url):
+    """
+    src и srcset главного фото для списков (Product.primary_image_urls).
+    Без трансформаций (не Cloudinary) srcset пустой, src - сам файл.
+    """
+    if not is_cloudinary_url(url):
+        return {'src': url, 'srcset': ''}
+    widths = getattr(settings, 'CATALOG_IMAGE_SRCSET_WIDTHS', [160, 320, 480, 640, 960])
+    return {
+        'src': thumbnail_url(url, getattr(settings, 'CATALOG_IMAGE_SRC_WIDTH', 480)),
+        'srcset': ', '.join(f'{thumbnail_url(url, width)} {width}w' for width in widths),
+    }
+
+
+class FileSystemImageStore(ImageStore):
+    """Подмена удалённого хранилища: кладёт файлы в MEDIA_ROOT/uploaded/"""
+    directory = 'uploaded'
+
+    def upload(self, file, name):
+        return default_storage.save(f'{self.directory}/{os.path.basename(name)}', file)
+
+    def delete(self, value):
+        default_storage.delete(value)
+
+    def owns(self, value):
+        return value.startswith(f'{self.directory}/')
+
+
+def get_image_store():
+    """Хранилище из настройки или None - тогда файлы сохраняются локально, как раньше"""
+    path = getattr(settings, 'CATALOG_IMAGE_STORE', '')
+    return import_string(path)() if path else None
+
+
+def prepare_image(data):
+    """
+    Уменьшаем до CATALOG_IMAGE_MAX_SIZE по большей стороне и пережимаем.
+    Непонятные форматы (анимированный GIF и т.п.) отдаём как есть.
+    """
+    from PIL import Image, ImageOps
+
+    max_size = getattr(settings, 'CATALOG_IMAGE_MAX_SIZE', 2000)
+    quality = getattr(settings, 'CATALOG_IMAGE_QUALITY', 85)
+    name = os.path.basename(getattr(data, 'name', '') or 'image')
+    stem = os.path.splitext(name)[0] or 'image'
+
+    data.seek(0)
+    try:
+        image = Image.open(data)
+        image_format = image.format
+        if image_format not in ('JPEG', 'PNG', 'WEBP'):
+            raise ValueError(image_format)
+        image = ImageOps.exif_transpose(image)
+    except Exception:
+        data.seek(0)
+        return ContentFile(data.read(), name=name)
+
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P') and image_format != 'JPEG':
+        image.save(buffer, format='PNG', optimize=True)
+        name = f'{stem}.png'
+    else:
+        image.convert('RGB').save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+        name = f'{stem}.jpg'
+    return ContentFile(buffer.getvalue(), name=name)
+
+
+def stage_image(prepared):
+    """
+    Имя-заглушка для поля image, пока подготовленный файл (prepare_image) ждёт
+    загрузки. Сам файл хранится в задаче (ImageUploadJob.content), а не в
+    MEDIA_ROOT: локальный диск виден одному хосту и на продакшене не раздаётся.
+    """
+    return f'{STAGING_DIR}/{uuid.uuid4().hex}_{prepared.name}'
+
+
+def is_staged(name):
+    """Фото ещё в очереди загрузки - по этому имени файла нет"""
+    return bool(name) and name.startswith(f'{STAGING_DIR}/')
+
+
+def read_staged(job):
+    """Файл задачи; у задач из старого staging в MEDIA_ROOT - с диска"""
+    if job.content:
+        return bytes(job.content)
+    with default_storage.open(job.source, 'rb') as source:
+        return source.read()
+
+
+def read_stored_image(value, timeout=20):
+    """Байты файла по значению поля image (URL хранилища или локальное имя)"""
+    if urlsplit(value).scheme in ('http', 'https'):
+        with urllib.request.urlopen(value, timeout=timeout) as response:
+            return response.read()
+    with default_storage.open(value, 'rb') as file:
+        return file.read()
+
+
+def content_hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def perceptual_hash(content):
+    """
+    dHash (64 бита hex): яркость соседних точек уменьшенного до 9x8 снимка.
+    Почти не меняется от пережатия и масштаба. '' - не картинка.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(io.BytesIO(content)).convert('L').resize((9, 8), Image.LANCZOS)
+    except Exception:
+        return ''
+    pixels = image.tobytes()
+    bits = 0
+    for row in range(8):
+        for column in range(8):
+            bits = bits << 1 | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return f'{bits:016x}'
+
+
+def find_asset(content):
+    """Уже загруженный файл с тем же содержимым (или похожий, см. CATALOG_IMAGE_PERCEPTUAL_DEDUPE)"""
+    from .models import ImageAsset
+
+    asset = ImageAsset.objects.filter(content_hash=content_hash(content)).first()
+    if asset is not None or not getattr(settings, 'CATALOG_IMAGE_PERCEPTUAL_DEDUPE', False):
+        return asset
+    phash = perceptual_hash(content)
+    if not phash:
+        return None
+    distance = getattr(settings, 'CATALOG_IMAGE_PERCEPTUAL_DISTANCE', 4)
+    if not distance:
+        return ImageAsset.objects.filter(perceptual_hash=phash).first()
+    target = int(phash, 16)
+    for pk, other in perceptual_candidates(phash).values_list('pk', 'perceptual_hash').iterator():
+        if (int(other, 16) ^ target).bit_count() <= distance:
+            return ImageAsset.objects.get(pk=pk)
+    return None
+
+
+def perceptual_candidates(phash):
+    """
+    Файлы, совпадающие с phash хотя бы в одной полосе (models.PERCEPTUAL_BANDS):
+    расстояние Хэмминга индексом не ищется, а полосы - ищутся. Для расстояния
+    до 4 бит похожий файл среди кандидатов гарантированно есть.
+    """
+    from .models import PERCEPTUAL_BANDS, HashBand, ImageAsset
+
+    bands = {f'band{number}': (start, length) for number, (start, length) in enumerate(PERCEPTUAL_BANDS)}
+    match = Q()
+    for name, (start, length) in bands.items():
+        match |= Q(**{name: phash[start - 1:start - 1 + length]})
+    return ImageAsset.objects.alias(**{
+        name: HashBand('perceptual_hash', start, length) for name, (start, length) in bands.items()
+    }).filter(match)
+
+
+def remember_asset(content, url):
+    """Файл загружен - в индекс; если такой уже есть, остаётся прежний"""
+    from .models import ImageAsset
+
+    asset, _ = ImageAsset.objects.get_or_create(
+        content_hash=content_hash(content),
+        defaults={'url': url, 'size': len(content), 'perceptual_hash': perceptual_hash(content)},
+    )
+    return asset
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Пул создаётся лениво - уже в воркере gunicorn, после fork"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CATALOG_IMAGE_UPLOAD_WORKERS', 2),
+                thread_name_prefix='image-upload',
+            )
+    return _executor
+
+
+def enqueue(job_id, delay=0):
+    """Отдаём задачу пулу после коммита (или с задержкой для повтора)"""
+    if not getattr(settings, 'CATALOG_IMAGE_UPLOAD_WORKERS', 2):
+        return  # Задачи разбирает только команда process_image_uploads
+
+    def submit():
+        get_executor().submit(_run_in_thread, job_id)
+
+    if delay:
+        timer = threading.Timer(delay, submit)
+        timer.daemon = True
+        timer.start()
+    else:
+        transaction.on_commit(submit)
+
+
+def requeue_stale_jobs(minutes=None):
+    """Задачи, зависшие в running (процесс умер посреди загрузки), - снова в очередь"""
+    from .models import ImageUploadJob
+
+    if minutes is None:
+        minutes = getattr(settings, 'CATALOG_IMAGE_UPLOAD_STALE_AFTER', 15)
+    now = timezone.now()
+    return ImageUploadJob.objects.filter(
+        status=ImageUploadJob.STATUS_RUNNING,
+        updated_at__lt=now - timedelta(minutes=minutes),
+    ).update(status=ImageUploadJob.STATUS_PENDING, next_attempt_at=now)
+
+
+def resume_jobs(limit=1000):
+    """
+    Ставит в пул этого процесса задачи из очереди: к сроку - сразу, с
+    отложенным повтором - таймером. Таймеры живут в памяти и пропадают при
+    перезапуске воркера (деплой, max_requests) - без этого повторы ждали бы
+    следующей загрузки. Задачу забирает условный UPDATE, поэтому одну и ту
+    же задачу могут подобрать несколько воркеров. Возвращает их число.
+    """
+    from .models import ImageUploadJob
+
+    if not getattr(settings, 'CATALOG_IMAGE_UPLOAD_WORKERS', 2) or get_image_store() is None:
+        return 0
+    requeue_stale_jobs()
+    now = timezone.now()
+    jobs = list(
+        ImageUploadJob.objects
+        .filter(status=ImageUploadJob.STATUS_PENDING)
+        .order_by('next_attempt_at')
+        .values_list('pk', 'next_attempt_at')[:limit]
+    )
+    for job_id, next_attempt_at in jobs:
+        delay = (next_attempt_at - now).total_seconds()
+        if delay > 0:
+            enqueue(job_id, delay=delay)
+        else:
+            get_executor().submit(_run_in_thread, job_id)
+    return len(jobs)
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    try:
+        process_job(job_id)
+    except Exception:
+        logger.exception('Ошибка обработки загрузки изображения #%s', job_id)
+    finally:
+        close_old_connections()
+
+
+def process_job(job_id):
+    """
+    Забираем задачу условным UPDATE (второй воркер её не получит), грузим файл
+    и записываем удалённый URL. Возвращает итоговый статус или None, если задачу
+    забрал кто-то другой.
+    """
+    from .models import ImageUploadJob, Product, ProductImage
+    from .signals import catalog_changed
+
+    now = timezone.now()
+    claimed = ImageUploadJob.objects.filter(
+        pk=job_id, status=ImageUploadJob.STATUS_PENDING, next_attempt_at__lte=now
+    ).update(status=ImageUploadJob.STATUS_RUNNING, attempts=F('attempts') + 1, updated_at=now)
+    if not claimed:
+        return None
+
+    job = ImageUploadJob.objects.select_related('image').get(pk=job_id)
+    image = job.image
+    # Файл на диске остаётся только у задач из старого staging в MEDIA_ROOT
+    on_disk = not job.content
+    if image.image.name != job.source:
+        # Фото успели заменить - этот файл больше никому не нужен
+        job.finish(ImageUploadJob.STATUS_DONE)
+        if on_disk:
+            default_storage.delete(job.source)
+        return job.status
+
+    try:
+        content = read_staged(job)
+        # Такой же файл мог загрузиться, пока задача ждала в очереди
+        asset = find_asset(content)
+        if asset is not None:
+            remote = asset.url
+        else:
+            remote = get_image_store().upload(
+                ContentFile(content, name=os.path.basename(job.source)), name=job.source
+            )
+    except Exception as exc:
+        return _retry_or_fail(job, exc)
+
+    with transaction.atomic():
+        if asset is None:
+            remember_asset(content, remote)
+        # Пишем URL, только если фото всё ещё то же самое
+        updated = ProductImage.objects.filter(pk=image.pk, image=job.source).update(
+            image=remote, upload_status=ProductImage.UPLOAD_READY
+        )
+        if updated:
+            Product.objects.filter(pk=image.product_id).update(updated_at=timezone.now())
+            catalog_changed.send(sender=ProductImage, product_ids=[image.product_id])
+        job.finish(ImageUploadJob.STATUS_DONE)
+    if on_disk:
+        default_storage.delete(job.source)
+    return job.status
+
+
+def _retry_or_fail(job, exc):
+    from .models import ImageUploadJob, ProductImage
+
+    logger.warning('Загрузка изображения #%s не удалась (попытка %s): %s', job.pk, job.attempts, exc)
+    max_attempts = getattr(settings, 'CATALOG_IMAGE_UPLOAD_MAX_ATTEMPTS', 5)
+    if job.attempts >= max_attempts:
+        job.finish(ImageUploadJob.STATUS_FAILED, error=str(exc))
+        ProductImage.objects.filter(pk=job.image_id).update(upload_status=ProductImage.UPLOAD_FAILED)
+        return job.status
+
+    # Экспоненциальная пауза: 10с, 20с, 40с... Таймер пропадёт с процессом -
+    # тогда задачу подберут resume_jobs или команда process_image_uploads
+    delay = getattr(settings, 'CATALOG_IMAGE_UPLOAD_RETRY_DELAY', 10) * 2 ** (job.attempts - 1)
+    job.status = ImageUploadJob.STATUS_PENDING
+    job.last_error = str(exc)
+    job.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['status', 'last_error', 'next_attempt_at', 'updated_at'])
+    enqueue(job.pk, delay=delay)
+    return job.status
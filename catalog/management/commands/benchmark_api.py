@@ -0,0 +1,214 @@
+import gc
+import json
+import statistics
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+from catalog.models import Product
+
+DEFAULT_BUDGETS = Path(__file__).resolve().parents[2] / 'benchmark_budgets.json'
+
+Route = namedtuple('Route', ['name', 'method', 'url', 'data', 'admin'], defaults=[None, False])
+
+# {category}, {product} - существующие объекты; {new_product} - новый товар на каждый прогон
+ROUTES = [
+    Route('categories.list', 'get', '/api/categories/'),
+    Route('categories.retrieve', 'get', '/api/categories/{category}/'),
+    Route('categories.create', 'post', '/api/categories/', {'title': 'Benchmark'}, admin=True),
+    Route('categories.update', 'patch', '/api/categories/{category}/', {'title': 'Benchmark'}, admin=True),
+    Route('products.list', 'get', '/api/products/'),
+    Route('products.list.category', 'get', '/api/products/?category={category}&is_active=true'),
+    Route('products.list.ordering', 'get', '/api/products/?ordering=price'),
+    Route('products.list.search', 'get', '/api/products/?search=шкаф'),
+    Route('products.list.cursor', 'get', '/api/products/?cursor='),
+    Route('products.list.grid', 'get', '/api/products/?view=grid'),
+    Route('products.list.admin', 'get', '/api/products/', admin=True),
+    Route('products.retrieve', 'get', '/api/products/{product}/'),
+    Route('products.by_category', 'get', '/api/products/by_category/?category_id={category}'),
+    Route('products.new_arrivals', 'get', '/api/products/new_arrivals/'),
+    Route('products.facets', 'get', '/api/products/facets/?search=шкаф'),
+    Route('products.export', 'get', '/api/products/export/?category={category}'),
+    Route('products.changes', 'get', '/api/products/changes/?page_size=100'),
+    Route('products.create', 'post', '/api/products/', {'title': 'Benchmark', 'category': '{category}'}, admin=True),
+    Route('products.update', 'patch', '/api/products/{product}/', {'price': '10.00'}, admin=True),
+    Route('products.toggle_active', 'post', '/api/products/{product}/toggle_active/', admin=True),
+    Route('products.destroy', 'delete', '/api/products/{new_product}/', admin=True),
+    Route('products.bulk', 'post', '/api/products/bulk/', {'operations': [
+        {'op': 'update', 'id': '{product}', 'data': {'price': '11.00'}},
+        {'op': 'create', 'data': {'title': 'Benchmark', 'category': '{category}'}},
+    ]}, admin=True),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every catalog API route: p50/p95 latency, payload size, SQL queries vs budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Measured requests per route')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--route', action='append', help='Only routes containing this substring')
+        parser.add_argument('--budgets', default=str(DEFAULT_BUDGETS), help='Budgets JSON file')
+        parser.add_argument('--update-budgets', action='store_true', help='Write current results as budgets')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=1.0,
+            help='Allowed p95 growth over budget (1.0 = up to 2x); query counts must not grow'
+        )
+        parser.add_argument('--cached', action='store_true', help='Keep the response cache enabled')
+        parser.add_argument('--json', dest='json_path', help='Also write the report as JSON')
+
+    def handle(self, *args, **options):
+        routes = [
+            route for route in ROUTES
+            if not options['route'] or any(part in route.name for part in options['route'])
+        ]
+        if not routes:
+            raise CommandError('Нет подходящих маршрутов')
+
+        caches = None if options['cached'] else {
+            'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+        }
+        results = {}
+        # Всё в транзакции с откатом - записи бенчмарка не остаются в базе;
+        # реплики этих записей не видят, поэтому читаем тоже из default.
+        # Троттлинг и замер задержки БД (лишний SELECT 1) мерили бы не то
+        with override_settings(
+            CATALOG_READ_REPLICAS=[],
+            CATALOG_THROTTLE_ENABLED=False,
+            CATALOG_SHED_DB_LATENCY_MS=0,
+            **({'CACHES': caches} if caches else {}),
+        ):
+            try:
+                with transaction.atomic():
+                    self.prepare()
+                    for route in routes:
+                        results[route.name] = self.measure(route, options['repeat'], options['warmup'])
+                        self.print_row(route.name, results[route.name])
+                    raise Rollback
+            except Rollback:
+                pass
+
+        if options['json_path']:
+            Path(options['json_path']).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+
+        budgets_path = Path(options['budgets'])
+        if options['update_budgets']:
+            budgets = json.loads(budgets_path.read_text()) if budgets_path.exists() else {}
+            for name, result in results.items():
+                budgets[name] = {'queries': result['queries'], 'p95_ms': result['p95_ms']}
+            budgets_path.write_text(json.dumps(dict(sorted(budgets.items())), indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'✅ Бюджеты записаны: {budgets_path}'))
+            return
+
+        if not budgets_path.exists():
+            self.stdout.write(f'ℹ️ Нет файла бюджетов {budgets_path} - только отчёт')
+            return
+        failures = self.check_budgets(results, json.loads(budgets_path.read_text()), options['latency_tolerance'])
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'Превышено бюджетов: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('✅ Все маршруты в пределах бюджетов'))
+
+    def prepare(self):
+        product = (
+            Product.objects.filter(is_active=True).exclude(category=None)
+            .values('pk', 'category_id').first()
+        )
+        if product is None:
+            raise CommandError('Каталог пуст - сначала запустите seed_catalog')
+        self.context = {'product': product['pk'], 'category': product['category_id']}
+
+        user = get_user_model().objects.create_user(
+            username='benchmark-admin', password=None, is_staff=True, is_superuser=True
+        )
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.*') or 'localhost'
+        self.anonymous = Client(SERVER_NAME=host)
+        self.admin = Client(SERVER_NAME=host, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+
+    def measure(self, route, repeat, warmup):
+        client = self.admin if route.admin else self.anonymous
+        timings, sizes, queries = [], [], []
+        for iteration in range(warmup + repeat):
+            context = dict(self.context)
+            if '{new_product}' in route.url:
+                context['new_product'] = Product.objects.create(
+                    title='Benchmark', category_id=context['category']
+                ).pk
+            url = route.url.format(**context)
+            kwargs = {'HTTP_ACCEPT': 'application/json'}
+            if route.data is not None:
+                kwargs.update(data=_format(route.data, context), content_type='application/json')
+
+            # Как timeit: сборка мусора не должна попадать в замер случайного запроса
+            gc.collect()
+            gc.disable()
+            try:
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, route.method)(url, **kwargs)
+                    body = b''.join(response) if response.streaming else response.content
+                    elapsed = time.perf_counter() - started
+            finally:
+                gc.enable()
+            if response.status_code >= 400:
+                raise CommandError(f'{route.name}: {url} -> HTTP {response.status_code}')
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+                sizes.append(len(body))
+                queries.append(len(captured))
+
+        return {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(_percentile(timings, 95), 2),
+            'bytes': max(sizes),
+            'queries': max(queries),
+        }
+
+    def print_row(self, name, result):
+        self.stdout.write(
+            f"{name:<28} p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+            f"{result['bytes']:>8} B  {result['queries']:>3} SQL"
+        )
+
+    def check_budgets(self, results, budgets, latency_tolerance):
+        failures = []
+        for name, result in results.items():
+            budget = budgets.get(name)
+            if budget is None:
+                self.stdout.write(f'ℹ️ {name}: бюджет не задан')
+                continue
+            if result['queries'] > budget['queries']:
+                failures.append(f"{name}: {result['queries']} SQL > бюджета {budget['queries']}")
+            limit = budget['p95_ms'] * (1 + latency_tolerance)
+            if result['p95_ms'] > limit:
+                failures.append(f"{name}: p95 {result['p95_ms']}ms > {limit:.2f}ms")
+        return failures
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _format(data, context):
+    """Подставляем {product}/{category} в тело запроса"""
+    if isinstance(data, dict):
+        return {key: _format(value, context) for key, value in data.items()}
+    if isinstance(data, list):
+        return [_format(value, context) for value in data]
+    if isinstance(data, str) and data.startswith('{') and data.endswith('}'):
+        return context[data[1:-1]]
+    return data
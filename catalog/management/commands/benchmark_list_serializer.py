@@ -0,0 +1,137 @@
+import gc
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from catalog.models import Product
+from catalog.renderers import FastJSONRenderer
+from catalog.serializers import ProductListRowSerializer, ProductListSerializer
+
+# Ответы эндпоинтов должны совпадать байт в байт на обоих путях
+COMPARE_URLS = [
+    '/api/products/?page_size=100',
+    '/api/products/?category={category}&ordering=price',
+    '/api/products/?status=new&ordering=-title',
+    '/api/products/?search={word}',
+    '/api/products/?cursor=&page_size=50',
+    '/api/products/?view=grid&ordering=price',
+    '/api/products/by_category/?category_id={category}',
+    '/api/products/new_arrivals/',
+]
+# Только рендерер: FastJSONRenderer и JSONRenderer DRF - одни и те же байты
+RENDER_URLS = ['/api/products/changes/?page_size=50', '/api/categories/']
+RENDER_CASES = [
+    {'updated_at': datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc), 'naive': datetime(2026, 1, 2)},
+    {'items': {0: ['Обязательное поле.']}},  # ошибки ListField/DictField - целые ключи
+    {'big': 2 ** 70},
+    {'text': 'строка\u2028с разделителем\u2029'},
+]
+
+
+class Command(BaseCommand):
+    help = 'Compare ProductListSerializer with the values()-based fast path: timings and byte-identical output'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        product = Product.objects.exclude(category=None).values('category_id', 'title').first()
+        if product is None:
+            raise CommandError('Каталог пуст - сначала запустите seed_catalog')
+        self.check_endpoints(product)
+
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.*') or 'localhost'
+        request = RequestFactory().get('/api/products/', SERVER_NAME=host)
+        queryset = (
+            Product.objects.select_related('category').prefetch_related('images')
+            .order_by('-created_at', '-id')[:options['page_size']]
+        )
+
+        def current():
+            rows = list(queryset.all())
+            fetched = time.perf_counter()
+            data = ProductListSerializer(rows, many=True, context={'request': request}).data
+            serialized = time.perf_counter()
+            return fetched, serialized, JSONRenderer().render(data)
+
+        def fast():
+            rows = list(ProductListRowSerializer.prepare(queryset.all()))
+            fetched = time.perf_counter()
+            # Фото - часть выборки, но выполняются внутри сериализатора
+            data = ProductListRowSerializer(rows, context={'request': request}).data
+            serialized = time.perf_counter()
+            return fetched, serialized, FastJSONRenderer().render(data)
+
+        results = {name: self.measure(path, options['repeat']) for name, path in [('current', current), ('fast', fast)]}
+        if results['current']['body'] != results['fast']['body']:
+            raise CommandError('Вывод быстрого сериализатора отличается от ProductListSerializer')
+
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<8} fetch {result['fetch']:>7.2f}ms  serialize {result['serialize']:>7.2f}ms  "
+                f"render {result['render']:>6.2f}ms  total {result['total']:>7.2f}ms  {len(result['body'])} B"
+            )
+        speedup = results['current']['total'] / results['fast']['total']
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Вывод совпадает, быстрый путь в {speedup:.1f}x быстрее на {options['page_size']} товарах"
+        ))
+
+    def measure(self, path, repeat):
+        samples = []
+        for _ in range(repeat + 2):
+            gc.collect()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                fetched, serialized, body = path()
+                finished = time.perf_counter()
+            finally:
+                gc.enable()
+            samples.append((fetched - started, serialized - fetched, finished - serialized, finished - started))
+        samples = samples[2:]  # прогрев
+        result = {
+            name: statistics.median(sample[index] for sample in samples) * 1000
+            for index, name in enumerate(['fetch', 'serialize', 'render', 'total'])
+        }
+        result['body'] = body
+        return result
+
+    def check_endpoints(self, product):
+        """Эндпоинты целиком (пагинация, фильтры, рендерер) с быстрым путём и без"""
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.*') or 'localhost'
+        client = Client(SERVER_NAME=host)
+        context = {'category': product['category_id'], 'word': product['title'].split()[0]}
+        dummy_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        for url in COMPARE_URLS:
+            url = url.format(**context)
+            bodies = []
+            for fast in (False, True):
+                with override_settings(CATALOG_FAST_LIST_SERIALIZER=fast, CACHES=dummy_cache, CATALOG_THROTTLE_ENABLED=False):
+                    response = client.get(url, HTTP_ACCEPT='application/json')
+                if response.status_code != 200:
+                    raise CommandError(f'{url} -> HTTP {response.status_code}')
+                bodies.append(response.content)
+                self.check_renderer(url, response)
+            if bodies[0] != bodies[1]:
+                raise CommandError(f'{url}: ответы отличаются')
+            self.stdout.write(f'{url}: совпадает ({len(bodies[1])} B)')
+
+        for url in RENDER_URLS:
+            with override_settings(CACHES=dummy_cache, CATALOG_THROTTLE_ENABLED=False):
+                response = client.get(url, HTTP_ACCEPT='application/json')
+            if response.status_code != 200:
+                raise CommandError(f'{url} -> HTTP {response.status_code}')
+            self.check_renderer(url, response)
+        for data in RENDER_CASES:
+            if FastJSONRenderer().render(data) != JSONRenderer().render(data):
+                raise CommandError(f'FastJSONRenderer отличается от JSONRenderer на {data!r}')
+        self.stdout.write('Рендереры совпадают')
+
+    def check_renderer(self, url, response):
+        if response.content != JSONRenderer().render(response.data):
+            raise CommandError(f'{url}: FastJSONRenderer отличается от JSONRenderer')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from catalog.snapshot import build_snapshot, get_snapshot_root
+
+
+class Command(BaseCommand):
+    help = (
+        'Render categories, first pages of new_arrivals/by_category and product details into '
+        'content-hashed, precompressed JSON files plus manifest.json (served by WhiteNoise). '
+        'Only products whose updated_at changed are re-rendered'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Re-render every product')
+        parser.add_argument('--base-url', help='API origin for pagination links and image URLs')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = build_snapshot(full=options['full'], base_url=options['base_url'])
+        if stats is None:
+            raise CommandError('Снимок уже собирает другой процесс')
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Снимок каталога в {get_snapshot_root()}: товаров {stats['products']}, "
+            f"перерисовано {stats['rendered']}{' (полная сборка)' if stats['full'] else ''}, "
+            f"новых файлов {stats['written']}, удалено {stats['removed']} "
+            f"за {time.perf_counter() - started:.1f}с"
+        ))
@@ -0,0 +1,167 @@
+import json
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from catalog.models import Category, Product, ProductImage, Tombstone
+from catalog.seeding import generate_catalog
+
+# Таблицы, по которым полный скан + сортировка считается регрессией
+WATCHED_TABLES = {Product._meta.db_table, ProductImage._meta.db_table, Tombstone._meta.db_table}
+
+# (название, URL); {category} и {product} подставляются из данных
+ENDPOINTS = [
+    ('list', '/api/products/'),
+    ('list ?category', '/api/products/?category={category}'),
+    ('list ?category&is_active', '/api/products/?category={category}&is_active=true'),
+    ('list ?is_active', '/api/products/?is_active=true'),
+    ('list ?status', '/api/products/?status=regular'),
+    ('list ?ordering=price', '/api/products/?ordering=price'),
+    ('list ?ordering=-title', '/api/products/?ordering=-title'),
+    ('list ?view=grid', '/api/products/?view=grid'),
+    ('list cursor', '/api/products/?cursor='),
+    ('list cursor ?category', '/api/products/?cursor=&category={category}'),
+    ('list cursor ?ordering=title', '/api/products/?cursor=&ordering=title'),
+    # NULL-цены в курсоре идут последними (NULLS LAST) - SQLite тоже идёт по индексу
+    ('list cursor ?ordering=price', '/api/products/?cursor=&ordering=price'),
+    ('by_category', '/api/products/by_category/?category_id={category}'),
+    ('new_arrivals', '/api/products/new_arrivals/'),
+    ('facets', '/api/products/facets/?status=new'),
+    ('retrieve', '/api/products/{product}/'),
+    ('changes', '/api/products/changes/?page_size=100'),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the SQL issued by product endpoints and fail on sequential scan + sort'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Insert N synthetic products for the check (rolled back afterwards)'
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def handle(self, *args, **options):
+        self.verbose_plans = options['verbose_plans']
+        failures = []
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                analyze()
+                failures = self.check_endpoints()
+                # Синтетические данные не должны попасть в базу
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            for name, sql, reason in failures:
+                self.stderr.write(f'{name}: {reason}\n  {sql[:300]}')
+            raise CommandError(f'Регрессий плана: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('✅ Все запросы каталога используют индексы'))
+
+    def check_endpoints(self):
+        if not Product.objects.exists():
+            raise CommandError('Нет товаров - запустите с --seed N')
+        failures = []
+        for name, url, response, queries in request_endpoints():
+            if response.status_code != 200:
+                raise CommandError(f'{name}: {url} -> HTTP {response.status_code}')
+            for sql in queries:
+                reason = check_plan(sql, self.stdout.write if self.verbose_plans else None)
+                if reason:
+                    failures.append((name, sql, reason))
+            self.stdout.write(f'{name}: {len(queries)} запрос(ов)')
+        return failures
+
+    def seed(self, count):
+        generate_catalog(count, images=2)
+        self.stdout.write(f'ℹ️ Добавлено товаров для проверки: {count}')
+
+
+def request_endpoints():
+    """
+    (название, URL, ответ, SELECT'ы) по каждому из ENDPOINTS. Запросы идут через
+    настоящий стек (middleware, фильтры, пагинация); общая часть команды и
+    catalog/tests/test_query_plans.py
+    """
+    category_id = (
+        Product.objects.exclude(category=None).values_list('category_id', flat=True).first()
+        or Category.objects.values_list('pk', flat=True).first()
+    )
+    product_id = Product.objects.values_list('pk', flat=True).first()
+    client = Client(SERVER_NAME=(settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.*') or 'localhost')
+    # Кэш ответов спрятал бы запросы - проверяем "холодный" путь; планы - на default
+    with override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        CATALOG_READ_REPLICAS=[],
+        CATALOG_THROTTLE_ENABLED=False,
+        CATALOG_SHED_DB_LATENCY_MS=0,
+    ):
+        for name, url in ENDPOINTS:
+            url = url.format(category=category_id, product=product_id)
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(url, HTTP_ACCEPT='application/json')
+            queries = [
+                query['sql'] for query in captured.captured_queries
+                if query['sql'].lstrip().upper().startswith('SELECT')
+            ]
+            yield name, url, response, queries
+
+
+def check_plan(sql, write=None):
+    """Причина регрессии или None; write - куда печатать план"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = list(_walk(plan[0]['Plan']))
+        if write:
+            write(json.dumps(plan, indent=2))
+        seq_scans = [
+            node['Relation Name'] for node in nodes
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in WATCHED_TABLES
+        ]
+        has_sort = any(node['Node Type'] in ('Sort', 'Incremental Sort') for node in nodes)
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            details = [row[-1] for row in cursor.fetchall()]
+        if write:
+            write('\n'.join(details))
+        # "SCAN catalog_product" без "USING ... INDEX" - полный проход по таблице
+        seq_scans = [
+            match.group(1) for match in map(re.compile(r'^SCAN (\w+)$').match, details)
+            if match and match.group(1) in WATCHED_TABLES
+        ]
+        has_sort = any('TEMP B-TREE FOR ORDER BY' in detail for detail in details)
+    else:
+        raise CommandError(f'EXPLAIN для {connection.vendor} не поддерживается')
+
+    if seq_scans and has_sort:
+        return f'sequential scan of {", ".join(seq_scans)} + sort'
+    return None
+
+
+def analyze():
+    """Свежая статистика - иначе планировщик на маленькой таблице выберет seq scan"""
+    with connection.cursor() as cursor:
+        for table in WATCHED_TABLES:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk(child)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from catalog.changes import compact_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete change-feed tombstones older than CATALOG_CHANGES_RETENTION_DAYS and image tombstones '
+        'covered by a deleted product (run from cron; also runs after deletes once per interval)'
+    )
+
+    def handle(self, *args, **options):
+        deleted = compact_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'✅ Удалено надгробий: {deleted}'))
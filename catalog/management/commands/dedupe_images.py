@@ -0,0 +1,135 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from catalog.images import content_hash, get_image_store, perceptual_hash, read_stored_image
+from catalog.models import ImageAsset, Product, ProductImage
+from catalog.signals import catalog_changed
+
+
+class Command(BaseCommand):
+    help = (
+        'Hash the stored files of product images, point rows with identical content at one file, '
+        'index every file for upload deduplication and report the storage saved'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report, change nothing')
+        parser.add_argument(
+            '--delete-files', action='store_true',
+            help='Delete duplicate files that are no longer referenced from the image store',
+        )
+        parser.add_argument('--workers', type=int, default=8, help='Parallel downloads')
+        parser.add_argument('--timeout', type=float, default=20, help='Download timeout, seconds')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        # Фото в staging ещё загружаются - ими займётся фоновая задача
+        usage = Counter(
+            ProductImage.objects
+            .filter(upload_status=ProductImage.UPLOAD_READY)
+            .exclude(image='')
+            .values_list('image', flat=True)
+        )
+        # Файлы из индекса не скачиваем повторно
+        index = list(ImageAsset.objects.values_list('content_hash', 'url', 'size', 'perceptual_hash'))
+        indexed = {digest: url for digest, url, _, _ in index}
+        files = {url: (digest, size, phash) for digest, url, size, phash in index if url in usage}
+        missing = [url for url in usage if url not in files]
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for url, info in zip(missing, pool.map(lambda url: self.describe(url, options['timeout']), missing)):
+                if info is None:
+                    failed += 1
+                else:
+                    files[url] = info
+        self.stdout.write(
+            f'ℹ️ Фото: {sum(usage.values())}, файлов: {len(usage)}, скачано: {len(missing) - failed}, '
+            f'не прочитано: {failed}' + (' (подробности: -v 2)' if failed and self.verbosity < 2 else '')
+        )
+
+        groups = {}
+        for url, (digest, size, phash) in files.items():
+            groups.setdefault(digest, []).append(url)
+
+        # Остаётся файл из индекса, иначе - самый используемый
+        plan = {}
+        for digest, urls in groups.items():
+            keep = indexed.get(digest)
+            if keep not in urls:
+                keep = max(urls, key=lambda url: (usage[url], url))
+            plan[digest] = (keep, [url for url in urls if url != keep])
+        duplicates = [url for keep, others in plan.values() for url in others]
+        saved = sum(files[url][1] for url in duplicates)
+        rows = sum(usage[url] for url in duplicates)
+        self.stdout.write(
+            f'ℹ️ Дубликатов: {len(duplicates)} файлов ({rows} фото) в '
+            f'{sum(1 for _, others in plan.values() if others)} группах, {saved / 1024 / 1024:.1f} МБ'
+        )
+        if options['dry_run']:
+            self.stdout.write('ℹ️ Пробный запуск - ничего не изменено')
+            return
+
+        with transaction.atomic():
+            product_ids = set()
+            for digest, (keep, others) in plan.items():
+                if others:
+                    images = ProductImage.objects.filter(image__in=others)
+                    product_ids.update(images.values_list('product_id', flat=True))
+                    images.update(image=keep)
+                if indexed.get(digest) == keep:
+                    continue
+                _, size, phash = files[keep]
+                ImageAsset.objects.update_or_create(
+                    content_hash=digest, defaults={'url': keep, 'size': size, 'perceptual_hash': phash}
+                )
+            if product_ids:
+                Product.objects.filter(pk__in=product_ids).update(updated_at=timezone.now())
+                catalog_changed.send(sender=ProductImage, product_ids=sorted(product_ids))
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Перенаправлено фото: {rows}, товаров: {len(product_ids)}, в индексе файлов: {len(plan)}'
+        ))
+
+        if options['delete_files']:
+            deleted = self.delete_files(duplicates)
+            freed = sum(files[url][1] for url in deleted)
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Удалено файлов: {len(deleted)}, освобождено {freed / 1024 / 1024:.1f} МБ'
+            ))
+        elif duplicates:
+            self.stdout.write('ℹ️ Файлы дубликатов не удалены (--delete-files)')
+
+    def describe(self, url, timeout):
+        """(sha256, размер, dHash) файла; None - не скачался"""
+        try:
+            content = read_stored_image(url, timeout=timeout)
+        except Exception as exc:
+            if self.verbosity >= 2:
+                self.stderr.write(f'{url}: {exc}')
+            return None
+        return content_hash(content), len(content), perceptual_hash(content)
+
+    def delete_files(self, urls):
+        """Только файлы, на которые больше нет ссылок и которые лежат в нашем хранилище; удалённые"""
+        store = get_image_store()
+        deleted = []
+        for url in urls:
+            if ProductImage.objects.filter(image=url).exists():
+                continue
+            remote = urlsplit(url).scheme in ('http', 'https')
+            if remote and (store is None or not store.owns(url)):
+                continue
+            try:
+                if remote:
+                    store.delete(url)
+                else:
+                    default_storage.delete(url)
+            except Exception as exc:
+                self.stderr.write(f'{url}: {exc}')
+                continue
+            deleted.append(url)
+        return deleted
@@ -0,0 +1,56 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from catalog.models import Product
+
+COLUMNS = ['external_id', 'title', 'category', 'description', 'price', 'status', 'is_active']
+
+
+class Command(BaseCommand):
+    help = 'Stream products to CSV/JSONL (same columns import_products reads)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help='Output file ("-" for stdout)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: by file extension')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--active-only', action='store_true')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+
+        queryset = Product.objects.order_by('pk')
+        if options['active_only']:
+            queryset = queryset.filter(is_active=True)
+        # values_list + iterator: строки идут с сервера порциями, таблица в память не грузится
+        rows = queryset.values_list(
+            'external_id', 'title', 'category__title', 'description', 'price', 'status', 'is_active'
+        ).iterator(chunk_size=options['chunk_size'])
+
+        stream = sys.stdout if path == '-' else open(path, 'w', encoding='utf-8', newline='')
+        started = time.monotonic()
+        count = 0
+        try:
+            if file_format == 'csv':
+                writer = csv.writer(stream)
+                writer.writerow(COLUMNS)
+                for row in rows:
+                    writer.writerow(['' if value is None else value for value in row])
+                    count += 1
+            else:
+                for row in rows:
+                    record = dict(zip(COLUMNS, row))
+                    if record['price'] is not None:
+                        record['price'] = str(record['price'])
+                    stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = count / elapsed if elapsed else 0
+        self.stderr.write(self.style.SUCCESS(f'✅ Выгружено: {count} товар(ов) за {elapsed:.1f}с ({rate:.0f} строк/с)'))
@@ -0,0 +1,239 @@
+import csv
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from catalog.models import Category, Product
+from catalog.signals import catalog_changed
+
+COMPARE_FIELDS = ['external_id', 'title', 'category_id', 'description', 'price', 'status', 'is_active']
+STATUSES = {value for value, _ in Product.STATUS_CHOICES}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'нет', 'off'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def clean_field(model, field_name, value, name=None):
+    """Проверки поля модели (max_length, max_digits...) - ошибкой строки, а не БД"""
+    try:
+        return model._meta.get_field(field_name).clean(value, None)
+    except ValidationError as exc:
+        raise RowError(f'invalid {name or field_name}: {value!r} ({" ".join(exc.messages)})')
+
+
+class Command(BaseCommand):
+    help = 'Stream products from CSV/JSONL and upsert them by external_id in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file ("-" for stdin)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Default: by file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--no-create-categories', action='store_true',
+            help='Reject rows with unknown category instead of creating it'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        self.create_categories = not options['no_create_categories']
+        self.category_cache = {}
+
+        stream = (
+            io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig') if path == '-'
+            else open(path, encoding='utf-8-sig', newline='')
+        )
+        totals = {'created': 0, 'updated': 0, 'errors': 0, 'rows': 0}
+        started = time.monotonic()
+        try:
+            rows = self.read_rows(stream, file_format)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                batch_started = time.monotonic()
+                created, updated, errors = self.import_batch(batch)
+                totals['created'] += created
+                totals['updated'] += updated
+                totals['errors'] += len(errors)
+                totals['rows'] += len(batch)
+                for line, message in errors:
+                    self.stderr.write(f'line {line}: {message}')
+                elapsed = time.monotonic() - batch_started
+                self.stdout.write(
+                    f'batch: +{created} ~{updated} ={len(batch) - created - updated - len(errors)} !{len(errors)} '
+                    f'({len(batch) / elapsed if elapsed else 0:.0f} rows/s)'
+                )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - started
+        rate = totals['rows'] / elapsed if elapsed else 0
+        style = self.style.SUCCESS if not totals['errors'] else self.style.WARNING
+        self.stdout.write(style(
+            f"✅ Строк: {totals['rows']}, создано: {totals['created']}, обновлено: {totals['updated']}, "
+            f"ошибок: {totals['errors']} за {elapsed:.1f}с ({rate:.0f} строк/с)"
+        ))
+
+    def read_rows(self, stream, file_format):
+        """Генератор (номер строки, dict) - файл читается потоково"""
+        if file_format == 'csv':
+            reader = csv.DictReader(stream)
+            missing = {'title'} - set(reader.fieldnames or [])
+            if missing:
+                raise CommandError(f'CSV has no columns: {", ".join(sorted(missing))}')
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError('expected an object')
+                except ValueError as exc:
+                    yield line_num, RowError(f'invalid JSON: {exc}')
+                    continue
+                yield line_num, row
+
+    def import_batch(self, batch):
+        errors = []
+        parsed = {}
+        new_products = []
+        for line, row in batch:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                data = self.parse_row(row)
+            except RowError as exc:
+                errors.append((line, str(exc)))
+                continue
+            if data['external_id']:
+                # Повтор ключа внутри пачки - побеждает последняя строка
+                parsed[data['external_id']] = (line, data)
+            else:
+                new_products.append((line, data))
+
+        with transaction.atomic():
+            self.resolve_categories([*parsed.values(), *new_products], errors)
+            existing = {
+                row['external_id']: row
+                for row in Product.objects
+                .filter(external_id__in=list(parsed))
+                .values('id', *COMPARE_FIELDS)
+            }
+
+            to_create, to_update = [], []
+            changed_fields = set()
+            touched_categories = set()
+            for line, data in [*parsed.values(), *new_products]:
+                if data.get('error'):
+                    continue
+                values = {name: data[name] for name in COMPARE_FIELDS}
+                current = existing.get(data['external_id'])
+                if current is None:
+                    to_create.append(Product(**values))
+                    touched_categories.add(values['category_id'])
+                    continue
+                # Неизменённые строки (типичный прайс: поменялись только цены) пропускаем
+                changed = {name for name in COMPARE_FIELDS if values[name] != current[name]}
+                if not changed:
+                    continue
+                changed_fields |= changed
+                touched_categories.update([current['category_id'], values['category_id']])
+                to_update.append(Product(pk=current['id'], **values))
+
+            now = timezone.now()
+            for product in to_update:
+                product.updated_at = now
+            created = Product.objects.bulk_create(to_create)
+            if to_update:
+                # Обновляем только реально изменившиеся колонки - CASE-выражений меньше
+                Product.objects.bulk_update(to_update, [*sorted(changed_fields), 'updated_at'])
+            if created or to_update:
+                catalog_changed.send(
+                    sender=Product,
+                    product_ids=[product.pk for product in [*created, *to_update] if product.pk],
+                    category_ids=list(touched_categories),
+                )
+        return len(created), len(to_update), errors
+
+    def parse_row(self, row):
+        title = str(row.get('title') or '').strip()
+        if not title:
+            raise RowError('title is required')
+        external_id = clean_field(Product, 'external_id', str(row.get('external_id') or '').strip() or None)
+
+        price = row.get('price')
+        if price in (None, ''):
+            price = None
+        else:
+            try:
+                price = Decimal(str(price).replace(',', '.')).quantize(Decimal('0.01'))
+            except InvalidOperation:
+                raise RowError(f'invalid price: {price!r}')
+            # max_digits/decimal_places: иначе строка упадёт в БД (PostgreSQL - всю пачку)
+            price = clean_field(Product, 'price', price)
+
+        status = str(row.get('status') or 'regular').strip()
+        if status not in STATUSES:
+            raise RowError(f'invalid status: {status!r}')
+
+        is_active = row.get('is_active', True)
+        if is_active is None:
+            # null в JSON - как пустая ячейка CSV
+            is_active = True
+        elif isinstance(is_active, str):
+            value = is_active.strip().lower()
+            if value in TRUE_VALUES or value == '':
+                is_active = True
+            elif value in FALSE_VALUES:
+                is_active = False
+            else:
+                raise RowError(f'invalid is_active: {is_active!r}')
+        elif not isinstance(is_active, (bool, int)) or is_active not in (0, 1):
+            raise RowError(f'invalid is_active: {is_active!r}')
+
+        category = str(row.get('category') or '').strip()
+        if category:
+            category = clean_field(Category, 'title', category, name='category')
+
+        return {
+            'external_id': external_id,
+            'title': title[:300],
+            'category': category,
+            'description': str(row.get('description') or ''),
+            'price': price,
+            'status': status,
+            'is_active': bool(is_active),
+        }
+
+    def resolve_categories(self, items, errors):
+        """Категории по названию: кэш на весь прогон, недостающие создаём одной пачкой"""
+        titles = {data['category'] for _, data in items if data['category']} - set(self.category_cache)
+        if titles:
+            for pk, title in Category.objects.filter(title__in=titles).values_list('id', 'title'):
+                self.category_cache.setdefault(title, pk)
+            missing = titles - set(self.category_cache)
+            if missing and self.create_categories:
+                for category in Category.objects.bulk_create(Category(title=title) for title in sorted(missing)):
+                    self.category_cache[category.title] = category.pk
+
+        for line, data in items:
+            title = data['category']
+            data['category_id'] = self.category_cache.get(title) if title else None
+            if title and data['category_id'] is None:
+                data['error'] = True
+                errors.append((line, f'unknown category: {title!r}'))
@@ -0,0 +1,268 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from catalog.models import Product
+from .benchmark_api import _percentile
+
+BASE_DIR = Path(__file__).resolve().parents[3]
+GUNICORN_CONFIG = BASE_DIR / 'config' / 'gunicorn.conf.py'
+
+# Чтения с async-обработчиками (catalog/asgi.py); {category}, {product} - существующие объекты
+ROUTES = [
+    ('categories.list', '/api/categories/'),
+    ('products.list', '/api/products/'),
+    ('products.list.category', '/api/products/?category={category}&is_active=true'),
+    ('products.list.cursor', '/api/products/?cursor='),
+    ('products.list.grid', '/api/products/?view=grid'),
+    ('products.retrieve', '/api/products/{product}/'),
+    ('products.by_category', '/api/products/by_category/?category_id={category}'),
+    ('products.new_arrivals', '/api/products/new_arrivals/'),
+]
+
+# Модели воркеров config/gunicorn.conf.py (GUNICORN_WORKER_CLASS); первая - база для сравнения
+SERVERS = {
+    'sync': {'CATALOG_ASYNC_VIEWS': 'False'},
+    'gthread': {'CATALOG_ASYNC_VIEWS': 'False'},
+    'uvicorn': {'CATALOG_ASYNC_VIEWS': 'True'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Start the API with config/gunicorn.conf.py under each worker model (sync, gthread, uvicorn) '
+        'with the same processes, check that all return identical responses, then load each with '
+        'concurrent clients and compare throughput and tail latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker processes per server')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per gthread worker')
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous client connections')
+        parser.add_argument('--duration', type=float, default=10, help='Measured seconds per server')
+        parser.add_argument('--warmup', type=float, default=2, help='Unmeasured seconds per server')
+        parser.add_argument(
+            '--slow-clients', type=int, default=0,
+            help='Extra clients that send request headers slowly (unmeasured), like mobile connections',
+        )
+        parser.add_argument('--slow-ms', type=int, default=1000, help='Header delay of a slow client')
+        parser.add_argument('--route', action='append', help='Only routes containing this substring')
+        parser.add_argument('--server', action='append', choices=list(SERVERS), help='Only these servers')
+        parser.add_argument('--cached', action='store_true', help='Keep the response cache enabled')
+        parser.add_argument('--json', dest='json_path', help='Also write the report as JSON')
+
+    def handle(self, *args, **options):
+        product = (
+            Product.objects.filter(is_active=True).exclude(category=None)
+            .values('pk', 'category_id').first()
+        )
+        if product is None:
+            raise CommandError('Каталог пуст - сначала запустите seed_catalog')
+        context = {'product': product['pk'], 'category': product['category_id']}
+        routes = [
+            (name, url.format(**context)) for name, url in ROUTES
+            if not options['route'] or any(part in name for part in options['route'])
+        ]
+        if not routes:
+            raise CommandError('Нет подходящих маршрутов')
+        self.host = (settings.ALLOWED_HOSTS or ['localhost'])[0].lstrip('.*') or 'localhost'
+        self.slow_clients = options['slow_clients']
+        self.slow_delay = options['slow_ms'] / 1000
+
+        servers = {}
+        try:
+            for name in options['server'] or SERVERS:
+                servers[name] = self.start(name, options['workers'], options['threads'], options['cached'])
+            if len(servers) > 1:
+                self.compare(servers, routes)
+
+            report = {}
+            for name, (process, port) in servers.items():
+                asyncio.run(self.load(port, routes, options['concurrency'], options['warmup']))
+                samples, elapsed = asyncio.run(
+                    self.load(port, routes, options['concurrency'], options['duration'])
+                )
+                report[name] = self.summarize(samples, elapsed)
+                self.print_report(name, report[name])
+        finally:
+            for process, port in servers.values():
+                process.terminate()
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+        base, *others = report
+        for name in others:
+            rps = report[name]['rps'] / report[base]['rps'] if report[base]['rps'] else 0
+            self.stdout.write(
+                f"ℹ️ {name} / {base}: пропускная способность {rps:.2f}x, "
+                f"p99 {report[name]['p99_ms']:.2f}ms против {report[base]['p99_ms']:.2f}ms"
+            )
+        if options['json_path']:
+            Path(options['json_path']).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    def start(self, name, workers, threads, cached):
+        """Сервер на свободном порту; ждём, пока начнёт отвечать"""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        # Нагрузка идёт с одного IP - троттлинг отвечал бы 429 вместо работы
+        env = {
+            **os.environ, **SERVERS[name],
+            'GUNICORN_WORKER_CLASS': name,
+            'CATALOG_PROFILING_SAMPLE_RATE': '0',
+            'CATALOG_THROTTLE_ENABLED': 'False',
+        }
+        if not cached:
+            env['CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+        log = tempfile.TemporaryFile()
+        # У sync --threads больше 1 включил бы gthread
+        args = ['--threads', str(threads)] if name == 'gthread' else []
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', str(GUNICORN_CONFIG), *args, '--workers', str(workers),
+             '--bind', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                break
+            try:
+                status, _ = asyncio.run(self.fetch(port, '/api/categories/'))
+            except OSError:
+                time.sleep(0.2)
+                continue
+            if status == 200:
+                threads_note = f', потоков {threads}' if name == 'gthread' else ''
+                self.stdout.write(f'ℹ️ {name}: порт {port}, воркеров {workers}{threads_note}')
+                return process, port
+            break
+        process.kill()
+        log.seek(0)
+        raise CommandError(f'{name} не запустился:\n{log.read().decode(errors="replace")[-2000:]}')
+
+    async def fetch(self, port, url, delay=0):
+        """GET по новому соединению; (статус, тело). delay - медленный клиент: конец заголовков через delay секунд"""
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            request = (
+                f'GET {quote(url, safe="/?=&%")} HTTP/1.1\r\nHost: {self.host}\r\n'
+                'Accept: application/json\r\nConnection: close\r\n\r\n'
+            ).encode()
+            if delay:
+                writer.write(request[:-2])
+                await writer.drain()
+                await asyncio.sleep(delay)
+                request = request[-2:]
+            writer.write(request)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, body = raw.partition(b'\r\n\r\n')
+        if b'transfer-encoding: chunked' in head.lower():
+            body = _dechunk(body)
+        return int(head.split(b' ', 2)[1]), body
+
+    def compare(self, servers, routes):
+        """Один и тот же запрос к каждому серверу - статус и тело должны совпасть"""
+        mismatches = []
+        for name, url in routes:
+            responses = {
+                server: asyncio.run(self.fetch(port, url)) for server, (process, port) in servers.items()
+            }
+            if len(set(responses.values())) > 1:
+                statuses = ', '.join(f'{server} {status}' for server, (status, _) in responses.items())
+                mismatches.append(f'{name}: {url} - ответы различаются ({statuses})')
+        if mismatches:
+            raise CommandError('\n'.join(mismatches))
+        self.stdout.write(self.style.SUCCESS(f'✅ Ответы серверов совпадают на {len(routes)} маршрутах'))
+
+    async def load(self, port, routes, concurrency, duration):
+        """
+        concurrency клиентов по кругу маршрутов (плюс медленные, их не меряем);
+        [(маршрут, статус, мс)], секунды
+        """
+        samples = []
+        order = itertools.cycle(routes)
+        started = time.perf_counter()
+        deadline = started + duration
+
+        async def client():
+            while time.perf_counter() < deadline:
+                name, url = next(order)
+                request_started = time.perf_counter()
+                try:
+                    status, _ = await self.fetch(port, url)
+                except (OSError, ValueError, IndexError):
+                    status = None
+                samples.append((name, status, (time.perf_counter() - request_started) * 1000))
+
+        async def slow_client():
+            while time.perf_counter() < deadline:
+                try:
+                    await self.fetch(port, next(order)[1], self.slow_delay)
+                except (OSError, ValueError, IndexError):
+                    await asyncio.sleep(self.slow_delay)
+
+        await asyncio.gather(
+            *(client() for _ in range(concurrency)),
+            *(slow_client() for _ in range(self.slow_clients)),
+        )
+        return samples, time.perf_counter() - started
+
+    def summarize(self, samples, elapsed):
+        def stats(items):
+            timings = [ms for _, _, ms in items]
+            return {
+                'requests': len(items),
+                'errors': sum(1 for _, status, _ in items if status is None or status >= 400),
+                'p50_ms': round(statistics.median(timings), 2) if timings else None,
+                'p95_ms': round(_percentile(timings, 95), 2) if timings else None,
+                'p99_ms': round(_percentile(timings, 99), 2) if timings else None,
+            }
+
+        routes = {}
+        for sample in samples:
+            routes.setdefault(sample[0], []).append(sample)
+        return {
+            **stats(samples),
+            'rps': round(len(samples) / elapsed, 1),
+            'routes': {name: stats(items) for name, items in routes.items()},
+        }
+
+    def print_report(self, name, result):
+        self.stdout.write(
+            f"{name:<8} {result['rps']:>8.1f} req/s  p50 {result['p50_ms']:>8.2f}ms  "
+            f"p95 {result['p95_ms']:>8.2f}ms  p99 {result['p99_ms']:>8.2f}ms  ошибок {result['errors']}"
+        )
+        for route, stats in result['routes'].items():
+            self.stdout.write(
+                f"  {route:<26} p50 {stats['p50_ms']:>8.2f}ms  p95 {stats['p95_ms']:>8.2f}ms  "
+                f"{stats['requests']:>6} запросов"
+            )
+
+
+def _dechunk(body):
+    """Тело ответа с Transfer-Encoding: chunked"""
+    result = bytearray()
+    while body:
+        size_line, _, body = body.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if not size:
+            break
+        result += body[:size]
+        body = body[size + 2:]
+    return bytes(result)
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from catalog.images import get_image_store, process_job, requeue_stale_jobs
+from catalog.models import ImageUploadJob
+
+
+class Command(BaseCommand):
+    help = 'Process queued product image uploads (background worker loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Process due jobs and exit')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between queue polls')
+        parser.add_argument(
+            '--stale-after', type=int, default=settings.CATALOG_IMAGE_UPLOAD_STALE_AFTER,
+            help='Minutes after which a running job is considered abandoned and requeued'
+        )
+
+    def handle(self, *args, **options):
+        if get_image_store() is None:
+            self.stdout.write(self.style.ERROR('CATALOG_IMAGE_STORE not set!'))
+            return
+
+        while True:
+            requeue_stale_jobs(options['stale_after'])
+            done = self.process_due()
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'✅ Обработано задач: {done}'))
+                return
+            if not done:
+                time.sleep(options['interval'])
+
+    def process_due(self):
+        job_ids = list(
+            ImageUploadJob.objects
+            .filter(status=ImageUploadJob.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:100]
+        )
+        done = 0
+        for job_id in job_ids:
+            status = process_job(job_id)
+            if status is not None:
+                done += 1
+                self.stdout.write(f'#{job_id}: {status}')
+        return done
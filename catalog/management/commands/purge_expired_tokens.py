@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from catalog.authentication import purge_expired_tokens
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted JWT refresh tokens (run from cron)'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_tokens()
+        self.stdout.write(self.style.SUCCESS(f'✅ Удалено токенов: {deleted}'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from catalog.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Install search triggers/indexes and rebuild the product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend(options['database'])
+        if backend is None:
+            self.stdout.write(self.style.WARNING('ℹ️ Для этой СУБД индексного поиска нет, используется icontains'))
+            return
+
+        with transaction.atomic(using=options['database']):
+            backend.install()
+            total = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Поисковый индекс пересобран: {total} товар(ов)'))
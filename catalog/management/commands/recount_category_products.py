@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from catalog.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recalculate denormalized active product counters for all categories'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = Category.objects.recount_active_products()
+        self.stdout.write(self.style.SUCCESS(f'✅ Пересчитано категорий: {updated}'))
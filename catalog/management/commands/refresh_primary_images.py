@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from catalog.cache import bump_catalog_version
+from catalog.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized primary images and their srcset URLs (e.g. after changing CATALOG_IMAGE_SRCSET_WIDTHS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = Product.objects.refresh_primary_images(options['batch_size'], touch=True)
+        if changed:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'✅ Обновлено товаров: {changed}'))
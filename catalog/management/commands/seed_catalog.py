@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from catalog.seeding import clear_catalog, generate_catalog
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic catalog for benchmarks (e.g. --scale 100k)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='1k', help='Number of products')
+        parser.add_argument('--products', type=int, help='Exact number of products (overrides --scale)')
+        parser.add_argument('--images', type=int, default=3, help='Average images per product')
+        parser.add_argument('--categories', type=int, help='Default: one per 500 products')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed - same catalog)')
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Delete previously generated categories and their products first'
+        )
+
+    def handle(self, *args, **options):
+        products = options['products'] or SCALES[options['scale']]
+        prefix = 'Seed'
+        started = time.monotonic()
+
+        if options['clear']:
+            with transaction.atomic():
+                deleted = clear_catalog(prefix)
+            self.stdout.write(f'ℹ️ Удалено объектов: {deleted}')
+
+        with transaction.atomic():
+            categories, products, images = generate_catalog(
+                products,
+                images=options['images'],
+                categories=options['categories'],
+                batch_size=options['batch_size'],
+                seed=options['seed'],
+                prefix=prefix,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Категорий: {categories}, товаров: {products}, изображений: {images} '
+            f'за {time.monotonic() - started:.1f}с'
+        ))
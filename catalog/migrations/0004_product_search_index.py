@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from catalog.search import get_search_backend
+
+    backend = get_search_backend(schema_editor.connection.alias)
+    if backend is not None:
+        backend.install()
+        backend.rebuild()
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP TRIGGER IF EXISTS catalog_product_search_vector_trigger ON catalog_product')
+            cursor.execute('DROP FUNCTION IF EXISTS catalog_product_search_vector_update()')
+            cursor.execute('DROP INDEX IF EXISTS catalog_product_title_trgm')
+        elif connection.vendor == 'sqlite':
+            for trigger in ('catalog_product_fts_ai', 'catalog_product_fts_ad', 'catalog_product_fts_au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            cursor.execute('DROP TABLE IF EXISTS catalog_product_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0003_category_active_product_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_primary_image(apps, schema_editor):
+    from catalog.images import responsive_urls, stored_image_url
+
+    Product = apps.get_model('catalog', 'Product')
+    ProductImage = apps.get_model('catalog', 'ProductImage')
+    first = {}
+    images = (
+        ProductImage.objects.exclude(image='')
+        .order_by('product_id', 'order', 'created_at', 'pk')
+        .values_list('product_id', 'pk', 'image')
+    )
+    for product_id, pk, name in images.iterator():
+        first.setdefault(product_id, (pk, name))
+    Product.objects.bulk_update(
+        [
+            Product(pk=product_id, primary_image_id=pk, primary_image_urls=responsive_urls(stored_image_url(name)))
+            for product_id, (pk, name) in first.items()
+        ],
+        ['primary_image', 'primary_image_urls'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0007_query_shape_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='primary_image',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='catalog.productimage', verbose_name='Главное фото'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='primary_image_urls',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='URL главного фото'),
+        ),
+        migrations.RunPython(fill_primary_image, migrations.RunPython.noop),
+    ]
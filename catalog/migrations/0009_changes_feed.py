@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0008_product_primary_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Товар'), ('image', 'Изображение товара'), ('category', 'Категория')], max_length=10, verbose_name='Тип')),
+                ('object_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('product_id', models.BigIntegerField(blank=True, null=True, verbose_name='ID товара')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Удалено')),
+            ],
+            options={
+                'verbose_name': 'Удалённый объект',
+                'verbose_name_plural': 'Удалённые объекты',
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ),
+    ]
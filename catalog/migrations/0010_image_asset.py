@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0009_changes_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('perceptual_hash', models.CharField(blank=True, db_index=True, max_length=16, verbose_name='dHash')),
+                ('url', models.CharField(max_length=500, verbose_name='Файл')),
+                ('size', models.PositiveIntegerField(verbose_name='Размер, байт')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Файл изображения',
+                'verbose_name_plural': 'Файлы изображений',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0010_image_asset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageuploadjob',
+            name='content',
+            field=models.BinaryField(blank=True, default=b'', verbose_name='Файл'),
+        ),
+        migrations.AlterField(
+            model_name='imageuploadjob',
+            name='source',
+            field=models.CharField(max_length=500, verbose_name='Имя в staging'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+import catalog.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalog', '0011_image_upload_job_content'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imageasset',
+            index=models.Index(catalog.models.HashBand('perceptual_hash', 1, 4), name='imageasset_phash_band0'),
+        ),
+        migrations.AddIndex(
+            model_name='imageasset',
+            index=models.Index(catalog.models.HashBand('perceptual_hash', 5, 3), name='imageasset_phash_band1'),
+        ),
+        migrations.AddIndex(
+            model_name='imageasset',
+            index=models.Index(catalog.models.HashBand('perceptual_hash', 8, 3), name='imageasset_phash_band2'),
+        ),
+        migrations.AddIndex(
+            model_name='imageasset',
+            index=models.Index(catalog.models.HashBand('perceptual_hash', 11, 3), name='imageasset_phash_band3'),
+        ),
+        migrations.AddIndex(
+            model_name='imageasset',
+            index=models.Index(catalog.models.HashBand('perceptual_hash', 14, 3), name='imageasset_phash_band4'),
+        ),
+    ]
@@ -1,11 +1,46 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, F, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from .fields import CloudinaryImageField 
 
 
+class CategoryQuerySet(models.QuerySet):
+    """Операции над счётчиком активных товаров"""
+
+    def adjust_active_count(self, category_id, delta):
+        """Сдвигаем счётчик одной категории на delta (без ухода в минус)"""
+        if not category_id or not delta:
+            return
+        queryset = self.filter(pk=category_id)
+        if delta < 0:
+            queryset = queryset.filter(active_product_count__gte=-delta)
+        queryset.update(active_product_count=F('active_product_count') + delta)
+
+    def recount_active_products(self):
+        """Пересчитываем счётчики одним UPDATE с подзапросом"""
+        active = (
+            Product.objects
+            .filter(category=OuterRef('pk'), is_active=True)
+            .order_by()
+            .values('category')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(active_product_count=Coalesce(Subquery(active), 0))
+
+
 class Category(models.Model):
     """Категория товаров"""
     title = models.CharField('Название', max_length=200)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
+    # Денормализованный счётчик: поддерживается Product.save() и сигналом удаления
+    active_product_count = models.PositiveIntegerField(
+        'Активных товаров', default=0, editable=False
+    )
+    
+    objects = CategoryQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Категория'
@@ -16,6 +51,46 @@ class Category(models.Model):
         return self.title
 
 
+class ProductQuerySet(models.QuerySet):
+    """Денормализованное главное фото"""
+
+    def refresh_primary_images(self, batch_size=1000, touch=False):
+        """
+        Главное фото - первое по (order, created_at) - и его готовые URL
+        (см. images.responsive_urls). Пишутся только изменившиеся товары,
+        touch=True сдвигает им updated_at (ETag). Возвращает их число.
+        """
+        from .images import STAGING_DIR, responsive_urls, stored_image_url
+
+        storage = ProductImage._meta.get_field('image').storage
+        current = list(self.order_by().values_list('pk', 'primary_image_id', 'primary_image_urls'))
+        changed = 0
+        for start in range(0, len(current), batch_size):
+            batch = current[start:start + batch_size]
+            first = {}
+            images = (
+                ProductImage.objects.filter(product_id__in=[row[0] for row in batch]).exclude(image='')
+                # Фото в очереди загрузки файла ещё не имеет
+                .exclude(image__startswith=f'{STAGING_DIR}/')
+                .order_by('product_id', 'order', 'created_at', 'pk')
+                .values_list('product_id', 'pk', 'image')
+            )
+            for product_id, pk, name in images:
+                first.setdefault(product_id, (pk, name))
+            products = []
+            for product_id, primary_image_id, urls in batch:
+                pk, name = first.get(product_id, (None, None))
+                new_urls = responsive_urls(stored_image_url(name, storage)) if name else {}
+                if (pk, new_urls) != (primary_image_id, urls):
+                    products.append(Product(
+                        pk=product_id, primary_image_id=pk, primary_image_urls=new_urls, updated_at=timezone.now()
+                    ))
+            fields = ['primary_image', 'primary_image_urls', *(['updated_at'] if touch else [])]
+            changed += len(products)
+            Product.objects.bulk_update(products, fields)
+        return changed
+
+
 class Product(models.Model):
     """Товар"""
     STATUS_CHOICES = [
@@ -24,6 +99,14 @@ class Product(models.Model):
     ]
     
     title = models.CharField('Название', max_length=300)
+    # Стабильный ключ поставщика для import_products (upsert)
+    external_id = models.CharField(
+        'Внешний код',
+        max_length=100,
+        unique=True,
+        null=True,
+        blank=True
+    )
     category = models.ForeignKey(
         Category, 
         on_delete=models.SET_NULL, 
@@ -49,14 +132,77 @@ class Product(models.Model):
     is_active = models.BooleanField('Активен', default=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
+    # Денормализация для списков: первое фото и его src/srcset (signals.py)
+    primary_image = models.ForeignKey(
+        'ProductImage',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        editable=False,
+        verbose_name='Главное фото'
+    )
+    primary_image_urls = models.JSONField('URL главного фото', default=dict, blank=True, editable=False)
+    # Заполняется триггером PostgreSQL (см. catalog/search.py), на SQLite не используется
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    objects = ProductQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['-created_at']
+        # Под реальные запросы ProductViewSet (см. команду check_query_plans)
+        indexes = [
+            # Список по умолчанию и курсор: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            # ?category=&is_active= и by_category с сортировкой по дате
+            models.Index(fields=['category', 'is_active', '-created_at'], name='product_cat_active_created_idx'),
+            # ?status= с сортировкой по дате
+            models.Index(fields=['status', '-created_at'], name='product_status_created_idx'),
+            # ?is_active=true
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_active=True),
+                name='product_active_created_idx'
+            ),
+            # new_arrivals: status='new' AND is_active
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(status='new', is_active=True),
+                name='product_new_created_idx'
+            ),
+            # ?ordering=price / title (+ id для курсора)
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['title', 'id'], name='product_title_idx'),
+            # GET /api/products/changes/: keyset по (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+        ]
     
     def __str__(self):
         return self.title
+    
+    def save(self, *args, **kwargs):
+        """
+        Сохраняем товар и в той же транзакции обновляем счётчики категорий.
+        Срабатывает для API, toggle_active и list_editable в админке.
+        """
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None and not self._state.adding:
+                previous = (
+                    Product.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list('category_id', 'is_active')
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            current = (self.category_id, self.is_active)
+            if previous != current:
+                if previous and previous[1]:
+                    Category.objects.adjust_active_count(previous[0], -1)
+                if self.is_active:
+                    Category.objects.adjust_active_count(self.category_id, 1)
 
 
 class ProductImage(models.Model):
@@ -67,15 +213,153 @@ class ProductImage(models.Model):
         related_name='images',
         verbose_name='Товар'
     )
+    UPLOAD_READY = 'ready'
+    UPLOAD_PENDING = 'pending'
+    UPLOAD_FAILED = 'failed'
+    UPLOAD_STATUS_CHOICES = [
+        (UPLOAD_READY, 'Загружено'),
+        (UPLOAD_PENDING, 'Ожидает загрузки'),
+        (UPLOAD_FAILED, 'Ошибка загрузки'),
+    ]
+    
     # image = models.ImageField('Изображение', upload_to='products/%Y/%m/%d/')
     image = CloudinaryImageField('Изображение', upload_to='products/%Y/%m/%d/')
     order = models.PositiveIntegerField('Порядок', default=0)
+    # Пока фоновая загрузка не закончилась, в image имя-заглушка staging/...
+    upload_status = models.CharField(
+        'Загрузка',
+        max_length=10,
+        choices=UPLOAD_STATUS_CHOICES,
+        default=UPLOAD_READY,
+        editable=False
+    )
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     
     class Meta:
         verbose_name = 'Изображение товара'
         verbose_name_plural = 'Изображения товаров'
         ordering = ['order', 'created_at']
+        indexes = [
+            # prefetch_related('images'): WHERE product_id IN (...) ORDER BY order, created_at
+            models.Index(fields=['product', 'order', 'created_at'], name='productimage_product_order_idx'),
+        ]
     
     def __str__(self):
         return f"Фото {self.product.title}"
+
+
+class ImageUploadJob(models.Model):
+    """Задача фоновой загрузки фото в удалённое хранилище (см. catalog/images.py)"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'В очереди'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Готово'),
+        (STATUS_FAILED, 'Ошибка'),
+    ]
+    
+    image = models.ForeignKey(
+        ProductImage,
+        on_delete=models.CASCADE,
+        related_name='upload_jobs',
+        verbose_name='Изображение'
+    )
+    source = models.CharField('Имя в staging', max_length=500)
+    # Подготовленный файл до загрузки: доступен любому процессу, после загрузки стирается
+    content = models.BinaryField('Файл', blank=True, default=b'', editable=False)
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    next_attempt_at = models.DateTimeField('Следующая попытка', default=timezone.now)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    updated_at = models.DateTimeField('Обновлено', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+    
+    def __str__(self):
+        return f"Загрузка {self.source} ({self.get_status_display()})"
+    
+    def finish(self, status, error=''):
+        self.status = status
+        self.last_error = error
+        fields = ['status', 'last_error', 'updated_at']
+        if status == self.STATUS_DONE:
+            self.content = b''
+            fields.append('content')
+        self.save(update_fields=fields)
+
+
+# Полосы dHash ImageAsset (начало, длина в hex): хэши с отличием до 4 бит
+# совпадают хотя бы в одной из пяти - кандидатов на похожесть ищут индексы полос
+PERCEPTUAL_BANDS = [(1, 4), (5, 3), (8, 3), (11, 3), (14, 3)]
+
+
+class HashBand(Func):
+    """SUBSTR с границами в тексте SQL: с параметрами индекс по выражению не подходит"""
+    function = 'SUBSTR'
+    output_field = models.CharField()
+
+    def __init__(self, expression, start, length):
+        template = f'%(function)s(%(expressions)s, {int(start)}, {int(length)})'
+        super().__init__(expression, template=template)
+
+
+class ImageAsset(models.Model):
+    """
+    Файл в удалённом хранилище по хэшу содержимого: такое же фото не грузится
+    второй раз, а ссылается на этот URL (см. catalog/images.py, dedupe_images)
+    """
+    content_hash = models.CharField('SHA-256', max_length=64, unique=True)
+    perceptual_hash = models.CharField('dHash', max_length=16, blank=True, db_index=True)
+    url = models.CharField('Файл', max_length=500)
+    size = models.PositiveIntegerField('Размер, байт')
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(HashBand('perceptual_hash', start, length), name=f'imageasset_phash_band{number}')
+            for number, (start, length) in enumerate(PERCEPTUAL_BANDS)
+        ]
+    
+    def __str__(self):
+        return self.url
+
+
+class Tombstone(models.Model):
+    """Удалённый объект для GET /api/products/changes/ (см. catalog/changes.py)"""
+    KIND_PRODUCT = 'product'
+    KIND_IMAGE = 'image'
+    KIND_CATEGORY = 'category'
+    KIND_CHOICES = [
+        (KIND_PRODUCT, 'Товар'),
+        (KIND_IMAGE, 'Изображение товара'),
+        (KIND_CATEGORY, 'Категория'),
+    ]
+    
+    kind = models.CharField('Тип', max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField('ID объекта')
+    # У фото - товар, которому оно принадлежало
+    product_id = models.BigIntegerField('ID товара', null=True, blank=True)
+    deleted_at = models.DateTimeField('Удалено', default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            # Лента удалений: keyset по (deleted_at, id), сжатие - по deleted_at
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}"
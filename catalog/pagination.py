@@ -1,32 +1,314 @@
+import base64
+import json
+from collections.abc import Mapping
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Дешёвая оценка количества строк по плану запроса (только PostgreSQL).
+    Возвращает None, если оценить нельзя.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator, который на больших выборках берёт count из оценки планировщика
+    вместо COUNT(*). Маленькие выборки считаются точно - это дёшево.
+    """
+    @cached_property
+    def count(self):
+        threshold = getattr(settings, 'CATALOG_PAGINATION_ESTIMATE_THRESHOLD', 10000)
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < threshold:
+            self.is_estimated = False
+            return super().count
+        self.is_estimated = True
+        return estimate
 
 
 class ProductPagination(PageNumberPagination):
     """
     Кастомная пагинация для товаров
-    
+
     Примеры использования:
     /api/products/ - первая страница (20 товаров)
     /api/products/?page=2 - вторая страница
     /api/products/?page=1&page_size=10 - 10 товаров на странице
     /api/products/?page=1&page_size=50 - 50 товаров на странице
+    /api/products/?cursor= - курсорный режим (для бесконечной ленты)
+    /api/products/?cursor=<next>&ordering=price - следующая страница по цене
+
+    Режим подсчёта count/total_pages задаётся настройкой CATALOG_PAGINATION_COUNT:
+    'exact' - COUNT(*), 'estimate' - оценка планировщика, 'none' - без подсчёта.
     """
-    page_size = 20  
-    page_size_query_param = 'page_size'  
-    max_page_size = 100  
-    page_query_param = 'page' 
-    
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    page_query_param = 'page'
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if self.cursor_mode:
+            self.keyset = KeysetPagination(self, view)
+            return self.keyset.paginate_queryset(queryset, request)
+
+        self.count_mode = getattr(settings, 'CATALOG_PAGINATION_COUNT', 'exact')
+        if self.count_mode == 'none':
+            return self._paginate_without_count(queryset, request)
+        if self.count_mode == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для async-обработчиков: COUNT(*) и строки страницы - через async ORM"""
+        self.request = request
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if self.cursor_mode:
+            self.keyset = KeysetPagination(self, view)
+            return await self.keyset.apaginate_queryset(queryset, request)
+
+        self.count_mode = getattr(settings, 'CATALOG_PAGINATION_COUNT', 'exact')
+        if self.count_mode == 'none':
+            page = self._page_without_count(queryset, request)
+            return self._rows_without_count([row async for row in page])
+
+        # Дальше - PageNumberPagination.paginate_queryset, но count считаем заранее
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        if self.count_mode == 'estimate':
+            self.django_paginator_class = EstimatedCountPaginator
+        paginator = self.django_paginator_class(queryset, page_size)
+        if self.count_mode == 'estimate':
+            await sync_to_async(getattr)(paginator, 'count')  # EXPLAIN - через обычный курсор
+        else:
+            paginator.count = await queryset.acount()
+
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.page.object_list = [row async for row in self.page.object_list]
+        return list(self.page)
+
+    def _paginate_without_count(self, queryset, request):
+        """Страница без COUNT(*): берём на одну строку больше, чтобы знать про следующую"""
+        return self._rows_without_count(list(self._page_without_count(queryset, request)))
+
+    def _page_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound('Неверная страница.')
+
+        offset = (self.page_number - 1) * page_size
+        return queryset[offset:offset + page_size + 1]
+
+    def _rows_without_count(self, rows):
+        page_size = self.get_page_size(self.request)
+        if not rows and self.page_number > 1:
+            raise NotFound('Неверная страница.')
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.count_mode != 'none':
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.count_mode != 'none':
+            return super().get_previous_link()
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
     def get_paginated_response(self, data):
         """
         Кастомный формат ответа с дополнительной информацией
         """
-        return Response({
-            'count': self.page.paginator.count,  
-            'total_pages': self.page.paginator.num_pages, 
-            'current_page': self.page.number, 
-            'page_size': self.get_page_size(self.request),  
-            'next': self.get_next_link(), 
-            'previous': self.get_previous_link(),  
-            'results': data 
-        })
+        if self.cursor_mode:
+            return Response({
+                'page_size': self.get_page_size(self.request),
+                'next': self.keyset.get_next_link(),
+                'previous': self.keyset.get_previous_link(),
+                'results': data,
+            })
+
+        if self.count_mode == 'none':
+            return Response({
+                'current_page': self.page_number,
+                'page_size': self.get_page_size(self.request),
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            })
+
+        payload = {
+            'count': self.page.paginator.count,
+            'total_pages': self.page.paginator.num_pages,
+            'current_page': self.page.number,
+            'page_size': self.get_page_size(self.request),
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        }
+        if getattr(self.page.paginator, 'is_estimated', False):
+            payload['count_is_estimated'] = True
+        return Response(payload)
+
+
+class KeysetPagination:
+    """
+    Курсорная (keyset) пагинация для ProductPagination.
+
+    Вместо OFFSET используем условие (поле, id) > (значение, id) по текущей
+    сортировке, id разрешает одинаковые значения. COUNT(*) не выполняется.
+    """
+    default_ordering = '-created_at'
+
+    def __init__(self, pagination, view):
+        self.pagination = pagination
+        self.view = view
+
+    def paginate_queryset(self, queryset, request):
+        return self._set_rows(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self._set_rows([row async for row in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.pagination.get_page_size(request)
+        self.field, self.descending = self.get_ordering(request, queryset)
+        self.model_field = queryset.model._meta.get_field(self.field)
+        self.position = self.decode_cursor(request)
+
+        # Назад идём в обратном порядке и потом разворачиваем страницу
+        self.reverse = bool(self.position and self.position['reverse'])
+        descending = self.descending != self.reverse
+        queryset = queryset.order_by(*self._order_by(descending))
+        if self.position is not None:
+            queryset = queryset.filter(self._after(self.position['value'], self.position['id'], descending))
+        return queryset[:self.page_size + 1]
+
+    def _set_rows(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        self.rows = rows
+        return rows
+
+    def get_ordering(self, request, queryset):
+        """Берём первое поле сортировки из OrderingFilter вьюхи"""
+        ordering = None
+        for backend in getattr(self.view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, self.view)
+                break
+        allowed = getattr(self.view, 'ordering_fields', None) or []
+        term = ordering[0] if ordering else self.default_ordering
+        if not isinstance(term, str) or term.lstrip('-') not in allowed:
+            term = self.default_ordering
+        return term.lstrip('-'), term.startswith('-')
+
+    def _order_by(self, descending):
+        # NULL всегда считаем "самым большим" значением - одинаково на всех СУБД
+        if descending:
+            return [F(self.field).desc(nulls_first=True), F('id').desc()]
+        return [F(self.field).asc(nulls_last=True), F('id').asc()]
+
+    def _after(self, value, pk, descending):
+        """Условие "строго после позиции (value, pk)" для выбранного направления"""
+        field = self.field
+        op = 'lt' if descending else 'gt'
+        if value is None:
+            same = Q(**{f'{field}__isnull': True, f'id__{op}': pk})
+            return same | Q(**{f'{field}__isnull': False}) if descending else same
+        condition = Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+        if self.model_field.null and not descending:
+            condition |= Q(**{f'{field}__isnull': True})
+        return condition
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.pagination.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            value = data['v']
+            if value is not None:
+                value = self.model_field.to_python(value)
+            return {'value': value, 'id': int(data['id']), 'reverse': bool(data.get('r'))}
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound('Неверный курсор.')
+
+    def encode_cursor(self, row, reverse):
+        value = _get_value(row, self.field)
+        if value is not None and not isinstance(value, (str, int, float)):
+            value = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        data = {'v': value, 'id': _get_value(row, 'id')}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode()).decode('ascii').rstrip('=')
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.pagination.page_query_param)
+        return replace_query_param(url, self.pagination.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], reverse=True)
+
+
+def _get_value(row, attr):
+    """Строка страницы может быть моделью или словарём из values()"""
+    if isinstance(row, Mapping):
+        return row[attr]
+    return getattr(row, attr)
@@ -0,0 +1,244 @@
+"""
+Инструментирование горячего пути запроса.
+
+ServerTimingMiddleware для выбранных (сэмплированных) запросов заводит
+RequestProfile: время фаз (auth, filter, paginate, serialize, render...),
+все SQL-запросы с длительностью и фазой, в которой они выполнены.
+Итог уходит в заголовок Server-Timing и в одну JSON-строку лога
+catalog.profiling. Повторы одного и того же запроса и шаблоны, выполненные
+много раз с разными параметрами (N+1), помечаются отдельно.
+
+Фазы исключающие: время вложенной фазы не входит во внешнюю.
+"""
+import contextlib
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('catalog_request_profile', default=None)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.stack = []
+        self.queries = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        frame = [name, 0.0]
+        self.stack.append(frame)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            elapsed = time.perf_counter() - started
+            self.phases[name] += elapsed - frame[1]
+            if self.stack:
+                self.stack[-1][1] += elapsed
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper()"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((
+                sql,
+                None if many else repr(params),
+                time.perf_counter() - started,
+                self.stack[-1][0] if self.stack else 'other',
+            ))
+
+    def summary(self):
+        threshold = getattr(settings, 'CATALOG_PROFILING_NPLUSONE_THRESHOLD', 5)
+        seen = set()
+        duplicates = 0
+        templates = Counter()
+        by_phase = defaultdict(lambda: [0, 0.0])
+        for sql, params, duration, phase in self.queries:
+            if params is not None:
+                duplicates += (sql, params) in seen
+                seen.add((sql, params))
+            templates[IN_LIST.sub('IN (...)', sql)] += 1
+            by_phase[phase][0] += 1
+            by_phase[phase][1] += duration
+
+        return {
+            'total_ms': _ms(time.perf_counter() - self.started),
+            'phases': {name: _ms(value) for name, value in self.phases.items()},
+            'db': {
+                'count': len(self.queries),
+                'ms': _ms(sum(duration for _, _, duration, _ in self.queries)),
+                'by_phase': {name: {'count': count, 'ms': _ms(ms)} for name, (count, ms) in by_phase.items()},
+                'duplicates': duplicates,
+            },
+            # Один шаблон много раз с разными параметрами - почти всегда N+1
+            'n_plus_one': [
+                {'sql': template[:200], 'count': count}
+                for template, count in templates.most_common() if count >= threshold
+            ],
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def phase(name):
+    """Контекстный менеджер фазы; без активного профиля ничего не делает"""
+    profile = _current.get()
+    return profile.phase(name) if profile is not None else contextlib.nullcontext()
+
+
+def server_timing(summary):
+    """Значение заголовка Server-Timing"""
+    entries = [f'{name};dur={value}' for name, value in summary['phases'].items()]
+    db = summary['db']
+    entries.append(f'db;dur={db["ms"]};desc="{db["count"]} queries, {db["duplicates"]} dup"')
+    if summary['n_plus_one']:
+        entries.append(f'nplusone;desc="{len(summary["n_plus_one"])} patterns"')
+    entries.append(f'total;dur={summary["total_ms"]}')
+    return ', '.join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    Ставится первым в MIDDLEWARE - тогда в total попадает вся цепочка,
+    а process_template_response вызывается прямо перед рендерингом.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Под ASGI синхронный middleware загнал бы всю цепочку в поток
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with self.wrap_connections(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        # Соединения БД у каждого потока свои; async ORM ходит в БД из потока
+        # запроса (sync_to_async), поэтому обёртки ставим там же
+        stack = await sync_to_async(self.wrap_connections)(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def sampled(self):
+        rate = getattr(settings, 'CATALOG_PROFILING_SAMPLE_RATE', 0.0)
+        return rate > 0 and random.random() < rate
+
+    def wrap_connections(self, profile):
+        stack = contextlib.ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(profile))
+        return stack
+
+    def finish(self, request, response, profile):
+        summary = profile.summary()
+        if getattr(settings, 'CATALOG_PROFILING_HEADER', True):
+            response['Server-Timing'] = server_timing(summary)
+        self.log(request, response, summary)
+        return response
+
+    def process_template_response(self, request, response):
+        """DRF Response рендерится после view - замеряем это отдельной фазой"""
+        profile = _current.get()
+        if profile is not None:
+            render = profile.phase('render')
+            render.__enter__()
+
+            def finish(rendered):
+                # Вернувший не None callback подменил бы ответ
+                render.__exit__(None, None, None)
+
+            response.add_post_render_callback(finish)
+        return response
+
+    def log(self, request, response, summary):
+        slow = summary['total_ms'] >= getattr(settings, 'CATALOG_PROFILING_SLOW_MS', 500)
+        level = logging.WARNING if slow or summary['n_plus_one'] else logging.INFO
+        logger.log(level, json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            **summary,
+        }, ensure_ascii=False))
+
+
+class ProfiledViewMixin:
+    """
+    DRF-хуки: аутентификация/права, фильтрация, пагинация, выборка объекта.
+    Остаток времени view (кэш, валидаторы, сборка ответа) - фаза view.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with phase('view'):
+            return super().dispatch(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        with phase('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with phase('auth'):
+            super().check_permissions(request)
+
+    def filter_queryset(self, queryset):
+        with phase('filter'):
+            return super().filter_queryset(queryset)
+
+    def paginate_queryset(self, queryset):
+        with phase('paginate'):
+            return super().paginate_queryset(queryset)
+
+    def get_object(self):
+        with phase('query'):
+            return super().get_object()
+
+
+class ProfiledSerializerMixin:
+    """to_representation под фазой serialize (для many=True - на каждый объект)"""
+
+    def to_representation(self, instance):
+        with phase('serialize'):
+            return super().to_representation(instance)
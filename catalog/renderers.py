@@ -0,0 +1,41 @@
+"""
+JSON-рендерер на orjson с тем же выводом, что у JSONRenderer DRF.
+
+orjson необязателен: без него (и для ответов с отступами) работает
+стандартный json из DRF.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # orjson умеет только компактный unicode-вывод - остальное отдаём DRF
+        if (
+            orjson is None
+            or not (api_settings.COMPACT_JSON and api_settings.UNICODE_JSON)
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        try:
+            # Даты - через encoder.default, как у DRF (UTC с 'Z', а не '+00:00')
+            ret = orjson.dumps(
+                data,
+                default=encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except (TypeError, orjson.JSONEncodeError):
+            # Целые больше 64 бит и прочее, чего orjson не умеет
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как в DRF: U+2028/U+2029 валидны в JSON, но не в JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
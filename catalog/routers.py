@@ -0,0 +1,146 @@
+"""
+Чтение с реплик (DATABASE_REPLICA_URLS) для GET-запросов к API каталога.
+
+ReplicaReadMixin включает реплику на время безопасного запроса вьюсета,
+ReplicaRouter отправляет туда чтения; запись и миграции - всегда в default.
+После записи пользователь на CATALOG_REPLICA_PIN_SECONDS закрепляется за
+default и видит свои изменения несмотря на отставание реплик; столько же
+после смены версии каталога (bump_catalog_version) из default читают все -
+иначе ETag/Last-Modified посчитались бы по старым данным. Ответ, который
+ляжет в кэш (cache_response), всегда читается из default: под новой
+версией не должны жить данные отстающей реплики. Недоступная реплика
+исключается на CATALOG_REPLICA_HEALTH_TTL секунд; если живых реплик нет -
+читаем из default.
+
+Тесты с репликой (второй файл SQLite, зеркало default):
+DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3 python manage.py test catalog
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+from .cache import CHANGED_KEY, get_cache
+
+logger = logging.getLogger(__name__)
+
+_read_alias = ContextVar('catalog_read_alias', default=None)
+# alias -> (жива ли, time.monotonic() проверки); на процесс
+_health = {}
+
+PIN_KEY = 'catalog:replica-pin:{}'
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    healthy, checked_at = _health.get(alias, (None, 0.0))
+    if healthy is None or now - checked_at >= getattr(settings, 'CATALOG_REPLICA_HEALTH_TTL', 10):
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            healthy = True
+        except DatabaseError:
+            logger.warning('Реплика %s недоступна - читаем из %s', alias, DEFAULT_DB_ALIAS, exc_info=True)
+            connections[alias].close()
+            healthy = False
+        _health[alias] = (healthy, now)
+    return healthy
+
+
+def choose_replica():
+    """Случайная живая реплика или None"""
+    replicas = [alias for alias in getattr(settings, 'CATALOG_READ_REPLICAS', []) if is_healthy(alias)]
+    return random.choice(replicas) if replicas else None
+
+
+def pin_to_primary(user):
+    seconds = getattr(settings, 'CATALOG_REPLICA_PIN_SECONDS', 5)
+    if seconds and user and user.is_authenticated:
+        get_cache().set(PIN_KEY.format(user.pk), 1, timeout=seconds)
+
+
+def is_pinned(user):
+    """Читать из default: пользователь недавно писал или каталог только что менялся"""
+    keys = [CHANGED_KEY]
+    if user and user.is_authenticated:
+        keys.append(PIN_KEY.format(user.pk))
+    return bool(get_cache().get_many(keys))
+
+
+@contextmanager
+def read_from_primary():
+    """Чтения внутри блока - из default, даже если запрос читает с реплики"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def keep_read_alias(iterable):
+    """StreamingHttpResponse читает уже после выхода из view - оставляем ему ту же БД"""
+    alias = _read_alias.get()
+
+    def iterate():
+        token = _read_alias.set(alias)
+        try:
+            yield from iterable
+        finally:
+            _read_alias.reset(token)
+
+    async def aiterate():
+        token = _read_alias.set(alias)
+        try:
+            async for chunk in iterable:
+                yield chunk
+        finally:
+            _read_alias.reset(token)
+
+    return aiterate() if hasattr(iterable, '__aiter__') else iterate()
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный с реплики, всё равно пишем в default
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схему на реплики приносит репликация
+        return db not in getattr(settings, 'CATALOG_READ_REPLICAS', [])
+
+
+class ReplicaReadMixin:
+    """
+    GET/HEAD/OPTIONS вьюсета читают с реплики (после аутентификации -
+    нужен пользователь для закрепления), успешная запись закрепляет
+    пользователя за default.
+    """
+    # False (as_view(..., read_from_replicas=False)) - только default, без отставания реплик
+    read_from_replicas = True
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.read_from_replicas and request.method in SAFE_METHODS and not is_pinned(request.user):
+            alias = choose_replica()
+            if alias is not None:
+                _read_alias.set(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if _read_alias.get() is not None:
+            # set, а не reset(token): async-обработчики (catalog/asgi.py) выполняют
+            # initial в потоке, и токен был бы из чужого контекста
+            _read_alias.set(None)
+        elif request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,191 @@
+"""
+Полнотекстовый поиск по товарам.
+
+Бэкенд выбирается по СУБД (или настройкой CATALOG_SEARCH_BACKEND):
+- PostgreSQL: колонка search_vector (tsvector) с GIN-индексом + pg_trgm для опечаток
+- SQLite: теневая FTS5-таблица catalog_product_fts
+Индекс поддерживается триггерами БД, поэтому синхронизирован при любой записи
+(save, bulk_create, update). Пересборка - команда rebuild_search_index.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Конфигурация полнотекстового поиска PostgreSQL (и для триггера, и для запросов)
+SEARCH_CONFIG = 'russian'
+
+
+class BaseSearchBackend:
+    """Интерфейс бэкенда: фильтрует queryset и добавляет аннотацию search_rank"""
+    vendor = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def install(self):
+        """Создать индекс/триггеры (идемпотентно)"""
+
+    def rebuild(self):
+        """Полностью пересобрать индекс по текущим данным"""
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    vendor = 'postgresql'
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset
+            .annotate(
+                title_similarity=TrigramWordSimilarity(query, 'title'),
+                search_rank=SearchRank(F('search_vector'), search_query) + F('title_similarity'),
+            )
+            # Оба условия идут по GIN-индексам; %> (word similarity) ловит опечатки в названии
+            .filter(Q(search_vector=search_query) | Q(title__trigram_word_similar=query))
+        )
+
+    def install(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(f"""
+                CREATE OR REPLACE FUNCTION catalog_product_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector :=
+                        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.title, '')), 'A') ||
+                        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'B');
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql
+            """)
+            cursor.execute('DROP TRIGGER IF EXISTS catalog_product_search_vector_trigger ON catalog_product')
+            cursor.execute("""
+                CREATE TRIGGER catalog_product_search_vector_trigger
+                BEFORE INSERT OR UPDATE OF title, description, search_vector ON catalog_product
+                FOR EACH ROW EXECUTE FUNCTION catalog_product_search_vector_update()
+            """)
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS catalog_product_search_vector_gin '
+                'ON catalog_product USING gin (search_vector)'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS catalog_product_title_trgm '
+                'ON catalog_product USING gin (title gin_trgm_ops)'
+            )
+
+    def rebuild(self):
+        # Триггер сам пересчитает вектор при записи в search_vector
+        with self.connection.cursor() as cursor:
+            cursor.execute('UPDATE catalog_product SET search_vector = NULL')
+            return cursor.rowcount
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    vendor = 'sqlite'
+    table = 'catalog_product_fts'
+    triggers = {
+        'catalog_product_fts_ai': """
+            AFTER INSERT ON catalog_product BEGIN
+                INSERT INTO catalog_product_fts(rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END
+        """,
+        'catalog_product_fts_ad': """
+            AFTER DELETE ON catalog_product BEGIN
+                INSERT INTO catalog_product_fts(catalog_product_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+            END
+        """,
+        'catalog_product_fts_au': """
+            AFTER UPDATE OF title, description ON catalog_product BEGIN
+                INSERT INTO catalog_product_fts(catalog_product_fts, rowid, title, description)
+                VALUES ('delete', old.id, old.title, old.description);
+                INSERT INTO catalog_product_fts(rowid, title, description)
+                VALUES (new.id, new.title, new.description);
+            END
+        """,
+    }
+
+    def build_match(self, query):
+        """Каждое слово - префиксный токен в кавычках (безопасно для синтаксиса FTS5)"""
+        tokens = ['"%s"*' % token.replace('"', '""') for token in query.split()]
+        return ' '.join(tokens)
+
+    def search(self, queryset, query):
+        match = self.build_match(query)
+        if not match:
+            return queryset.none()
+        db_table = queryset.model._meta.db_table
+        # Джойн с FTS-таблицей, а не коррелированный подзапрос: иначе MATCH
+        # выполняется заново для каждой найденной строки (O(n²) на частых словах)
+        joined = queryset.extra(
+            tables=[self.table],
+            where=[f'{self.table} MATCH %s', f'{self.table}.rowid = {db_table}.id'],
+            params=[match],
+        )
+        # bm25 тем меньше, чем лучше совпадение - меняем знак; название весит больше описания
+        return joined.annotate(
+            search_rank=RawSQL(f'-bm25({self.table}, 10.0, 1.0)', [], output_field=FloatField())
+        )
+
+    def is_installed(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                list(self.triggers),
+            )
+            return cursor.fetchone()[0] == len(self.triggers)
+
+    def install(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+                "title, description, content='catalog_product', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            for name, body in self.triggers.items():
+                cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+            cursor.execute('SELECT count(*) FROM catalog_product')
+            return cursor.fetchone()[0]
+
+
+BACKENDS = {
+    backend.vendor: backend
+    for backend in (PostgresSearchBackend, SQLiteSearchBackend)
+}
+
+
+def get_search_backend(using='default'):
+    """Бэкенд для подключения using или None (тогда остаётся icontains из SearchFilter)"""
+    connection = connections[using]
+    path = getattr(settings, 'CATALOG_SEARCH_BACKEND', '')
+    if path:
+        return import_string(path)(connection)
+    backend_class = BACKENDS.get(connection.vendor)
+    return backend_class(connection) if backend_class else None
+
+
+def ensure_search_index(sender, using='default', **kwargs):
+    """
+    post_migrate: SQLite при пересоздании таблицы catalog_product теряет триггеры -
+    восстанавливаем их и пересобираем FTS-таблицу.
+    """
+    backend = get_search_backend(using)
+    if not isinstance(backend, SQLiteSearchBackend):
+        return
+    if 'catalog_product' not in backend.connection.introspection.table_names():
+        return
+    if not backend.is_installed():
+        backend.install()
+        backend.rebuild()
+
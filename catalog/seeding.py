@@ -0,0 +1,106 @@
+"""
+Генератор синтетического каталога для бенчмарков и проверки планов запросов.
+
+Данные детерминированы (seed), пишутся пачками bulk_create и не держат
+весь каталог в памяти - годится и для 1M товаров. Сигналы при bulk_create
+не срабатывают, поэтому главное фото пересчитывается на каждую пачку,
+счётчики категорий - в конце, а поисковый индекс ведут триггеры БД.
+Кэш ответов, лента изменений и surrogate-ключи узнают о каждой пачке
+через catalog_changed - как у import_products.
+"""
+import random
+from decimal import Decimal
+from itertools import islice
+
+from .models import Category, ImageAsset, ImageUploadJob, Product, ProductImage, Tombstone
+from .signals import catalog_changed
+
+WORDS = [
+    'шкаф', 'стол', 'стул', 'кресло', 'диван', 'комод', 'полка', 'кровать', 'тумба',
+    'дубовый', 'сосновый', 'угловой', 'складной', 'мягкий', 'белый', 'чёрный', 'классический',
+    'лофт', 'модерн', 'детский', 'офисный', 'кухонный', 'садовый', 'большой', 'компактный',
+]
+IMAGE_URL = 'https://res.cloudinary.com/demo/image/upload/v1/products/seed_{product}_{order}.jpg'
+
+
+def generate_catalog(products, images=3, categories=None, batch_size=1000, seed=42, prefix='Seed'):
+    """
+    Создаёт категории, products товаров и в среднем images фото на товар.
+    Возвращает (число категорий, товаров, изображений).
+    """
+    rng = random.Random(seed)
+    statuses = [value for value, _ in Product.STATUS_CHOICES]
+    category_ids = [
+        category.pk for category in Category.objects.bulk_create(
+            Category(title=f'{prefix} категория {index}')
+            for index in range(categories or max(products // 500, 5))
+        )
+    ]
+
+    rows = (
+        Product(
+            title=f'{_sentence(rng, 3).capitalize()} {index}',
+            category_id=rng.choice(category_ids),
+            description=_sentence(rng, 30),
+            # Немного товаров без цены - как в реальном каталоге ("по запросу")
+            price=Decimal(rng.randint(100, 1000000)) / 100 if rng.random() > 0.05 else None,
+            status=rng.choice(statuses),
+            is_active=rng.random() > 0.15,
+        )
+        for index in range(products)
+    )
+    total_images = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        created = Product.objects.bulk_create(batch)
+        total_images += len(ProductImage.objects.bulk_create(
+            ProductImage(product_id=product.pk, image=IMAGE_URL.format(product=product.pk, order=order), order=order)
+            for product in created
+            for order in range(rng.randint(0, images * 2) if images else 0)
+        ))
+        product_ids = [product.pk for product in created]
+        Product.objects.filter(pk__in=product_ids).refresh_primary_images(batch_size)
+        catalog_changed.send(sender=Product, product_ids=product_ids)
+
+    Category.objects.filter(pk__in=category_ids).recount_active_products()
+    return len(category_ids), products, total_images
+
+
+def clear_catalog(prefix='Seed', batch_size=1000):
+    """
+    Удаляет сгенерированные категории вместе с их товарами, фото и задачами
+    загрузки. Пачками и без Collector: на 1M товаров поштучное удаление идёт
+    часами. Надгробия пишутся пачкой, остальное - через catalog_changed.
+    """
+    categories = Category.objects.filter(title__startswith=f'{prefix} категория ')
+    category_ids = list(categories.values_list('pk', flat=True))
+    products = Product.objects.filter(category_id__in=category_ids).order_by('pk').values_list('pk', flat=True)
+    deleted = 0
+    while True:
+        product_ids = list(products[:batch_size])
+        if not product_ids:
+            break
+        images = ProductImage.objects.filter(product_id__in=product_ids)
+        urls = set(images.values_list('image', flat=True))
+        jobs = ImageUploadJob.objects.filter(image__product_id__in=product_ids)
+        deleted += jobs.delete()[0]
+        deleted += images._raw_delete(images.db)
+        batch = Product.objects.filter(pk__in=product_ids)
+        deleted += batch._raw_delete(batch.db)
+        # Файл мог остаться у фото других товаров - тогда индекс его помнит
+        assets = ImageAsset.objects.filter(url__in=urls).exclude(url__in=ProductImage.objects.values('image'))
+        deleted += assets.delete()[0]
+        Tombstone.objects.bulk_create(Tombstone(kind=Tombstone.KIND_PRODUCT, object_id=pk) for pk in product_ids)
+        catalog_changed.send(sender=Product, product_ids=product_ids)
+
+    if category_ids:
+        deleted += categories._raw_delete(categories.db)
+        Tombstone.objects.bulk_create(Tombstone(kind=Tombstone.KIND_CATEGORY, object_id=pk) for pk in category_ids)
+        catalog_changed.send(sender=Category)
+    return deleted
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
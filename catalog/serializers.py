@@ -1,27 +1,46 @@
+from collections import defaultdict
+
+from django.db import models
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from .images import is_staged
 from .models import Category, Product, ProductImage
+from .profiling import ProfiledSerializerMixin, phase
+from .sparse import ORDERING_COLUMNS, SparseFieldsMixin
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для категорий"""
-    product_count = serializers.SerializerMethodField()
+    # Берём денормализованный счётчик - список категорий идёт одним запросом
+    product_count = serializers.IntegerField(source='active_product_count', read_only=True)
     
     class Meta:
         model = Category
         fields = ['id', 'title', 'product_count', 'created_at']
-    
-    def get_product_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+
+
+class StoredImageField(serializers.ImageField):
+    """Фото в очереди загрузки - null: у имени-заглушки staging/... файла нет"""
+
+    def to_representation(self, value):
+        if value and is_staged(value.name):
+            return None
+        return super().to_representation(value)
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """Сериализатор для изображений"""
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: StoredImageField,
+    }
+
     class Meta:
         model = ProductImage
         fields = ['id', 'image', 'order']
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для списка товаров (краткая информация)"""
     category_name = serializers.CharField(source='category.title', read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
@@ -42,7 +61,183 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductGridSerializer(ProductListSerializer):
+    """Список для сетки (?view=grid): вместо всех фото - главное с готовым srcset"""
+    images = None
+    primary_image = serializers.SerializerMethodField()
+    
+    class Meta(ProductListSerializer.Meta):
+        fields = [
+            'id',
+            'title',
+            'category',
+            'category_name',
+            'price',
+            'status',
+            'status_display',
+            'primary_image',
+            'created_at'
+        ]
+    
+    def get_primary_image(self, obj):
+        return primary_image_data(obj.primary_image_id, obj.primary_image_urls, self.context.get('request'))
+
+
+def primary_image_data(pk, urls, request=None):
+    """Product.primary_image_urls в ответ; локальный src дополняется хостом запроса"""
+    if pk is None or not urls:
+        return None
+    src = urls['src']
+    if request is not None and src.startswith('/'):
+        src = request.build_absolute_uri(src)
+    return {'id': pk, 'src': src, 'srcset': urls['srcset']}
+
+
+class ProductListRowSerializer:
+    """
+    Быстрый путь для списков: тот же JSON, что у ProductListSerializer,
+    но без моделей и вложенных сериализаторов. Строки - словари из values()
+    (см. prepare), подписи статусов посчитаны заранее, все фото страницы -
+    одним запросом. Поля price/created_at форматируют сами поля DRF из
+    ProductListSerializer, поэтому вывод совпадает байт в байт.
+    """
+    values = ('id', 'title', 'category_id', 'category__title', 'price', 'status', 'created_at')
+    # Колонки values() под поле ответа (для ?fields=/?omit=)
+    field_values = {
+        'id': [],
+        'title': ['title'],
+        'category': ['category_id'],
+        'category_name': ['category_id', 'category__title'],
+        'price': ['price'],
+        'status': ['status'],
+        'status_display': ['status'],
+        'images': [],
+        'primary_image': ['primary_image_id', 'primary_image_urls'],
+        'created_at': ['created_at'],
+    }
+    status_labels = {value: str(label) for value, label in Product.STATUS_CHOICES}
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def prepare(cls, queryset, fields=None):
+        """
+        queryset списка -> словари; select/prefetch для values() не нужны.
+        С fields выбираются только нужные колонки (+ id и поля сортировки для курсора).
+        """
+        values = cls.values
+        if fields is not None:
+            values = dict.fromkeys([
+                'id', *(column for name in fields for column in cls.field_values[name]), *ORDERING_COLUMNS
+            ])
+        return queryset.prefetch_related(None).values(*values)
+
+    @property
+    def data(self):
+        with phase('serialize'):
+            return self.to_representation(self.rows)
+
+    async def adata(self):
+        """data для async-обработчиков: фото страницы - через async ORM"""
+        rows = list(self.rows)
+        images = None
+        if self.with_images:
+            images = self.group_images([image async for image in self.image_rows([row['id'] for row in rows])])
+        with phase('serialize'):
+            return self.to_representation(rows, images)
+
+    @property
+    def with_images(self):
+        selected = self.context.get('fields')
+        return selected is None or 'images' in selected
+
+    def to_representation(self, rows, images=None):
+        """images - уже выбранные фото (group_images); None - выбрать здесь"""
+        rows = list(rows)
+        selected = self.context.get('fields')
+        fields = ProductListSerializer().fields
+        price, created_at = fields['price'].to_representation, fields['created_at'].to_representation
+        with_images = self.with_images
+        if not with_images:
+            images = {}
+        elif images is None:
+            images = self.images_by_product([row['id'] for row in rows])
+        with_primary = selected is not None and 'primary_image' in selected
+        request = self.context.get('request')
+        labels = self.status_labels
+
+        data = []
+        for row in rows:
+            item = {'id': row['id'], 'title': row.get('title'), 'category': row.get('category_id')}
+            # Как у CharField(source='category.title'): без категории ключа нет
+            if row.get('category_id') is not None:
+                item['category_name'] = row.get('category__title')
+            item['price'] = None if row.get('price') is None else price(row['price'])
+            item['status'] = row.get('status')
+            item['status_display'] = labels.get(row.get('status'), row.get('status'))
+            if with_images:
+                item['images'] = images.get(row['id'], [])
+            if with_primary:
+                item['primary_image'] = primary_image_data(
+                    row['primary_image_id'], row['primary_image_urls'], request
+                )
+            item['created_at'] = None if row.get('created_at') is None else created_at(row['created_at'])
+            if selected is not None:
+                item = {name: value for name, value in item.items() if name in selected}
+            data.append(item)
+        return data
+
+    def images_by_product(self, product_ids):
+        """Фото всех товаров страницы одним запросом, в порядке Meta.ordering"""
+        return self.group_images(self.image_rows(product_ids))
+
+    def image_rows(self, product_ids):
+        if not product_ids:
+            return ProductImage.objects.none()
+        return ProductImage.objects.filter(product_id__in=product_ids).values_list('product_id', 'id', 'image', 'order')
+
+    def group_images(self, rows):
+        image_url = self.image_url
+        images = defaultdict(list)
+        for product_id, pk, name, order in rows:
+            images[product_id].append({'id': pk, 'image': image_url(name), 'order': order})
+        return images
+
+    # URL фото зависит только от имени файла и хоста запроса, а urljoin/quote
+    # на каждое фото - основная часть времени сериализации. Кэш на процесс.
+    url_cache = {}
+    url_cache_size = 50000
+
+    @property
+    def image_url(self):
+        """Повторяет ImageField.to_representation DRF для имени файла"""
+        storage = ProductImage._meta.get_field('image').storage
+        request = self.context.get('request')
+        use_url = api_settings.UPLOADED_FILES_USE_URL
+        base = f'{request.scheme}://{request.get_host()}' if request is not None else ''
+        cache = self.url_cache
+
+        def to_url(name):
+            if not name or is_staged(name):
+                return None
+            if not use_url:
+                return name
+            url = cache.get((base, name))
+            if url is None:
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                if len(cache) >= self.url_cache_size:
+                    cache.clear()
+                cache[base, name] = url
+            return url
+
+        return to_url
+
+
+class ProductDetailSerializer(SparseFieldsMixin, ProfiledSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для детальной информации о товаре"""
     category_name = serializers.CharField(source='category.title', read_only=True)
     images = ProductImageSerializer(many=True, read_only=True)
@@ -63,4 +258,35 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'images', 
             'created_at',
             'updated_at'
-        ]
\ No newline at end of file
+        ]
+
+class BulkOperationSerializer(serializers.Serializer):
+    """Одна операция в POST /api/products/bulk/"""
+    OPERATIONS = ['create', 'update', 'activate', 'deactivate', 'delete']
+    
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False)
+    
+    def validate(self, attrs):
+        if attrs['op'] == 'create':
+            if 'id' in attrs:
+                raise serializers.ValidationError({'id': 'Для create id не указывается.'})
+            if 'data' not in attrs:
+                raise serializers.ValidationError({'data': 'Обязательное поле.'})
+        else:
+            if 'id' not in attrs:
+                raise serializers.ValidationError({'id': 'Обязательное поле.'})
+            if attrs['op'] == 'update' and not attrs.get('data'):
+                raise serializers.ValidationError({'data': 'Обязательное поле.'})
+        return attrs
+
+
+class ProductBulkSerializer(serializers.Serializer):
+    """Тело запроса пакетных операций; сами операции проверяются по одной в catalog/bulk.py"""
+    atomic = serializers.BooleanField(default=True)
+    operations = serializers.ListField(
+        child=serializers.JSONField(),
+        allow_empty=False,
+        max_length=1000
+    )
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .authentication import forget_user, token_blacklist
+from .cache import bump_catalog_version
+from .changes import record_tombstone, restamp
+from .http import purge_surrogate_keys
+from .images import enqueue
+from .models import Category, ImageUploadJob, Product, ProductImage
+from .snapshot import schedule_build
+
+# Массовые изменения (queryset.update, bulk_create), для которых Django не шлёт
+# post_save/post_delete. Отправитель - модель; kwargs: product_ids, category_ids.
+catalog_changed = Signal()
+
+
+@receiver(post_delete, sender=Product)
+def decrement_category_counter(sender, instance, **kwargs):
+    """
+    Удаление товара (в т.ч. массовое из админки) уменьшает счётчик категории.
+    Collector вызывает сигнал внутри своей транзакции.
+    """
+    if instance.is_active:
+        Category.objects.adjust_active_count(instance.category_id, -1)
+
+
+@receiver(catalog_changed)
+def recount_changed_categories(sender, category_ids=(), **kwargs):
+    """Массовые записи не проходят через Product.save() - пересчитываем затронутые категории"""
+    category_ids = [pk for pk in category_ids if pk]
+    if category_ids:
+        Category.objects.filter(pk__in=category_ids).recount_active_products()
+
+
+@receiver(catalog_changed)
+def restamp_changed_products(sender, product_ids=(), **kwargs):
+    """Лента изменений: отметки массовой записи - время коммита (до новой версии кэша)"""
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: restamp(product_ids))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(catalog_changed)
+def invalidate_response_cache(sender, **kwargs):
+    """Новая версия каталога после коммита - закэшированные ответы больше не читаются"""
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(catalog_changed)
+def rebuild_catalog_snapshot(sender, **kwargs):
+    """Статический снимок пересобирается в фоне (если включён CATALOG_SNAPSHOT_ON_WRITE)"""
+    transaction.on_commit(schedule_build)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Category)
+def record_deletion(sender, instance, origin=None, **kwargs):
+    """Надгробие для GET /api/products/changes/; фото удаляемого товара покрывает надгробие товара"""
+    if sender is ProductImage and (isinstance(origin, Product) or getattr(origin, 'model', None) is Product):
+        return
+    record_tombstone(instance)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def touch_product_on_image_change(sender, instance, **kwargs):
+    """Фото - часть карточки товара: сдвигаем updated_at, чтобы сменились ETag/Last-Modified"""
+    Product.objects.filter(pk=instance.product_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def refresh_primary_image(sender, instance, origin=None, **kwargs):
+    """Фото добавили, переставили (order) или удалили - пересчитываем главное фото товара"""
+    # При удалении самого товара его фото удаляет Collector - товара уже не будет
+    if isinstance(origin, Product) or getattr(origin, 'model', None) is Product:
+        return
+    Product.objects.filter(pk=instance.product_id).refresh_primary_images()
+
+
+@receiver(catalog_changed)
+def refresh_changed_primary_images(sender, product_ids=(), **kwargs):
+    """Фоновая загрузка заменила URL фото (queryset.update без post_save)"""
+    if sender is ProductImage and product_ids:
+        Product.objects.filter(pk__in=product_ids).refresh_primary_images()
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def touch_products_on_category_change(sender, instance, created=False, **kwargs):
+    """Название категории (category_name) и её удаление (SET_NULL) меняют товары"""
+    if not created:
+        Product.objects.filter(category_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def purge_product_keys(sender, instance, **kwargs):
+    keys = ['products', f'product-{instance.pk}']
+    if instance.category_id:
+        keys.append(f'category-{instance.category_id}')
+    purge_surrogate_keys(keys)
+
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def purge_image_keys(sender, instance, **kwargs):
+    purge_surrogate_keys(['products', f'product-{instance.product_id}'])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_keys(sender, instance, **kwargs):
+    purge_surrogate_keys(['categories', f'category-{instance.pk}', 'products'])
+
+
+@receiver(catalog_changed)
+def purge_bulk_keys(sender, product_ids=(), category_ids=(), **kwargs):
+    keys = ['products', 'categories']
+    keys += [f'product-{pk}' for pk in product_ids]
+    keys += [f'category-{pk}' for pk in category_ids]
+    purge_surrogate_keys(keys)
+
+
+@receiver(post_save, sender=ProductImage)
+def queue_image_upload(sender, instance, **kwargs):
+    """Поле подготовило файл - ставим задачу фоновой загрузки, файл - в ней"""
+    staged = instance.__dict__.pop('_staged_upload', None)
+    if staged:
+        source, content = staged
+        job = ImageUploadJob.objects.create(image=instance, source=source, content=content)
+        enqueue(job.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    """Пароль, is_active, права: следующий запрос прочитает пользователя из БД"""
+    transaction.on_commit(lambda: forget_user(instance))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_blacklisted_token(sender, instance, **kwargs):
+    """Отзыв виден сразу, а не через TTL «не отозван» (см. authentication.py)"""
+    jti = instance.token.jti
+    transaction.on_commit(lambda: token_blacklist.remember(jti))
+
+
+@receiver(post_delete, sender=BlacklistedToken)
+def forget_blacklisted_token(sender, instance, **kwargs):
+    try:
+        jti = instance.token.jti
+    except OutstandingToken.DoesNotExist:
+        return
+    transaction.on_commit(lambda: token_blacklist.forget(jti))
@@ -0,0 +1,336 @@
+"""
+Статический снимок публичного каталога: JSON-файлы, которые отдаёт WhiteNoise
+без DRF и БД.
+
+build_snapshot (команда build_catalog_snapshot, а при CATALOG_SNAPSHOT_ON_WRITE -
+фоновый поток после записей) рендерит список категорий, первые страницы
+new_arrivals и by_category каждой категории и карточку каждого товара. JSON
+тот же, что у API: списки проходят через вьюсеты, карточки - через
+ProductDetailSerializer. Имя файла содержит хэш содержимого (кэшируется
+навсегда), рядом лежат .gz и .br. manifest.json связывает ресурсы с файлами:
+
+    {"categories": "categories.<md5>.json", "new_arrivals": "...",
+     "by_category": {"<id>": "by_category/<id>.<md5>.json"},
+     "products": {"<id>": {"path": "products/<id>.<md5>.json", "updated_at": "..."}}}
+
+Пересборка инкрементальная: карточка рендерится заново, только если updated_at
+товара отличается от записанного в манифесте; списки рендерятся всегда (их
+немного), но пишутся, только если изменилось содержимое. Файлы, на которые
+не ссылаются ни новый, ни предыдущий манифест, удаляются.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import Http404
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.request import Request
+from whitenoise.responders import IsDirectoryError, MissingFileError
+from .asgi import AsyncWhiteNoiseMiddleware
+from .cache import get_cache
+from .models import Category, Product
+from .renderers import FastJSONRenderer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+# Меняется вместе со структурой манифеста или файлов - следующая сборка будет полной
+MANIFEST_FORMAT = 1
+LOCK_KEY = 'catalog:snapshot:lock:{}'
+LOCK_TIMEOUT = 15 * 60
+PRODUCT_CHUNK_SIZE = 500
+
+
+def get_snapshot_root():
+    return os.path.abspath(getattr(settings, 'CATALOG_SNAPSHOT_ROOT', os.path.join(settings.BASE_DIR, 'snapshot')))
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'rb') as file:
+            return json.loads(file.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def manifest_files(manifest):
+    """Файлы снимка, на которые ссылается манифест"""
+    if not manifest:
+        return set()
+    files = {manifest.get('categories'), manifest.get('new_arrivals')}
+    files.update(manifest.get('by_category', {}).values())
+    files.update(entry['path'] for entry in manifest.get('products', {}).values())
+    files.discard(None)
+    return files
+
+
+def compressed_variants(content):
+    """(.gz, данные), (.br, данные) - как у WhiteNoise, только если сжатие заметно"""
+    variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content)))
+    return [(suffix, data) for suffix, data in variants if len(data) < len(content) * 0.95]
+
+
+def write_atomic(path, content):
+    """Читатель видит либо старый файл, либо новый целиком"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class SnapshotBuilder:
+    """Одна сборка снимка в root; вызывать через build_snapshot (блокировка)"""
+
+    def __init__(self, root=None, base_url=None, full=False):
+        self.root = root or get_snapshot_root()
+        # Хост для ссылок пагинации и абсолютных URL фото - как у запроса к API
+        self.base_url = (base_url or getattr(settings, 'CATALOG_SNAPSHOT_BASE_URL', 'http://localhost:8000')).rstrip('/')
+        self.full = full
+        base = urlsplit(self.base_url)
+        self.secure = base.scheme == 'https'
+        self.factory = RequestFactory(HTTP_HOST=base.netloc, HTTP_ACCEPT='application/json')
+        self.written = 0
+
+    def build(self):
+        from .views import CategoryViewSet, ProductViewSet
+
+        previous = read_manifest(self.root)
+        full = (
+            self.full or not previous
+            or previous.get('format') != MANIFEST_FORMAT
+            or previous.get('base_url') != self.base_url
+        )
+        products, rendered = self.render_products({} if full else previous.get('products', {}))
+        manifest = {
+            'format': MANIFEST_FORMAT,
+            'generated_at': timezone.now().isoformat(),
+            'base_url': self.base_url,
+            'categories': self.render_list('categories', CategoryViewSet, 'list', 'category-list'),
+            'new_arrivals': self.render_list('new_arrivals', ProductViewSet, 'new_arrivals', 'product-new-arrivals'),
+            'by_category': {
+                str(pk): self.render_list(
+                    f'by_category/{pk}', ProductViewSet, 'by_category', 'product-by-category', {'category_id': pk}
+                )
+                for pk in Category.objects.order_by('pk').values_list('pk', flat=True)
+            },
+            'products': products,
+        }
+        content = json.dumps(manifest, ensure_ascii=False, separators=(',', ':')).encode()
+        path = os.path.join(self.root, MANIFEST_NAME)
+        for suffix, data in compressed_variants(content):
+            write_atomic(path + suffix, data)
+        write_atomic(path, content)
+        removed = self.prune(manifest_files(manifest) | manifest_files(previous))
+        return {
+            'full': full,
+            'products': len(products),
+            'rendered': rendered,
+            'written': self.written,
+            'removed': removed,
+        }
+
+    def save(self, stem, content):
+        """<stem>.<md5>.json с .gz/.br рядом; такой файл уже есть - не переписываем"""
+        name = f'{stem}.{hashlib.md5(content).hexdigest()[:12]}.json'
+        path = os.path.join(self.root, *name.split('/'))
+        if not os.path.exists(path):
+            for suffix, data in compressed_variants(content):
+                write_atomic(path + suffix, data)
+            # Основной файл последним: WhiteNoise ищет сжатые варианты рядом с ним
+            write_atomic(path, content)
+            self.written += 1
+        return name
+
+    def render_list(self, stem, viewset, action, url_name, params=None):
+        """Первая страница списка через вьюсет - тот же JSON, что у GET к API"""
+        url = reverse(url_name)
+        view = viewset.as_view({'get': action}, read_from_replicas=False, throttle_classes=[])
+        request = self.factory.get(url, params, secure=self.secure)
+        if iscoroutinefunction(view):
+            response = async_to_sync(view)(request)
+        else:
+            response = view(request)
+        response.render()
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: HTTP {response.status_code}')
+        return self.save(stem, response.content)
+
+    def render_products(self, previous):
+        """Карточки товаров с изменившимся updated_at; ({id: запись манифеста}, сколько перерисовано)"""
+        from .serializers import ProductDetailSerializer
+        from .views import ProductViewSet
+
+        entries = {}
+        stale = []
+        for pk, updated_at in Product.objects.order_by('pk').values_list('pk', 'updated_at'):
+            entry = previous.get(str(pk))
+            fresh = (
+                entry and entry['updated_at'] == updated_at.isoformat()
+                and os.path.exists(os.path.join(self.root, entry['path']))
+            )
+            if fresh:
+                entries[str(pk)] = entry
+            else:
+                stale.append(pk)
+
+        request = Request(self.factory.get(reverse('product-list'), secure=self.secure))
+        context = {'request': request, 'format': None, 'view': None, 'fields': None}
+        render = FastJSONRenderer().render
+        for start in range(0, len(stale), PRODUCT_CHUNK_SIZE):
+            chunk = list(ProductViewSet.queryset.filter(pk__in=stale[start:start + PRODUCT_CHUNK_SIZE]))
+            # many=True: поля сериализатора строятся один раз на порцию, а не на товар
+            for product, data in zip(chunk, ProductDetailSerializer(chunk, many=True, context=context).data):
+                entries[str(product.pk)] = {
+                    'path': self.save(f'products/{product.pk}', render(data)),
+                    # updated_at отрисованной версии: правка после выборки выше - пересоберём в следующий раз
+                    'updated_at': product.updated_at.isoformat(),
+                }
+        return dict(sorted(entries.items(), key=lambda item: int(item[0]))), len(stale)
+
+    def prune(self, keep):
+        """Удаляем файлы (и их .gz/.br), не упомянутые в keep; недописанные .tmp- тоже"""
+        removed = 0
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                base = name[:-3] if name.endswith(('.gz', '.br')) else name
+                if base == MANIFEST_NAME or base in keep:
+                    continue
+                os.remove(path)
+                removed += base == name
+        return removed
+
+
+def build_snapshot(full=False, base_url=None, root=None):
+    """
+    Собрать снимок; статистика сборки или None, если этот же каталог сейчас
+    собирает другой процесс.
+    """
+    root = root or get_snapshot_root()
+    cache = get_cache()
+    lock_key = LOCK_KEY.format(hashlib.md5(root.encode()).hexdigest())
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        return None
+    try:
+        return SnapshotBuilder(root, base_url, full).build()
+    finally:
+        cache.delete(lock_key)
+
+
+_schedule_lock = threading.Lock()
+_scheduled = False
+
+
+def schedule_build():
+    """
+    Пересборка после записи (on_commit) - в фоне через CATALOG_SNAPSHOT_DELAY
+    секунд: серия правок из админки или импорта даёт одну сборку.
+    """
+    global _scheduled
+    if not getattr(settings, 'CATALOG_SNAPSHOT_ON_WRITE', False):
+        return
+    with _schedule_lock:
+        if _scheduled:
+            return
+        _scheduled = True
+    timer = threading.Timer(getattr(settings, 'CATALOG_SNAPSHOT_DELAY', 5), _build_in_thread)
+    timer.daemon = True
+    timer.start()
+
+
+def _build_in_thread():
+    global _scheduled
+    # Сброс до сборки: запись во время сборки могла не попасть в неё - запланирует следующую
+    with _schedule_lock:
+        _scheduled = False
+    close_old_connections()
+    try:
+        if build_snapshot() is None:
+            schedule_build()  # Собирает другой процесс - повторим после него
+    except Exception:
+        logger.exception('Ошибка сборки снимка каталога')
+    finally:
+        close_old_connections()
+
+
+class SnapshotWhiteNoiseMiddleware(AsyncWhiteNoiseMiddleware):
+    """
+    WhiteNoise, который отдаёт и снимок каталога по CATALOG_SNAPSHOT_URL.
+    Файлы снимка появляются после старта процесса, поэтому ищутся на диске
+    при первом запросе; файлы с хэшем неизменны и запоминаются (Cache-Control
+    immutable), manifest.json проверяется каждый раз (no-cache, 304 по ETag).
+    """
+
+    def __init__(self, get_response=None, settings=settings):
+        # До super(): он уже вызывает immutable_file_test для статики
+        prefix = getattr(settings, 'CATALOG_SNAPSHOT_URL', '/snapshot/')
+        self.snapshot_prefix = '/' + prefix.strip('/') + '/'
+        self.snapshot_root = get_snapshot_root() + os.sep
+        self.manifest_url = self.snapshot_prefix + MANIFEST_NAME
+        super().__init__(get_response, settings)
+
+    def find_static_file(self, url):
+        if url.startswith(self.snapshot_prefix):
+            return self.files.get(url) or self.find_snapshot_file(url)
+        return super().find_static_file(url)
+
+    async def afind_static_file(self, url):
+        if url.startswith(self.snapshot_prefix):
+            return self.files.get(url) or await sync_to_async(self.find_snapshot_file)(url)
+        return await super().afind_static_file(url)
+
+    def find_snapshot_file(self, url):
+        path = os.path.join(self.snapshot_root, url[len(self.snapshot_prefix):])
+        if not self.url_is_canonical(url) or not self.path_is_child_of(path, self.snapshot_root):
+            return None
+        try:
+            static_file = self.find_file_at_path(path, url)
+        except (MissingFileError, IsDirectoryError):
+            return None
+        if url != self.manifest_url:
+            self.files[url] = static_file
+        return static_file
+
+    def serve(self, static_file, request):
+        try:
+            return super().serve(static_file, request)
+        except FileNotFoundError:
+            # Запомненный файл удалила одна из следующих сборок
+            self.files.pop(request.path_info, None)
+            raise Http404
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.snapshot_prefix):
+            return url != self.manifest_url
+        return super().immutable_file_test(path, url)
+
+    def add_cache_headers(self, headers, path, url):
+        if url == self.manifest_url:
+            headers['Cache-Control'] = 'no-cache'
+        else:
+            super().add_cache_headers(headers, path, url)
@@ -0,0 +1,86 @@
+"""
+Разреженные ответы: ?fields=id,title,price или ?omit=description,images.
+
+Набор полей режет не только JSON, но и SQL: без category_name нет JOIN
+категории, без images - запроса prefetch, а колонки выбираются через only().
+"""
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+# ?view=grid - список с одним главным фото (ProductGridSerializer)
+VIEW_PARAM = 'view'
+VIEWS = ('list', 'grid')
+
+# Колонки Product, нужные полю ответа (id грузится всегда)
+FIELD_COLUMNS = {
+    'id': [],
+    'title': ['title'],
+    'category': ['category'],
+    'category_name': ['category', 'category__title'],
+    'description': ['description'],
+    'price': ['price'],
+    'status': ['status'],
+    'status_display': ['status'],
+    'is_active': ['is_active'],
+    'images': [],
+    'primary_image': ['primary_image', 'primary_image_urls'],
+    'created_at': ['created_at'],
+    'updated_at': ['updated_at'],
+}
+# Поля сортировки читает курсорная пагинация - грузим их всегда
+ORDERING_COLUMNS = ['created_at', 'title', 'price']
+
+
+def requested_fields(request, available):
+    """
+    Поля ответа в порядке сериализатора или None, если параметры не переданы.
+    Неизвестное имя поля - 400.
+    """
+    params = request.query_params
+    if FIELDS_PARAM not in params and OMIT_PARAM not in params:
+        return None
+
+    def parse(param):
+        names = {name.strip() for name in params.get(param, '').split(',') if name.strip()}
+        unknown = names - set(available)
+        if unknown:
+            raise ValidationError({param: [
+                f'Неизвестные поля: {", ".join(sorted(unknown))}. Доступны: {", ".join(available)}.'
+            ]})
+        return names
+
+    selected = parse(FIELDS_PARAM) if params.get(FIELDS_PARAM, '').strip() else set(available)
+    selected -= parse(OMIT_PARAM)
+    return [name for name in available if name in selected]
+
+
+def requested_view(request):
+    """?view= списка; неизвестное значение - 400"""
+    view = request.query_params.get(VIEW_PARAM) or VIEWS[0]
+    if view not in VIEWS:
+        raise ValidationError({VIEW_PARAM: [f'Допустимые значения: {", ".join(VIEWS)}.']})
+    return view
+
+
+def prune_queryset(queryset, fields):
+    """select_related/prefetch_related/only() только под выбранные поля"""
+    if 'category_name' not in fields:
+        queryset = queryset.select_related(None)
+    if 'images' not in fields:
+        queryset = queryset.prefetch_related(None)
+    columns = dict.fromkeys(
+        column for name in fields for column in FIELD_COLUMNS.get(name, [name])
+    )
+    return queryset.only(*columns, *ORDERING_COLUMNS)
+
+
+class SparseFieldsMixin:
+    """ModelSerializer, отдающий только поля из context['fields']"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if selected is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
@@ -0,0 +1,62 @@
+"""
+Кэш ответов (catalog/cache.py): свежая запись без запросов к БД, устаревшая
+отдаётся, пока другой запрос держит блокировку, и пересчитывается владельцем.
+"""
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from catalog.cache import bump_catalog_version, get_cache
+from catalog.models import Category, Product
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    # Чтения с реплик - в test_replicas.py
+    CATALOG_READ_REPLICAS=[],
+    CATALOG_THROTTLE_ENABLED=False,
+    CATALOG_SHED_DB_LATENCY_MS=0,
+    CATALOG_PROFILING_SAMPLE_RATE=0,
+)
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.product = Product.objects.create(title='Платье', category=Category.objects.create(title='Платья'))
+        self.client = APIClient()
+
+    def titles(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept', response['Vary'])
+        return [product['title'] for product in response.data['results']]
+
+    def rename(self, title):
+        # queryset.update без сигналов: версия каталога прежняя, запись в кэше - тоже
+        Product.objects.filter(pk=self.product.pk).update(title=title)
+
+    def test_fresh_entry_without_queries(self):
+        self.assertEqual(self.titles(), ['Платье'])
+        self.rename('Юбка')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Платье'])
+
+    @override_settings(CATALOG_CACHE_TTL=0)
+    def test_stale_entry_revalidated(self):
+        self.assertEqual(self.titles(), ['Платье'])
+        self.rename('Юбка')
+        # Блокировку держит другой запрос - ему пересчитывать, этому - устаревший ответ
+        with mock.patch.object(get_cache(), 'add', return_value=False), self.assertNumQueries(0):
+            self.assertEqual(self.titles(), ['Платье'])
+        self.assertEqual(self.titles(), ['Юбка'])
+
+    def test_new_version_misses(self):
+        self.assertEqual(self.titles(), ['Платье'])
+        self.rename('Юбка')
+        bump_catalog_version()
+        self.assertEqual(self.titles(), ['Юбка'])
+
+    def test_not_modified_from_cache(self):
+        etag = self.client.get('/api/products/')['ETag']
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,84 @@
+"""
+Лента изменений GET /api/products/changes/ (catalog/changes.py): токен next
+доводит клиента до конца ленты и потом отдаёт только новые изменения и удаления.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from catalog.cache import get_cache
+from catalog.changes import decode_token, encode_token
+from catalog.models import Product
+from catalog.signals import catalog_changed
+
+URL = '/api/products/changes/'
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    # Чтения с реплик - в test_replicas.py
+    CATALOG_READ_REPLICAS=[],
+    CATALOG_THROTTLE_ENABLED=False,
+    CATALOG_SHED_DB_LATENCY_MS=0,
+    CATALOG_PROFILING_SAMPLE_RATE=0,
+    CATALOG_CHANGES_SETTLE_SECONDS=0,
+)
+class ChangesFeedTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.products = [Product.objects.create(title=f'Товар {index}') for index in range(3)]
+        self.client = APIClient()
+
+    def sync(self, since=None, page_size=2):
+        """Все страницы после since: (id изменённых, удалённые (type, id), последний next)"""
+        changed, deleted = [], []
+        while True:
+            params = {'page_size': page_size, **({'since': since} if since else {})}
+            response = self.client.get(URL, params)
+            self.assertEqual(response.status_code, 200)
+            changed += [product['id'] for product in response.data['changes']]
+            deleted += [(tombstone['type'], tombstone['id']) for tombstone in response.data['deleted']]
+            since = response.data['next']
+            if not response.data['has_more']:
+                return changed, deleted, since
+
+    def test_token_round_trip(self):
+        now = timezone.now()
+        position = ((now, 7), (now - timedelta(seconds=1), 0))
+        self.assertEqual(decode_token(encode_token(position)), position)
+        self.assertIsNone(decode_token(''))
+        with self.assertRaises(ValueError):
+            decode_token('not-a-token')
+
+    def test_incremental_sync(self):
+        changed, deleted, since = self.sync()
+        self.assertEqual(changed, [product.pk for product in self.products])
+        self.assertEqual(deleted, [])
+        # Ничего не менялось - пусто
+        self.assertEqual(self.sync(since)[:2], ([], []))
+
+        first, second, _ = self.products
+        second_id = second.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            first.title = 'Новое название'
+            first.save()
+            second.delete()
+        changed, deleted, since = self.sync(since)
+        self.assertEqual(changed, [first.pk])
+        self.assertEqual(deleted, [('product', second_id)])
+        self.assertEqual(self.sync(since)[:2], ([], []))
+
+    def test_bulk_write_committed_after_token(self):
+        _, _, since = self.sync()
+        third = self.products[2]
+        # Массовая запись начала транзакцию до выдачи токена, а закоммитилась после
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Product.objects.filter(pk=third.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+            catalog_changed.send(sender=Product, product_ids=[third.pk])
+        self.assertEqual(self.sync(since)[0], [third.pk])
+
+    def test_invalid_token(self):
+        self.assertEqual(self.client.get(URL, {'since': 'garbage'}).status_code, 400)
@@ -0,0 +1,36 @@
+"""
+catalog.W001 (catalog/checks.py): кэш одного хоста на Railway и в check --deploy.
+"""
+from django.core.checks import run_checks
+from django.test import SimpleTestCase, override_settings
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+DATABASE_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'catalog_cache'}}
+
+
+def cache_warnings(deploy=False):
+    return [message.id for message in run_checks(tags=['caches'], include_deployment_checks=deploy)]
+
+
+@override_settings(CACHES=LOCMEM, CACHE_SINGLE_HOST=False, RAILWAY_ENVIRONMENT=None)
+class SharedCacheCheckTests(SimpleTestCase):
+
+    def test_silent_in_development(self):
+        self.assertEqual(cache_warnings(), [])
+
+    @override_settings(RAILWAY_ENVIRONMENT='production')
+    def test_warns_on_railway(self):
+        self.assertEqual(cache_warnings(), ['catalog.W001'])
+        # Та же проверка не дублируется в --deploy
+        self.assertEqual(cache_warnings(deploy=True), ['catalog.W001'])
+
+    def test_warns_on_deploy_check(self):
+        self.assertEqual(cache_warnings(deploy=True), ['catalog.W001'])
+
+    @override_settings(RAILWAY_ENVIRONMENT='production', CACHE_SINGLE_HOST=True)
+    def test_single_host(self):
+        self.assertEqual(cache_warnings(), [])
+
+    @override_settings(RAILWAY_ENVIRONMENT='production', CACHES=DATABASE_CACHE)
+    def test_shared_cache(self):
+        self.assertEqual(cache_warnings(), [])
@@ -0,0 +1,61 @@
+"""
+Проверка строк import_products: значения, которые не поместятся в колонки,
+отклоняются ошибкой строки, остальная пачка импортируется.
+"""
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from catalog.models import Category, Product
+
+
+class ImportProductsTests(TestCase):
+
+    def run_import(self, rows):
+        """stderr команды; rows - объекты JSONL по строке на каждый"""
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as file:
+            file.write('\n'.join(json.dumps(row, ensure_ascii=False) for row in rows))
+        self.addCleanup(os.remove, file.name)
+        stderr = StringIO()
+        call_command('import_products', file.name, stdout=StringIO(), stderr=stderr)
+        return stderr.getvalue()
+
+    def test_rejects_values_that_do_not_fit_columns(self):
+        errors = self.run_import([
+            {'external_id': 'ok', 'title': 'Стол', 'price': '10,5', 'category': 'Мебель'},
+            {'external_id': 'big', 'title': 'Шкаф', 'price': '12345678901'},
+            {'external_id': 'nan', 'title': 'Шкаф', 'price': 'NaN'},
+            {'external_id': 'x' * 101, 'title': 'Шкаф'},
+            {'external_id': 'cat', 'title': 'Шкаф', 'category': 'К' * 201},
+        ])
+        self.assertEqual(list(Product.objects.values_list('external_id', 'price')), [('ok', Decimal('10.50'))])
+        self.assertEqual(list(Category.objects.values_list('title', flat=True)), ['Мебель'])
+        self.assertIn('line 2: invalid price', errors)
+        self.assertIn('line 3: invalid price', errors)
+        self.assertIn('line 4: invalid external_id', errors)
+        self.assertIn('line 5: invalid category', errors)
+
+    def test_is_active(self):
+        errors = self.run_import([
+            {'external_id': 'null', 'title': 'Стол', 'is_active': None},
+            {'external_id': 'off', 'title': 'Стол', 'is_active': 'нет'},
+            {'external_id': 'zero', 'title': 'Стол', 'is_active': 0},
+            {'external_id': 'five', 'title': 'Стол', 'is_active': 5},
+            {'external_id': 'list', 'title': 'Стол', 'is_active': [True]},
+        ])
+        self.assertEqual(
+            dict(Product.objects.values_list('external_id', 'is_active')),
+            {'null': True, 'off': False, 'zero': False},
+        )
+        self.assertIn('line 4: invalid is_active', errors)
+        self.assertIn('line 5: invalid is_active', errors)
+
+    def test_upsert_by_external_id(self):
+        self.run_import([{'external_id': 'a1', 'title': 'Стол', 'price': 10}])
+        errors = self.run_import([{'external_id': 'a1', 'title': 'Стол', 'price': '12.30'}])
+        self.assertEqual(errors, '')
+        self.assertEqual(list(Product.objects.values_list('external_id', 'price')), [('a1', Decimal('12.30'))])
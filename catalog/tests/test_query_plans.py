@@ -0,0 +1,27 @@
+"""
+Планы запросов каталога в manage.py test: та же проверка, что у команды
+check_query_plans (ENDPOINTS, check_plan), на синтетическом каталоге.
+"""
+from django.test import TestCase
+from catalog.management.commands.check_query_plans import ENDPOINTS, analyze, check_plan, request_endpoints
+from catalog.seeding import generate_catalog
+
+
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        generate_catalog(500, images=2, categories=10)
+        analyze()
+
+    def test_endpoints_use_indexes(self):
+        checked = []
+        for name, url, response, queries in request_endpoints():
+            with self.subTest(name, url=url):
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(queries)
+                for sql in queries:
+                    self.assertIsNone(check_plan(sql), sql)
+            checked.append(name)
+        # Ни один случай не пропущен - в том числе курсор ?ordering=price на SQLite
+        self.assertEqual(checked, [name for name, _ in ENDPOINTS])
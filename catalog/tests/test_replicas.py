@@ -0,0 +1,75 @@
+"""
+Чтение с реплик (catalog/routers.py) на двух файлах SQLite: реплика в тестах -
+зеркало default (TEST MIRROR), поэтому видны запросы к каждому алиасу.
+
+DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3 python manage.py test catalog
+"""
+from unittest import skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from catalog.cache import bump_catalog_version, get_cache
+from catalog.models import Category, Product
+
+REPLICA = settings.CATALOG_READ_REPLICAS[0] if settings.CATALOG_READ_REPLICAS else None
+
+
+@skipUnless(REPLICA, 'нужна реплика: DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3')
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CATALOG_THROTTLE_ENABLED=False,
+    CATALOG_SHED_DB_LATENCY_MS=0,
+    CATALOG_PROFILING_SAMPLE_RATE=0,
+)
+class ReplicaReadTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        get_cache().clear()
+        category = Category.objects.create(title='Платья')
+        Product.objects.create(title='Платье', category=category, price=100)
+        self.user = get_user_model().objects.create_user('reader', password='secret-pass-1')
+        # Запись выше сменила версию каталога - начинаем с «давно не менялся»
+        get_cache().clear()
+        self.client = APIClient()
+
+    def get(self, url, user=None):
+        """Ответ и число запросов к (default, реплике)"""
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(primary), len(replica)
+
+    def test_authenticated_reads_use_replica(self):
+        _, primary, replica = self.get('/api/products/', self.user)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_cache_fill_reads_primary(self):
+        response, primary, replica = self.get('/api/products/')
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+        self.assertEqual(response.data['results'][0]['title'], 'Платье')
+
+        # Попадание в кэш - без запросов вообще
+        _, primary, replica = self.get('/api/products/')
+        self.assertEqual((primary, replica), (0, 0))
+
+    def test_reads_primary_after_catalog_change(self):
+        bump_catalog_version()
+        _, primary, replica = self.get('/api/products/', self.user)
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+
+    @override_settings(CATALOG_REPLICA_PIN_SECONDS=0)
+    def test_no_pin_without_window(self):
+        bump_catalog_version()
+        _, primary, replica = self.get('/api/products/', self.user)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
@@ -0,0 +1,66 @@
+"""
+Корзины жетонов (catalog/throttling.py): ёмкость, пополнение и 429 с Retry-After.
+"""
+import os
+import tempfile
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+from catalog.cache import get_cache
+from catalog.throttling import BucketStore
+
+
+class BucketStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = BucketStore(os.path.join(directory.name, 'buckets.sqlite3'))
+        self.addCleanup(lambda: self.store.connection().close())
+
+    def test_burst_then_refill(self):
+        take = lambda now, cost=1: self.store.take('ip:1', cost, burst=3, refill=0.5, now=now)
+        self.assertEqual([take(100), take(100), take(100)], [0, 0, 0])
+        # Пусто: жетон через 1 / 0.5 = 2 секунды
+        self.assertEqual(take(100), 2)
+        self.assertEqual(take(101), 1)
+        self.assertEqual(take(102), 0)
+        # Не дольше ёмкости: за час накопилось только 3
+        self.assertEqual(take(3700, cost=3), 0)
+        self.assertEqual(take(3700), 2)
+
+    def test_keys_are_independent(self):
+        self.assertEqual(self.store.take('ip:1', 2, burst=2, refill=1, now=0), 0)
+        self.assertEqual(self.store.take('ip:2', 2, burst=2, refill=1, now=0), 0)
+        self.assertEqual(self.store.take('ip:1', 1, burst=2, refill=1, now=0), 1)
+
+
+class TokenBucketThrottleTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            CATALOG_READ_REPLICAS=[],
+            CATALOG_THROTTLE_ENABLED=True,
+            CATALOG_THROTTLE_DB=os.path.join(directory.name, 'buckets.sqlite3'),
+            CATALOG_THROTTLE_ANON_BURST=5,
+            CATALOG_THROTTLE_ANON_REFILL=0.1,
+            CATALOG_THROTTLE_COSTS={'product-list': 2},
+            CATALOG_SHED_DB_LATENCY_MS=0,
+            CATALOG_PROFILING_SAMPLE_RATE=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        get_cache().clear()
+        self.client = APIClient()
+
+    def test_anonymous_bucket(self):
+        statuses = [self.client.get('/api/products/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.get('/api/products/')
+        # Не хватает одного жетона из двух: 1 / 0.1 = 10 секунд
+        self.assertEqual(response['Retry-After'], '10')
+        # Дешёвый запрос ещё помещается в остаток
+        self.assertEqual(self.client.get('/api/categories/').status_code, 200)
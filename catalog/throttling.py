@@ -0,0 +1,305 @@
+"""
+Защита API от перегрузки без внешних сервисов.
+
+TokenBucketThrottle (DEFAULT_THROTTLE_CLASSES) - корзина жетонов на IP для
+анонимов и на пользователя для остальных, админы не ограничены. Корзина
+вмещает CATALOG_THROTTLE_<ANON|USER>_BURST жетонов и пополняется на _REFILL
+в секунду; запрос стоит CATALOG_THROTTLE_COSTS[имя URL] (по умолчанию 1),
+вьюха может уточнить цену в get_throttle_cost(request, cost). Нет жетонов -
+429 с Retry-After до того, как выполнится обработчик.
+
+Корзины лежат в SQLite-файле CATALOG_THROTTLE_DB: он общий для воркеров
+хоста, а BEGIN IMMEDIATE делает списание атомарным. Файловый кэш Django
+для этого не годится - он перечисляет каталог на каждой записи.
+
+LoadSheddingMiddleware - 503 анонимным чтениям API, пока сервер перегружен.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .authentication import CachedJWTAuthentication
+
+logger = logging.getLogger('catalog.throttling')
+
+# Ёмкость и пополнение (жетонов в секунду) по умолчанию
+SCOPES = {
+    'anon': (60, 1.0),
+    'user': (300, 5.0),
+}
+PRUNE_INTERVAL = 60
+
+
+class BucketStore:
+    """Корзины жетонов в SQLite-файле; соединение - своё у каждого потока"""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.pruned_at = 0.0
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=0.1, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            # Корзины не переживают сбой питания - и не должны
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS bucket '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID'
+            )
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, cost, burst, refill, now=None):
+        """Списывает cost жетонов; 0 - списано, иначе секунды до нужного остатка"""
+        now = time.time() if now is None else now
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(now - row[1], 0) * refill)
+            if tokens >= cost:
+                connection.execute('INSERT OR REPLACE INTO bucket VALUES (?, ?, ?)', (key, tokens - cost, now))
+                wait = 0
+            else:
+                wait = (cost - tokens) / refill
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+    def prune(self, idle, now=None):
+        """Корзины, которые за idle секунд наполнились доверху, - то же, что их отсутствие"""
+        now = time.time() if now is None else now
+        if now - self.pruned_at < PRUNE_INTERVAL:
+            return
+        self.pruned_at = now
+        self.connection().execute('DELETE FROM bucket WHERE updated < ?', (now - idle,))
+
+
+_stores = {}
+
+
+def get_store():
+    path = getattr(settings, 'CATALOG_THROTTLE_DB', os.path.join(tempfile.gettempdir(), 'catalog-throttle.sqlite3'))
+    if path not in _stores:
+        _stores[path] = BucketStore(path)
+    return _stores[path]
+
+
+def get_scope(name):
+    """(ёмкость, пополнение в секунду) для anon/user"""
+    burst, refill = SCOPES[name]
+    return (
+        getattr(settings, f'CATALOG_THROTTLE_{name.upper()}_BURST', burst),
+        getattr(settings, f'CATALOG_THROTTLE_{name.upper()}_REFILL', refill),
+    )
+
+
+class TokenBucketThrottle(BaseThrottle):
+
+    def allow_request(self, request, view):
+        self.delay = None
+        user = request.user
+        if not getattr(settings, 'CATALOG_THROTTLE_ENABLED', True) or (user and user.is_staff):
+            return True
+        if user and user.is_authenticated:
+            scope, key = 'user', f'user:{user.pk}'
+        else:
+            scope, key = 'anon', f'ip:{self.get_ident(request)}'
+        burst, refill = get_scope(scope)
+        if burst <= 0 or refill <= 0:
+            return True
+        # Дороже ёмкости корзины запрос не бывает - иначе он не прошёл бы никогда
+        cost = min(self.get_cost(request, view), burst)
+
+        store = get_store()
+        try:
+            self.delay = store.take(key, cost, burst, refill)
+            store.prune(max(b / r for b, r in map(get_scope, SCOPES) if r > 0))
+        except sqlite3.Error:
+            # Хранилище недоступно или занято дольше таймаута - не роняем API
+            logger.warning('Корзины троттлинга недоступны', exc_info=True)
+            return True
+        return not self.delay
+
+    def get_cost(self, request, view):
+        match = request.resolver_match
+        cost = getattr(settings, 'CATALOG_THROTTLE_COSTS', {}).get(match.url_name if match else None, 1)
+        if hasattr(view, 'get_throttle_cost'):
+            cost = view.get_throttle_cost(request, cost)
+        return cost
+
+    def wait(self):
+        return self.delay
+
+
+def queue_wait_ms(request, now=None):
+    """
+    Сколько запрос ждал между прокси и воркером по X-Request-Start; None -
+    заголовка нет. nginx шлёт t=<секунды>, Heroku - миллисекунды, Apache - микросекунды.
+    """
+    try:
+        started = float(request.headers.get('X-Request-Start', '').removeprefix('t='))
+    except ValueError:
+        return None
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(((time.time() if now is None else now) - started) * 1000, 0)
+
+
+class LoadSheddingMiddleware:
+    """
+    Быстрый 503 с Retry-After анонимным GET/HEAD к /api/ - до вьюхи,
+    аутентификации и запросов к БД, - пока:
+    - процесс обрабатывает больше CATALOG_SHED_MAX_INFLIGHT запросов;
+    - запрос ждал в очереди прокси дольше CATALOG_SHED_QUEUE_MS;
+    - SELECT 1 отвечает дольше CATALOG_SHED_DB_LATENCY_MS
+      CATALOG_SHED_DB_SLOW_PROBES замеров подряд (замер не чаще раза в
+      CATALOG_SHED_DB_PROBE_INTERVAL секунд на процесс) - один медленный
+      замер (пауза GC, сеть) не сбрасывает запросы целый интервал.
+    Очередь перед sync-воркерами gunicorn изнутри процесса не видна - о ней
+    говорят заголовок прокси и задержка БД. Записи и запросы с действительным
+    JWT не сбрасываются: подпись проверяется без БД и только под перегрузкой,
+    а просто заголовок Authorization (в том числе мусорный) не спасает.
+    Ноль в настройке отключает признак.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.db_latency_ms = 0.0
+        self.slow_probes = 0
+        self.probed_at = 0.0
+        self.logged_at = 0.0
+        self.shed_count = 0
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.enter()
+        try:
+            if self.sheddable(request):
+                if self.probe_due():
+                    self.probe_database()
+                reason = self.overload_reason(request)
+                if reason is not None and not self.authenticated(request):
+                    return self.shed(request, reason)
+            return self.get_response(request)
+        finally:
+            self.leave()
+
+    async def __acall__(self, request):
+        self.enter()
+        try:
+            if self.sheddable(request):
+                if self.probe_due():
+                    await sync_to_async(self.probe_database)()
+                reason = self.overload_reason(request)
+                if reason is not None and not self.authenticated(request):
+                    return self.shed(request, reason)
+            return await self.get_response(request)
+        finally:
+            self.leave()
+
+    def enter(self):
+        with self.lock:
+            self.inflight += 1
+
+    def leave(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def sheddable(self, request):
+        return request.method in ('GET', 'HEAD') and request.path_info.startswith('/api/')
+
+    def authenticated(self, request):
+        """Действительный access-токен - подпись и срок, без запросов к БД"""
+        authentication = CachedJWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is None:
+            return False
+        try:
+            authentication.get_validated_token(raw_token)
+        except InvalidToken:
+            return False
+        return True
+
+    def probe_due(self):
+        interval = getattr(settings, 'CATALOG_SHED_DB_PROBE_INTERVAL', 1.0)
+        if not getattr(settings, 'CATALOG_SHED_DB_LATENCY_MS', 250):
+            return False
+        now = time.monotonic()
+        with self.lock:
+            if now - self.probed_at < interval:
+                return False
+            self.probed_at = now
+        return True
+
+    def probe_database(self):
+        started = time.perf_counter()
+        try:
+            with connections['default'].cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except DatabaseError:
+            # БД недоступна - до следующего замера запросы всё равно упали бы
+            self.db_latency_ms = float('inf')
+        else:
+            self.db_latency_ms = (time.perf_counter() - started) * 1000
+        limit = getattr(settings, 'CATALOG_SHED_DB_LATENCY_MS', 250)
+        with self.lock:
+            self.slow_probes = self.slow_probes + 1 if self.db_latency_ms > limit else 0
+
+    def overload_reason(self, request):
+        """Почему запрос надо сбросить; None - не надо"""
+        limit = getattr(settings, 'CATALOG_SHED_MAX_INFLIGHT', 64)
+        if limit and self.inflight > limit:
+            return f'в обработке {self.inflight} запросов'
+        limit = getattr(settings, 'CATALOG_SHED_QUEUE_MS', 1000)
+        waited = queue_wait_ms(request) if limit else None
+        if waited is not None and waited > limit:
+            return f'ожидание в очереди {waited:.0f} мс'
+        limit = getattr(settings, 'CATALOG_SHED_DB_LATENCY_MS', 250)
+        if limit and self.slow_probes >= getattr(settings, 'CATALOG_SHED_DB_SLOW_PROBES', 3):
+            return f'задержка БД {self.db_latency_ms:.0f} мс, медленных замеров подряд: {self.slow_probes}'
+        return None
+
+    def shed(self, request, reason):
+        # Под перегрузкой не пишем строку лога на каждый запрос
+        now = time.monotonic()
+        with self.lock:
+            self.shed_count += 1
+            if now - self.logged_at < 1:
+                reason = None
+            else:
+                count, self.shed_count, self.logged_at = self.shed_count, 0, now
+        if reason is not None:
+            logger.warning('Сброс нагрузки: %s, отклонено запросов: %d', reason, count)
+        response = JsonResponse(
+            {'error': 'Сервер перегружен, повторите запрос позже'},
+            status=503,
+            json_dumps_params={'ensure_ascii': False},
+        )
+        response['Retry-After'] = str(getattr(settings, 'CATALOG_SHED_RETRY_AFTER', 2))
+        return response
@@ -1,18 +1,38 @@
-from rest_framework import viewsets, filters, status
+import math
+
+from django.conf import settings
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
+from .asgi import AsyncReadMixin
+from .bulk import run_bulk
+from .cache import aget_catalog_version, cache_response, get_catalog_version
+from .changes import changes_page, decode_token, encode_token, is_expired, tombstone_data
+from .export import CONTENT_TYPES, astream_products, stream_products
+from .facets import facet_counts, selected_facets
 from .models import Category, Product
 from .serializers import (
     CategorySerializer, 
+    ProductBulkSerializer,
+    ProductGridSerializer,
+    ProductListRowSerializer,
     ProductListSerializer, 
     ProductDetailSerializer
 )
+from .filters import ProductOrderingFilter, ProductSearchFilter
+from .http import Validators, aqueryset_validators, conditional_response, make_etag, queryset_validators
 from .permissions import IsAdminOrReadOnly
 from .pagination import ProductPagination 
+from .profiling import ProfiledViewMixin
+from .routers import ReplicaReadMixin, keep_read_alias
+from .sparse import prune_queryset, requested_fields, requested_view
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(AsyncReadMixin, ProfiledViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """
     API для категорий - полный CRUD
     GET /api/categories/ - список всех категорий (доступно всем)
@@ -26,6 +46,40 @@ class CategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrReadOnly]  # Защита!
     pagination_class = None
     
+    def get_validators(self, request, *args, **kwargs):
+        """Категории без updated_at - ETag берём из версии каталога"""
+        return self.category_validators(request, kwargs, get_catalog_version())
+    
+    async def aget_validators(self, request, *args, **kwargs):
+        return self.category_validators(request, kwargs, await aget_catalog_version())
+    
+    def category_validators(self, request, kwargs, version):
+        keys = ['categories']
+        if 'pk' in kwargs:
+            keys.append(f'category-{kwargs["pk"]}')
+        etag = make_etag('categories', request.get_full_path(), request.accepted_media_type, version)
+        return Validators(etag, None, keys)
+    
+    @cache_response
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cache_response
+    @conditional_response
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+    
+    @cache_response
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    @cache_response
+    @conditional_response
+    async def aretrieve(self, request, *args, **kwargs):
+        return await super().aretrieve(request, *args, **kwargs)
+    
     def destroy(self, request, *args, **kwargs):
         """Удаление категории"""
         instance = self.get_object()
@@ -40,7 +94,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(AsyncReadMixin, ProfiledViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """
     API для товаров - полный CRUD
     GET /api/products/ - список всех товаров (доступно всем)
@@ -49,20 +103,30 @@ class ProductViewSet(viewsets.ModelViewSet):
     PUT /api/products/{id}/ - обновить товар (только админ)
     PATCH /api/products/{id}/ - частично обновить товар (только админ)
     DELETE /api/products/{id}/ - удалить товар (только админ)
+    POST /api/products/bulk/ - пакетные операции (только админ)
     
     Фильтры:
     GET /api/products/?category=1 - по категории
     GET /api/products/?status=new - по статусу
-    GET /api/products/?search=название - поиск
+    GET /api/products/?search=название - полнотекстовый поиск с ранжированием
+    GET /api/products/?fields=id,title,price - только эти поля (?omit= - все, кроме)
+    GET /api/products/?view=grid - вместо всех фото одно главное (src/srcset)
+    GET /api/products/export/ - весь каталог потоком NDJSON (?type=json - массив)
+    GET /api/products/facets/ - счётчики по категориям, статусам и активности
+    GET /api/products/changes/?since=<token> - изменения и удаления с прошлой синхронизации
+    
+    Под ASGI чтения list/retrieve/by_category/new_arrivals/export идут через
+    async-обработчики a<action> (catalog/asgi.py).
     """
     queryset = Product.objects.all().select_related('category').prefetch_related('images')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_fields = ['category', 'status', 'is_active']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'title', 'price']
     ordering = ['-created_at']
     permission_classes = [IsAdminOrReadOnly]  # Защита!
     pagination_class = ProductPagination 
+    read_actions = ('list', 'retrieve', 'by_category', 'new_arrivals', 'export')
     
     def get_queryset(self):
         """Для списка показываем только активные, для админки - все"""
@@ -70,14 +134,163 @@ class ProductViewSet(viewsets.ModelViewSet):
         # Если хочешь показывать только активные товары, раскомментируй:
         # if self.action == 'list':
         #     queryset = queryset.filter(is_active=True)
+        # Фильтры action'ов живут здесь, чтобы валидаторы (ETag) видели тот же queryset
+        if self.action == 'by_category':
+            queryset = queryset.filter(category_id=self.request.query_params.get('category_id'))
+        elif self.action == 'new_arrivals':
+            queryset = queryset.filter(status='new', is_active=True)
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = prune_queryset(queryset, fields)
         return queryset
     
-    def get_serializer_class(self):
+    def get_requested_fields(self):
+        """?fields= / ?omit= для чтения (см. catalog/sparse.py); None - все поля"""
+        if self.request.method not in ('GET', 'HEAD') or self.action not in self.read_actions:
+            return None
+        if not hasattr(self, '_requested_fields'):
+            available = self.get_serializer_class().Meta.fields
+            fields = requested_fields(self.request, available)
+            # Сетке фото списка не нужны: явный набор полей убирает их prefetch
+            if fields is None and self.get_serializer_class() is ProductGridSerializer:
+                fields = list(available)
+            self._requested_fields = fields
+        return self._requested_fields
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        return context
+    
+    def get_validators(self, request, *args, **kwargs):
+        """ETag/Last-Modified без сериализации (см. catalog/http.py)"""
         if self.action == 'retrieve':
+            try:
+                row = self.get_validator_row(kwargs.get('pk')).first()
+            except (TypeError, ValueError, ValidationError):
+                return None
+            return self.product_validators(request, kwargs['pk'], row)
+        if self.action == 'facets':
+            return queryset_validators(self.get_facet_queryset(), request)
+
+        keys = self.get_list_surrogate_keys(request)
+        if keys is None:
+            return None
+        return queryset_validators(self.filter_queryset(self.get_queryset()), request, keys)
+    
+    async def aget_validators(self, request, *args, **kwargs):
+        """get_validators для async-обработчиков"""
+        if self.action == 'retrieve':
+            try:
+                row = await self.get_validator_row(kwargs.get('pk')).afirst()
+            except (TypeError, ValueError, ValidationError):
+                return None
+            return self.product_validators(request, kwargs['pk'], row)
+
+        keys = self.get_list_surrogate_keys(request)
+        if keys is None:
+            return None
+        return await aqueryset_validators(await self.afiltered_queryset(), request, keys)
+    
+    def get_validator_row(self, pk):
+        return Product.objects.filter(pk=pk).values_list('updated_at', 'category_id')
+    
+    def product_validators(self, request, pk, row):
+        if row is None:
+            return None
+        updated_at, category_id = row
+        keys = [f'product-{pk}']
+        if category_id:
+            keys.append(f'category-{category_id}')
+        etag = make_etag('product', pk, request.accepted_media_type, updated_at.isoformat())
+        return Validators(etag, int(updated_at.timestamp()), keys)
+    
+    def get_list_surrogate_keys(self, request):
+        """Ключи списка; None - by_category без category_id (ответ 400, валидаторы не нужны)"""
+        category_id = request.query_params.get(
+            'category_id' if self.action == 'by_category' else 'category'
+        )
+        if self.action == 'by_category' and not category_id:
+            return None
+        return [f'category-{category_id}'] if category_id else []
+    
+    def get_serializer_class(self):
+        if self.action in ('retrieve', 'changes'):
             return ProductDetailSerializer
+        if self.action in self.read_actions and requested_view(self.request) == 'grid':
+            return ProductGridSerializer
         return ProductListSerializer
     
+    def get_throttle_cost(self, request, cost):
+        """Цена для TokenBucketThrottle: страница больше обычной и поиск дороже"""
+        if self.action in ('list', 'by_category', 'new_arrivals'):
+            cost *= math.ceil(self.paginator.get_page_size(request) / self.paginator.page_size)
+        if request.query_params.get('search'):
+            cost += getattr(settings, 'CATALOG_THROTTLE_SEARCH_COST', 3)
+        return cost
+    
+    def list_products(self, request):
+        """
+        Общая часть list/by_category/new_arrivals. Быстрый путь (values() +
+        ProductListRowSerializer) отдаёт тот же JSON, что ProductListSerializer.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        fast = getattr(settings, 'CATALOG_FAST_LIST_SERIALIZER', True)
+        if fast:
+            queryset = ProductListRowSerializer.prepare(queryset, self.get_requested_fields())
+
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        if fast:
+            serializer = ProductListRowSerializer(rows, context=self.get_serializer_context())
+        else:
+            serializer = self.get_serializer(rows, many=True)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+    
+    async def alist_products(self, request):
+        """list_products для async-обработчиков: тот же JSON, запросы через async ORM"""
+        queryset = await self.afiltered_queryset()
+        fast = getattr(settings, 'CATALOG_FAST_LIST_SERIALIZER', True)
+        if fast:
+            queryset = ProductListRowSerializer.prepare(queryset, self.get_requested_fields())
+
+        page = await self.apaginate_queryset(queryset)
+        rows = page if page is not None else [row async for row in queryset]
+        if fast:
+            data = await ProductListRowSerializer(rows, context=self.get_serializer_context()).adata()
+        else:
+            data = self.get_serializer(rows, many=True).data
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
+    @cache_response
+    @conditional_response
+    def list(self, request, *args, **kwargs):
+        return self.list_products(request)
+    
+    @cache_response
+    @conditional_response
+    async def alist(self, request, *args, **kwargs):
+        return await self.alist_products(request)
+    
+    @cache_response
+    @conditional_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    @cache_response
+    @conditional_response
+    async def aretrieve(self, request, *args, **kwargs):
+        return await super().aretrieve(request, *args, **kwargs)
+    
     @action(detail=False, methods=['get'])
+    @cache_response
+    @conditional_response
     def by_category(self, request):
         """
         Получить товары по ID категории
@@ -87,20 +300,21 @@ class ProductViewSet(viewsets.ModelViewSet):
         if not category_id:
             return Response({'error': 'ID категории не указан'}, status=400)
         
-        queryset = self.filter_queryset(self.get_queryset().filter(category_id=category_id))
-
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.list_products(request)
         # products = self.get_queryset().filter(category_id=category_id)
         # serializer = self.get_serializer(products, many=True)
         # return Response(serializer.data)
     
+    @cache_response
+    @conditional_response
+    async def aby_category(self, request):
+        if not request.query_params.get('category_id'):
+            return Response({'error': 'ID категории не указан'}, status=400)
+        return await self.alist_products(request)
+    
     @action(detail=False, methods=['get'])
+    @cache_response
+    @conditional_response
     def new_arrivals(self, request):
         """
         Получить новые поставки
@@ -109,16 +323,99 @@ class ProductViewSet(viewsets.ModelViewSet):
         # products = self.get_queryset().filter(status='new', is_active=True)
         # serializer = self.get_serializer(products, many=True)
         # return Response(serializer.data)
-        queryset = self.filter_queryset(self.get_queryset().filter(status='new', is_active=True))
+        return self.list_products(request)
+    
+    @cache_response
+    @conditional_response
+    async def anew_arrivals(self, request):
+        return await self.alist_products(request)
+    
+    @action(detail=False, methods=['get'])
+    @conditional_response
+    def export(self, request):
+        """
+        Весь каталог одним потоковым ответом (без COUNT(*) и OFFSET)
+        GET /api/products/export/ - NDJSON, товар на строку
+        GET /api/products/export/?type=json - JSON-массив
+        Фильтры, поиск, сортировка и ?fields= - как у списка.
+        """
+        layout = request.query_params.get('type', 'ndjson')
+        if layout not in CONTENT_TYPES:
+            return Response({'error': f'type: {" | ".join(CONTENT_TYPES)}'}, status=400)
         
-        # Применяем пагинацию
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        queryset = self.filter_queryset(self.get_queryset())
+        chunks = stream_products(
+            queryset,
+            self.get_serializer_context(),
+            chunk_size=getattr(settings, 'CATALOG_EXPORT_CHUNK_SIZE', 1000),
+            layout=layout,
+        )
+        return StreamingHttpResponse(keep_read_alias(chunks), content_type=CONTENT_TYPES[layout])
+    
+    @conditional_response
+    async def aexport(self, request):
+        """export асинхронным генератором: под ASGI ответ не собирается в памяти целиком"""
+        layout = request.query_params.get('type', 'ndjson')
+        if layout not in CONTENT_TYPES:
+            return Response({'error': f'type: {" | ".join(CONTENT_TYPES)}'}, status=400)
         
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        chunks = astream_products(
+            await self.afiltered_queryset(),
+            self.get_serializer_context(),
+            chunk_size=getattr(settings, 'CATALOG_EXPORT_CHUNK_SIZE', 1000),
+            layout=layout,
+        )
+        return StreamingHttpResponse(keep_read_alias(chunks), content_type=CONTENT_TYPES[layout])
+    
+    def get_facet_queryset(self):
+        """Поиск - как у списка; фильтры фасетов применяет facet_counts"""
+        return ProductSearchFilter().filter_queryset(self.request, self.get_queryset(), self)
+    
+    @action(detail=False, methods=['get'])
+    @cache_response
+    @conditional_response
+    def facets(self, request):
+        """
+        Счётчики для боковой панели витрины одним GROUP BY
+        GET /api/products/facets/?search=шкаф&status=new&category=1
+        Параметры - как у списка (?ordering= на счётчики не влияет).
+        """
+        queryset = self.get_facet_queryset()
+        filterset = DjangoFilterBackend().get_filterset(request, queryset, self)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return Response(facet_counts(queryset, selected_facets(filterset.form.cleaned_data)))
+    
+    # Только default: отставание реплики больше окна CATALOG_CHANGES_SETTLE_SECONDS потеряло бы изменения
+    @action(detail=False, methods=['get'], read_from_replicas=False)
+    def changes(self, request):
+        """
+        Дельта-синхронизация (catalog/changes.py)
+        GET /api/products/changes/ - первый запрос: весь каталог
+        GET /api/products/changes/?since=<next>&page_size=500 - что изменилось с прошлого раза
+        Повторять с next, пока has_more; последний next сохранить до следующей синхронизации.
+        """
+        try:
+            position = decode_token(request.query_params.get('since'))
+        except ValueError:
+            return Response({'error': 'Неверный токен since'}, status=400)
+        if is_expired(position):
+            return Response({'error': 'Токен устарел, нужна полная синхронизация'}, status=status.HTTP_410_GONE)
+        
+        default = getattr(settings, 'CATALOG_CHANGES_PAGE_SIZE', 500)
+        try:
+            page_size = int(request.query_params.get('page_size', default))
+        except ValueError:
+            page_size = default
+        page_size = min(max(page_size, 1), getattr(settings, 'CATALOG_CHANGES_MAX_PAGE_SIZE', 1000))
+        
+        page = changes_page(self.get_queryset(), position, page_size)
+        return Response({
+            'changes': self.get_serializer(page.products, many=True).data,
+            'deleted': [tombstone_data(tombstone) for tombstone in page.tombstones],
+            'next': encode_token(page.position),
+            'has_more': page.has_more,
+        })
     
     @action(detail=True, methods=['post'])
     def toggle_active(self, request, pk=None):
@@ -131,3 +428,34 @@ class ProductViewSet(viewsets.ModelViewSet):
         product.save()
         serializer = self.get_serializer(product)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Пакетные операции одним запросом
+        POST /api/products/bulk/
+        {
+            "atomic": true,
+            "operations": [
+                {"op": "create", "data": {"title": "...", "price": "10.00"}},
+                {"op": "update", "id": 5, "data": {"price": "12.00"}},
+                {"op": "activate", "id": 6},
+                {"op": "deactivate", "id": 7},
+                {"op": "delete", "id": 8}
+            ]
+        }
+        atomic=true - всё или ничего; false - применяются валидные операции.
+        """
+        serializer = ProductBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, applied = run_bulk(
+            serializer.validated_data['operations'],
+            atomic=serializer.validated_data['atomic']
+        )
+        if not applied:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif any(result['status'] == 'error' for result in results):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_200_OK
+        return Response({'applied': applied, 'results': results}, status=response_status)
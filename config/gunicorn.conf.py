@@ -0,0 +1,82 @@
+"""
+Конфигурация gunicorn для продакшена: gunicorn -c config/gunicorn.conf.py
+
+Модель воркеров - GUNICORN_WORKER_CLASS (её же читает config/settings.py):
+- gthread (по умолчанию) - config.wsgi, GUNICORN_THREADS потоков на процесс:
+  медленный клиент занимает поток, а не весь воркер;
+- sync - config.wsgi, запрос на процесс (как раньше);
+- uvicorn - config.asgi, async-обработчики чтения (catalog/asgi.py) и
+  CONN_MAX_AGE=0. Включать после loadtest_servers на своей нагрузке.
+Процессов - WEB_CONCURRENCY. Соединения с PostgreSQL - из пула на процесс
+(DATABASE_POOL в config/settings.py): процессов x DATABASE_POOL_MAX_SIZE
+должно укладываться в max_connections сервера.
+
+Сравнить модели под нагрузкой: python manage.py loadtest_servers
+"""
+import multiprocessing
+import os
+
+APPS = {
+    'uvicorn': ('config.asgi:application', 'uvicorn_worker.UvicornWorker'),
+    'gthread': ('config.wsgi:application', 'gthread'),
+    'sync': ('config.wsgi:application', 'sync'),
+}
+
+worker_model = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_model not in APPS:
+    raise RuntimeError(f'GUNICORN_WORKER_CLASS: {" | ".join(APPS)}, а не {worker_model!r}')
+wsgi_app, worker_class = APPS[worker_model]
+
+bind = os.environ.get('GUNICORN_BIND', f'0.0.0.0:{os.environ.get("PORT", "8000")}')
+# os.cpu_count() в контейнере - ядра хоста, поэтому не больше 4 без явного WEB_CONCURRENCY
+cores = multiprocessing.cpu_count()
+default_workers = min(cores if worker_model == 'uvicorn' else cores * 2 + 1, 4)
+workers = int(os.environ.get('WEB_CONCURRENCY', default_workers))
+threads = int(os.environ.get('GUNICORN_THREADS', 4 if worker_model == 'gthread' else 1))
+
+# Django и приложения импортируются один раз в мастере, воркеры - fork:
+# быстрый старт и общая память страниц кода
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Соединения с прокси платформы держим между запросами
+keepalive = 5
+# Перезапуск воркера после N запросов (со сдвигом - не все разом) против роста памяти.
+# С воркером пропадают таймеры повторов фоновых загрузок фото - их задачи лежат
+# в БД, и новый воркер подбирает их в post_worker_init (catalog/images.resume_jobs)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+# Heartbeat воркеров в памяти, а не на диске контейнера
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+errorlog = '-'
+
+
+def when_ready(server):
+    """
+    Мастер не обслуживает запросы: соединения и пулы, открытые при загрузке
+    приложения, закрываем до fork - иначе воркеры делили бы их сокеты.
+    """
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+
+
+def post_worker_init(worker):
+    """
+    Повторы фоновых загрузок фото ждали в таймерах прежнего воркера - после
+    перезапуска (деплой, max_requests) подбираем очередь (catalog/images.py)
+    """
+    from catalog.images import resume_jobs
+
+    try:
+        resume_jobs()
+    except Exception:
+        # Без БД воркер всё равно должен подняться - задачи подберёт worker из Procfile
+        worker.log.exception('Не удалось подобрать очередь загрузок фото')
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 from decouple import config, Csv
 import dj_database_url
@@ -59,9 +60,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'catalog.profiling.ServerTimingMiddleware',  # Server-Timing + лог фаз запроса (первым!)
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Для статики на Railway
+    'catalog.snapshot.SnapshotWhiteNoiseMiddleware',  # Статика и снимок каталога (WhiteNoise, не ломает ASGI)
     'corsheaders.middleware.CorsMiddleware',  # CORS 
+    'catalog.throttling.LoadSheddingMiddleware',  # 503 анонимным чтениям API при перегрузке (после CORS)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -101,14 +104,83 @@ DATABASES = {
     }
 }
 
+# Модель воркеров gunicorn (config/gunicorn.conf.py читает ту же переменную).
+# Под uvicorn (ASGI) у каждого запроса свой поток, а соединения БД - на поток:
+# постоянные соединения не переиспользуются, поэтому CONN_MAX_AGE по умолчанию 0
+# (на PostgreSQL соединения переиспользует пул, см. DATABASE_POOL ниже), а чтения
+# каталога идут async-обработчиками (CATALOG_ASYNC_VIEWS)
+GUNICORN_WORKER_CLASS = config('GUNICORN_WORKER_CLASS', default='gthread')
+ASGI_SERVER = GUNICORN_WORKER_CLASS == 'uvicorn'
+
 # Используем DATABASE_URL для простоты (работает и с SQLite и с PostgreSQL)
+DATABASE_CONN_MAX_AGE = config('DATABASE_CONN_MAX_AGE', default=0 if ASGI_SERVER else 600, cast=int)
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL', default='sqlite:///db.sqlite3'),
-        conn_max_age=600
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        conn_health_checks=True,
     )
 }
 
+# Реплики только для чтения через запятую (catalog/routers.py). Локально -
+# второй файл SQLite: DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3.
+# В тестах реплика - зеркало default (TEST MIRROR).
+for index, url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv())):
+    DATABASES[f'replica_{index + 1}'] = {
+        **dj_database_url.parse(url, conn_max_age=DATABASE_CONN_MAX_AGE, conn_health_checks=True),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['catalog.routers.ReplicaRouter']
+
+# Лукапы pg_trgm / полнотекстового поиска нужны только на PostgreSQL
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Пул соединений psycopg 3 на PostgreSQL: один на процесс и алиас, общий для
+# потоков gthread и запросов ASGI; соединение проверяется перед выдачей.
+# MAX_SIZE - на процесс (x WEB_CONCURRENCY, см. config/gunicorn.conf.py)
+DATABASE_POOL = config('DATABASE_POOL', default=True, cast=bool)
+DATABASE_POOL_MIN_SIZE = config('DATABASE_POOL_MIN_SIZE', default=2, cast=int)
+DATABASE_POOL_MAX_SIZE = config('DATABASE_POOL_MAX_SIZE', default=10, cast=int)
+DATABASE_POOL_TIMEOUT = config('DATABASE_POOL_TIMEOUT', default=10, cast=int)
+if DATABASE_POOL:
+    for database in DATABASES.values():
+        if 'postgresql' not in database['ENGINE']:
+            continue
+        # Пул несовместим с постоянными соединениями Django; CONN_HEALTH_CHECKS
+        # включает проверку соединения пулом (ConnectionPool.check_connection)
+        database['CONN_MAX_AGE'] = 0
+        database.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DATABASE_POOL_MIN_SIZE,
+            'max_size': DATABASE_POOL_MAX_SIZE,
+            # Сколько ждать свободное соединение, прежде чем запрос упадёт
+            'timeout': DATABASE_POOL_TIMEOUT,
+            # Соединения не живут вечно (переключение реплик, память бэкенда) и не висят без дела
+            'max_lifetime': 1800,
+            'max_idle': 300,
+        }
+
+
+# Cache
+# В кэше живут версия каталога (catalog/cache.py), отозванные refresh-токены
+# (catalog/authentication.py) и привязка клиента к default после
+# записи (catalog/routers.py) - кэш должен быть общим для всех процессов,
+# которые обслуживают API.
+# Локально по умолчанию - файловый кэш, общий для воркеров одной машины.
+# Если инстансов несколько - общий для всех хостов бэкенд без внешних сервисов:
+#   CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache
+#   CACHE_LOCATION=catalog_cache   (таблица: python manage.py createcachetable)
+# С кэшем одного хоста (filebased, locmem) на Railway и в check --deploy -
+# предупреждение catalog.W001 (catalog/checks.py); CACHE_SINGLE_HOST=True его
+# снимает, если инстанс один.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_LOCATION', default=os.path.join(tempfile.gettempdir(), 'catalog-cache')),
+    }
+}
+CACHE_SINGLE_HOST = config('CACHE_SINGLE_HOST', default=False, cast=bool)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -192,14 +264,25 @@ CORS_ALLOW_HEADERS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # orjson с тем же выводом, что у JSONRenderer (catalog/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'catalog.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'PAGE_SIZE': 100,
     # JWT Authentication
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'catalog.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    # Корзины жетонов на IP/пользователя (catalog/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'catalog.throttling.TokenBucketThrottle',
+    ],
+    # Сколько прокси перед приложением: IP клиента - из X-Forwarded-For, а не адрес прокси
+    'NUM_PROXIES': config('NUM_PROXIES', default=1, cast=int),
 }
 
 # ==============================================
@@ -212,7 +295,13 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
+    # last_login пишет catalog.authentication не чаще CATALOG_AUTH_LAST_LOGIN_INTERVAL
+    'UPDATE_LAST_LOGIN': False,
+    # Штамп пароля в токене: смена пароля отзывает выданные токены
+    'CHECK_REVOKE_TOKEN': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'catalog.authentication.CachedTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'catalog.authentication.CachedTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER': 'catalog.authentication.CachedTokenVerifySerializer',
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -290,3 +379,129 @@ CLOUDINARY_CONFIG = {
 
 cloudinary.config(**CLOUDINARY_CONFIG)
 
+
+# ==============================================
+# CATALOG SETTINGS
+# ==============================================
+# Подсчёт count/total_pages в ProductPagination: exact | estimate | none
+CATALOG_PAGINATION_COUNT = config('CATALOG_PAGINATION_COUNT', default='exact')
+# Ниже этого порога оценке не доверяем и считаем точно
+CATALOG_PAGINATION_ESTIMATE_THRESHOLD = config('CATALOG_PAGINATION_ESTIMATE_THRESHOLD', default=10000, cast=int)
+# Бэкенд поиска (dotted path); пусто - выбор по СУБД, см. catalog/search.py
+CATALOG_SEARCH_BACKEND = config('CATALOG_SEARCH_BACKEND', default='')
+# Кэш ответов каталога: свежесть, окно stale-while-revalidate и блокировка пересчёта (сек)
+CATALOG_CACHE_ALIAS = 'default'
+CATALOG_CACHE_TTL = config('CATALOG_CACHE_TTL', default=60, cast=int)
+CATALOG_CACHE_STALE_TTL = config('CATALOG_CACHE_STALE_TTL', default=300, cast=int)
+CATALOG_CACHE_LOCK_TIMEOUT = 10
+# HTTP-кэширование: браузер всегда перепроверяет (304), CDN держит s-maxage секунд
+CATALOG_HTTP_MAX_AGE = config('CATALOG_HTTP_MAX_AGE', default=0, cast=int)
+CATALOG_HTTP_S_MAXAGE = config('CATALOG_HTTP_S_MAXAGE', default=300, cast=int)
+CATALOG_SURROGATE_KEY_HEADER = config('CATALOG_SURROGATE_KEY_HEADER', default='Surrogate-Key')
+# Функция сброса ключей во фронтовом кэше (dotted path, принимает список ключей)
+CATALOG_SURROGATE_PURGE = config('CATALOG_SURROGATE_PURGE', default='')
+# Фоновая загрузка фото (catalog/images.py). Без хранилища файлы лежат локально, как раньше
+CATALOG_IMAGE_STORE = config(
+    'CATALOG_IMAGE_STORE',
+    default='catalog.images.CloudinaryImageStore' if RAILWAY_ENVIRONMENT else ''
+)
+# Файл до загрузки лежит в БД вместе с задачей. Задачи разбирают потоки веб-процессов
+# (WORKERS, 0 - не разбирают) и процесс worker из Procfile (process_image_uploads)
+CATALOG_IMAGE_UPLOAD_WORKERS = config('CATALOG_IMAGE_UPLOAD_WORKERS', default=2, cast=int)
+CATALOG_IMAGE_UPLOAD_MAX_ATTEMPTS = 5
+CATALOG_IMAGE_UPLOAD_RETRY_DELAY = 10
+# Через сколько минут задача в running считается брошенной
+CATALOG_IMAGE_UPLOAD_STALE_AFTER = 15
+CATALOG_IMAGE_MAX_SIZE = config('CATALOG_IMAGE_MAX_SIZE', default=2000, cast=int)
+CATALOG_IMAGE_QUALITY = 85
+# Главное фото в списках (?view=grid): srcset из трансформаций Cloudinary.
+# После смены ширин - manage.py refresh_primary_images
+CATALOG_IMAGE_SRCSET_WIDTHS = config('CATALOG_IMAGE_SRCSET_WIDTHS', default='160,320,480,640,960', cast=Csv(int))
+CATALOG_IMAGE_SRC_WIDTH = config('CATALOG_IMAGE_SRC_WIDTH', default=480, cast=int)
+CATALOG_IMAGE_TRANSFORMATION = 'c_limit,w_{width},f_auto,q_auto'
+# Дедупликация фото (ImageAsset, dedupe_images): одинаковое содержимое не грузится повторно.
+# PERCEPTUAL - ещё и похожие (пережатые, уменьшенные) с отличием dHash не больше DISTANCE бит
+CATALOG_IMAGE_PERCEPTUAL_DEDUPE = config('CATALOG_IMAGE_PERCEPTUAL_DEDUPE', default=False, cast=bool)
+# Кандидатов ищут индексы полос dHash (catalog.models.PERCEPTUAL_BANDS) - точно до 4 бит
+CATALOG_IMAGE_PERCEPTUAL_DISTANCE = 4
+# JWT (catalog/authentication.py): кэш пользователя, запись last_login и чистка истёкших токенов
+CATALOG_AUTH_USER_CACHE_TTL = config('CATALOG_AUTH_USER_CACHE_TTL', default=60, cast=int)
+CATALOG_AUTH_LAST_LOGIN_INTERVAL = 3600
+# Сколько секунд кэшируется «refresh-токен не отозван»
+CATALOG_AUTH_BLACKLIST_CACHE_TTL = config('CATALOG_AUTH_BLACKLIST_CACHE_TTL', default=30, cast=int)
+CATALOG_AUTH_TOKEN_PURGE_INTERVAL = config('CATALOG_AUTH_TOKEN_PURGE_INTERVAL', default=3600, cast=int)
+# Реплики (catalog/routers.py): куда читают GET вьюсетов, сколько секунд после записи
+# читать из default и как часто перепроверять недоступную реплику
+CATALOG_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+CATALOG_REPLICA_PIN_SECONDS = config('CATALOG_REPLICA_PIN_SECONDS', default=5, cast=int)
+CATALOG_REPLICA_HEALTH_TTL = 10
+# Профилирование запросов (catalog/profiling.py): доля запросов с Server-Timing и логом фаз
+CATALOG_PROFILING_SAMPLE_RATE = config('CATALOG_PROFILING_SAMPLE_RATE', default=1.0 if DEBUG else 0.01, cast=float)
+CATALOG_PROFILING_HEADER = config('CATALOG_PROFILING_HEADER', default=True, cast=bool)
+# Сколько повторов одного SQL-шаблона считать N+1; медленный запрос логируется как WARNING
+CATALOG_PROFILING_NPLUSONE_THRESHOLD = 5
+CATALOG_PROFILING_SLOW_MS = config('CATALOG_PROFILING_SLOW_MS', default=500, cast=int)
+# Списки товаров через values() без моделей (тот же JSON, см. ProductListRowSerializer)
+CATALOG_FAST_LIST_SERIALIZER = config('CATALOG_FAST_LIST_SERIALIZER', default=True, cast=bool)
+# GET /api/products/export/: товаров на порцию (строк с курсора и запрос фото)
+CATALOG_EXPORT_CHUNK_SIZE = config('CATALOG_EXPORT_CHUNK_SIZE', default=1000, cast=int)
+# Async-обработчики чтения (catalog/asgi.py); по умолчанию - под uvicorn-воркерами
+CATALOG_ASYNC_VIEWS = config('CATALOG_ASYNC_VIEWS', default=ASGI_SERVER, cast=bool)
+# Статический снимок каталога (catalog/snapshot.py, build_catalog_snapshot); BASE_URL - хост API в ссылках
+CATALOG_SNAPSHOT_ROOT = config('CATALOG_SNAPSHOT_ROOT', default=str(BASE_DIR / 'snapshot'))
+CATALOG_SNAPSHOT_URL = '/snapshot/'
+CATALOG_SNAPSHOT_BASE_URL = config('CATALOG_SNAPSHOT_BASE_URL', default='http://localhost:8000')
+CATALOG_SNAPSHOT_ON_WRITE = config('CATALOG_SNAPSHOT_ON_WRITE', default=False, cast=bool)
+CATALOG_SNAPSHOT_DELAY = config('CATALOG_SNAPSHOT_DELAY', default=5, cast=int)
+# GET /api/products/changes/ (catalog/changes.py): свежие строки ждут SETTLE секунд, надгробия живут RETENTION дней
+# SETTLE должен покрывать самую долгую транзакцию одиночной записи; массовые записи
+# (catalog_changed) после коммита получают время коммита (changes.restamp)
+CATALOG_CHANGES_PAGE_SIZE = config('CATALOG_CHANGES_PAGE_SIZE', default=500, cast=int)
+CATALOG_CHANGES_MAX_PAGE_SIZE = 1000
+CATALOG_CHANGES_SETTLE_SECONDS = config('CATALOG_CHANGES_SETTLE_SECONDS', default=5, cast=int)
+CATALOG_CHANGES_RETENTION_DAYS = config('CATALOG_CHANGES_RETENTION_DAYS', default=30, cast=int)
+CATALOG_CHANGES_COMPACT_INTERVAL = 86400
+# Троттлинг (catalog/throttling.py): корзина на IP (anon) или пользователя; REFILL - жетонов в секунду
+CATALOG_THROTTLE_ENABLED = config('CATALOG_THROTTLE_ENABLED', default=True, cast=bool)
+CATALOG_THROTTLE_DB = config('CATALOG_THROTTLE_DB', default=os.path.join(tempfile.gettempdir(), 'catalog-throttle.sqlite3'))
+CATALOG_THROTTLE_ANON_BURST = config('CATALOG_THROTTLE_ANON_BURST', default=60, cast=int)
+CATALOG_THROTTLE_ANON_REFILL = config('CATALOG_THROTTLE_ANON_REFILL', default=1.0, cast=float)
+CATALOG_THROTTLE_USER_BURST = config('CATALOG_THROTTLE_USER_BURST', default=300, cast=int)
+CATALOG_THROTTLE_USER_REFILL = config('CATALOG_THROTTLE_USER_REFILL', default=5.0, cast=float)
+# Цена запроса в жетонах по имени URL (остальные - 1); поиск и большие страницы дороже (ProductViewSet)
+CATALOG_THROTTLE_COSTS = {
+    'token_obtain_pair': 10,  # хэш пароля на каждую попытку
+    'token_refresh': 2,
+    'product-list': 2,
+    'product-by-category': 2,
+    'product-new-arrivals': 2,
+    'product-facets': 3,
+    'product-changes': 5,
+    'product-export': 20,
+}
+CATALOG_THROTTLE_SEARCH_COST = 3
+# Сброс нагрузки (LoadSheddingMiddleware): пороги; 0 отключает признак
+CATALOG_SHED_MAX_INFLIGHT = config('CATALOG_SHED_MAX_INFLIGHT', default=64, cast=int)
+CATALOG_SHED_QUEUE_MS = config('CATALOG_SHED_QUEUE_MS', default=1000, cast=int)
+CATALOG_SHED_DB_LATENCY_MS = config('CATALOG_SHED_DB_LATENCY_MS', default=250, cast=int)
+CATALOG_SHED_DB_PROBE_INTERVAL = 1.0
+# Сколько медленных замеров подряд считается перегрузкой БД
+CATALOG_SHED_DB_SLOW_PROBES = 3
+CATALOG_SHED_RETRY_AFTER = 2
+
+# ==============================================
+# LOGGING
+# ==============================================
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'catalog': {
+            'handlers': ['console'],
+            'level': config('CATALOG_LOG_LEVEL', default='INFO'),
+        },
+    },
+}